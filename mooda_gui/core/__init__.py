@@ -0,0 +1,23 @@
+"""Constructor of package"""
+
+from mooda_gui.core.worker import Cancelled, Worker, WorkerSignals
+from mooda_gui.core.readers import (read_file, read_csv, read_netcdf,
+                                    read_pickle)
+from mooda_gui.core.pool import process_pool, run_in_pool, shutdown_pool
+from mooda_gui.core.multifile import merge_waterframes, read_files
+from mooda_gui.core.tail import AppendBuffer, FileTail
+from mooda_gui.core.writers import write_netcdf
+from mooda_gui.core.binary import maps_file, read_binary, write_binary
+from mooda_gui.core.cache import prune_cache, read_cache, write_cache
+from mooda_gui.core.lazynetcdf import LazyNetCDF
+from mooda_gui.core.summary import ColumnSummary, column_summary
+from mooda_gui.core.datastate import DataState
+from mooda_gui.core.registry import PlotRegistry
+from mooda_gui.core.aggregation import (AggregationCache, AggregationPyramid,
+                                        aggregation_cache)
+from mooda_gui.core.histogram import (Histogram, Histogram2D,
+                                      column_histogram, pair_histogram)
+from mooda_gui.core.correlation import correlation_matrix
+from mooda_gui.core.spectrogram import (SpectrogramPyramid,
+                                       spectrogram_pyramid)
+from mooda_gui.core.acoustic import AcousticData
@@ -0,0 +1,229 @@
+"""Acoustic data (i.e. spectra of an icListen hydrophone). Spectra have a
+column for each frequency, so they are kept out of WaterFrame.data in a single
+2D array of power, with the time index and the frequencies"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+from mooda_gui.core.spectrogram import SpectrogramPyramid, acoustic_keys
+
+# Columns of the spectra that are not frequencies
+ACOUSTIC_INFO = ("Sequence", "Data Points")
+# Arrays of power with more bytes are memory mapped to a temporary file
+ACOUSTIC_MMAP_BYTES = 1024 ** 3
+# Minimum number of spectra of the array of power when spectra are appended
+ACOUSTIC_MIN_CAPACITY = 1024
+
+
+def is_acoustic_key(key):
+    """
+    It returns True if the key is a column of acoustic data (a frequency or
+    an info column of the spectra).
+
+    Parameters
+    ----------
+        key: str
+    Returns
+    -------
+        True/False: bool
+    """
+    if key in ACOUSTIC_INFO:
+        return True
+    try:
+        float(key)
+        # It is True also for 'NaN'
+        return True
+    except ValueError:
+        return False
+
+
+def _power_array(shape, mapped):
+    """It returns an empty float32 array of power, memory mapped to a
+    temporary file if mapped is True (the file is deleted when the map is
+    closed)"""
+    if mapped:
+        return np.memmap(tempfile.TemporaryFile(), dtype=np.float32,
+                         mode="w+", shape=shape)
+    return np.empty(shape, dtype=np.float32)
+
+
+class AcousticData:
+    """
+    Spectra of acoustic data: index of WaterFrame.data, frequencies and a
+    contiguous float32 array of power of (times, frequencies). Info columns
+    of the spectra (ACOUSTIC_INFO) are kept in a DataFrame.
+    """
+
+    def __init__(self, index, frequencies, power, keys, info=None,
+                 buffer=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            index: pandas.Index
+                Index of the spectra (TIME or a MultiIndex with TIME).
+            frequencies: numpy.ndarray
+            power: numpy.ndarray
+                Array (or numpy.memmap) of (times, frequencies).
+            keys: list of str
+                Names of the columns of the frequencies.
+            info: pandas.DataFrame, optional (info = None)
+                Info columns of the spectra, with the same index.
+            buffer: numpy.ndarray, optional (buffer = None)
+                Array with free space at the end whose first times are the
+                power (see append()). None is the power.
+        """
+        self.index = index
+        self.frequencies = frequencies
+        self.power = power
+        self.buffer = power if buffer is None else buffer
+        self.keys = keys
+        if info is None:
+            info = pd.DataFrame(index=index)
+        self.info = info
+        # Names of all the columns, to classify keys without parsing them
+        self.key_set = frozenset(keys) | frozenset(info.keys())
+        self._pyramid = None
+
+    def __contains__(self, key):
+        return key in self.key_set
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        """Memory used by the power (on disk if it is memory mapped)"""
+        return self.power.nbytes
+
+    @property
+    def mapped(self):
+        """It is True if the power is memory mapped"""
+        return isinstance(self.power, np.memmap)
+
+    @classmethod
+    def from_data(cls, data, mmap_bytes=ACOUSTIC_MMAP_BYTES):
+        """
+        It moves the acoustic keys of data to an AcousticData.
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                WaterFrame.data.
+            mmap_bytes: int, optional (mmap_bytes = ACOUSTIC_MMAP_BYTES)
+                The power is memory mapped to a temporary file if it is
+                bigger. None keeps it in memory.
+        Returns
+        -------
+            (acoustic, data): (AcousticData, pandas.DataFrame)
+                acoustic is None if data has no acoustic keys. data has the
+                other keys.
+        """
+        frequencies, keys = acoustic_keys(data.keys())
+        if not keys:
+            return None, data
+        info_keys = [key for key in data.keys() if key in ACOUSTIC_INFO]
+        shape = (len(data.index), len(keys))
+        size = shape[0] * shape[1] * np.dtype(np.float32).itemsize
+        if mmap_bytes is not None and size > mmap_bytes:
+            power = _power_array(shape, True)
+            # Copied by columns, so only a column is converted at a time
+            for i, key in enumerate(keys):
+                power[:, i] = data[key].to_numpy()
+        else:
+            power = np.ascontiguousarray(
+                data[keys].to_numpy(dtype=np.float32))
+        acoustic = cls(data.index, frequencies, power, keys,
+                       data[info_keys])
+        return acoustic, data.drop(columns=keys + info_keys)
+
+    def to_frame(self):
+        """
+        It returns the spectra as a DataFrame like WaterFrame.data (info
+        columns and a column for each frequency), for widgets and functions
+        that work with pandas. Columns of the frequencies are a view of the
+        power.
+
+        Returns
+        -------
+            data: pandas.DataFrame
+        """
+        spectra = pd.DataFrame(self.power, index=self.index,
+                               columns=self.keys, copy=False)
+        if not len(self.info.columns):
+            return spectra
+        return pd.concat([self.info, spectra], axis=1)
+
+    def join(self, data):
+        """
+        It returns data with the columns of the spectra (the opposite of
+        from_data()).
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                Other keys of WaterFrame.data.
+        Returns
+        -------
+            data: pandas.DataFrame
+        """
+        if not len(data.columns):
+            return self.to_frame()
+        return pd.concat([data, self.to_frame()], axis=1)
+
+    def append(self, rows, index):
+        """
+        It returns the spectra with the acoustic keys of rows at the end. The
+        power is written in the free space of the buffer, that grows by
+        doubling, so appending rows does not copy the old spectra (like
+        AppendBuffer). The buffer is shared, so this AcousticData must not be
+        used after.
+
+        Parameters
+        ----------
+            rows: pandas.DataFrame
+                New rows of WaterFrame.data (missing keys are NaN).
+            index: pandas.Index
+                Index of the old and new rows (the index of WaterFrame.data
+                after the append).
+        Returns
+        -------
+            acoustic: AcousticData
+        """
+        size = len(self.index)
+        total = size + len(rows.index)
+        buffer = self.buffer
+        if total > len(buffer):
+            capacity = max(ACOUSTIC_MIN_CAPACITY, 2 * total)
+            shape = (capacity, len(self.keys))
+            buffer = _power_array(
+                shape, self.mapped or shape[0] * shape[1] *
+                np.dtype(np.float32).itemsize > ACOUSTIC_MMAP_BYTES)
+            buffer[:size] = self.power
+        buffer[size:total] = rows.reindex(columns=self.keys).to_numpy(
+            dtype=np.float32)
+        info = pd.concat([self.info,
+                          rows.reindex(columns=list(self.info.columns))])
+        info.index = index
+        return AcousticData(index, self.frequencies, buffer[:total],
+                            self.keys, info, buffer)
+
+    def pyramid(self):
+        """
+        It returns the SpectrogramPyramid of the spectra. Its first level is
+        the power, without copy. It is made once.
+
+        Returns
+        -------
+            pyramid: SpectrogramPyramid
+        """
+        if self._pyramid is None:
+            index = self.index
+            if isinstance(index, pd.MultiIndex):
+                index = index.get_level_values(
+                    "TIME" if "TIME" in index.names else 0)
+            self._pyramid = SpectrogramPyramid.from_power(
+                np.asarray(index).astype("datetime64[ns]"), self.frequencies,
+                self.power)
+        return self._pyramid
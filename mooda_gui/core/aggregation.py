@@ -0,0 +1,589 @@
+"""Cache of aggregations of the columns (time averages and moving windows), shared
+by all the plots"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Maximum size (bytes) of the cached results
+CACHE_BUDGET = 256 * 1024 * 1024
+
+_CACHE = None
+
+
+def result_size(value):
+    """
+    It returns the size in bytes of a cached result.
+
+    Parameters
+    ----------
+        value: numpy.ndarray, pandas object or tuple of them
+    Returns
+    -------
+        size: int
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(result_size(item) for item in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, np.ndarray) or hasattr(value, "nbytes"):
+        return value.nbytes
+    return 0
+
+
+class AggregationCache:
+    """
+    Results of aggregations by (operation, key, version of the column, ...)
+    keys. When the results exceed the memory budget, the least recently used
+    ones are removed (LRU). Results are read by Workers, so the cache is
+    thread safe, but they must not be modified.
+    """
+
+    def __init__(self, memory_budget=CACHE_BUDGET):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            memory_budget: int, optional (memory_budget = CACHE_BUDGET)
+                Maximum size of the results in bytes.
+        """
+        self.memory_budget = memory_budget
+        # {cache key: (result, size)}, from the least to the most recently
+        # used
+        self.results = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, cache_key, compute):
+        """
+        It returns the result of cache_key. If it is not in the cache, it is
+        calculated with compute().
+
+        Parameters
+        ----------
+            cache_key: tuple
+                Identifier of the result. It must contain the version of the
+                data that compute() uses.
+            compute: callable
+                compute(). Function that calculates the result.
+        Returns
+        -------
+            result: object
+        """
+        with self.lock:
+            if cache_key in self.results:
+                self.results.move_to_end(cache_key)
+                return self.results[cache_key][0]
+        # The lock is not held while the result is calculated
+        result = compute()
+        size = result_size(result)
+        with self.lock:
+            if cache_key not in self.results and size <= self.memory_budget:
+                self.results[cache_key] = (result, size)
+                self.size += size
+                self.evict()
+        return result
+
+    def peek(self, cache_key):
+        """
+        It returns the result of cache_key or None if it is not in the cache.
+
+        Parameters
+        ----------
+            cache_key: tuple
+        Returns
+        -------
+            result: object or None
+        """
+        with self.lock:
+            if cache_key not in self.results:
+                return None
+            self.results.move_to_end(cache_key)
+            return self.results[cache_key][0]
+
+    def put(self, cache_key, result):
+        """
+        It adds a result that has been calculated from another one (i.e. a
+        new version of a cached result).
+
+        Parameters
+        ----------
+            cache_key: tuple
+            result: object
+        """
+        size = result_size(result)
+        with self.lock:
+            if cache_key in self.results:
+                self.size -= self.results.pop(cache_key)[1]
+            if size <= self.memory_budget:
+                self.results[cache_key] = (result, size)
+                self.size += size
+                self.evict()
+
+    def evict(self):
+        """It removes the least recently used results that do not fit in the
+        memory budget"""
+        while self.size > self.memory_budget and self.results:
+            _, (_, size) = self.results.popitem(last=False)
+            self.size -= size
+
+    def clear(self):
+        """It removes all the results"""
+        with self.lock:
+            self.results.clear()
+            self.size = 0
+
+
+def aggregation_cache():
+    """
+    It returns the cache shared by the plots. It is created the first time
+    that it is used.
+
+    Returns
+    -------
+        cache: AggregationCache
+    """
+    global _CACHE  # pylint: disable=global-statement
+    if _CACHE is None:
+        _CACHE = AggregationCache()
+    return _CACHE
+
+
+def time_average(series, rule=None, pyramid=None):
+    """
+    It returns the values of a series without NaN indexed by TIME, averaged
+    by time intervals, like WaterFrame.tsplot().
+
+    Parameters
+    ----------
+        series: pandas.Series
+            Column of WaterFrame.data.
+        rule: str, optional (rule = None)
+            Resample rule (i.e. "H"). None does not average.
+        pyramid: AggregationPyramid, optional (pyramid = None)
+            Pyramid of the series. The average is made from its buckets if
+            the series has a single index.
+    Returns
+    -------
+        data: pandas.DataFrame
+            The column and the other levels of the index.
+    """
+    if pyramid is not None and rule in RULE_MINUTES and \
+       not isinstance(series.index, pd.MultiIndex):
+        return pyramid.aggregate(rule)[["mean"]].rename(
+            columns={"mean": series.name})
+    data = series.dropna().reset_index().set_index("TIME")
+    if rule is not None:
+        data = data.resample(rule).mean()
+    return data
+
+
+def auto_window(size):
+    """Size of the moving window of WaterFrame.tsplot() for size values"""
+    if size <= 100:
+        return 1
+    if size <= 1000:
+        return size // 10
+    if size <= 10000:
+        return size // 100
+    return size // 1000
+
+
+def moving_mean_std(data, key, window=None):
+    """
+    It returns the centered moving mean and standard deviation of a column,
+    like WaterFrame.tsplot().
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+            Result of time_average().
+        key: str
+        window: int, optional (window = None)
+            Size of the moving window. None is auto_window(data.size).
+    Returns
+    -------
+        (x, mean, std): (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    if window is None:
+        window = auto_window(data.size)
+    roll = data[key].rolling(window, center=True).agg(["mean", "std"])
+    return (np.asarray(roll.index), roll["mean"].to_numpy(),
+            roll["std"].to_numpy())
+
+
+# Pyramid of time aggregations
+# Nanoseconds of a minute, the buckets of the first level
+MINUTE = 60 * 10**9
+# Minutes of the buckets of each resample rule of mooda_gui
+RULE_MINUTES = {"T": 1, "min": 1, "H": 60, "h": 60, "D": 24 * 60,
+                "W": 7 * 24 * 60}
+# Frequencies of pandas for the rules
+PANDAS_RULES = {"T": "min", "min": "min", "H": "h", "h": "h", "D": "D",
+                "W": "W-SUN"}
+# Weeks of pandas go from Monday to Sunday and their label is the Sunday.
+# 1970-01-01 was a Thursday, so weeks start 3 days before the epoch
+WEEK_OFFSET = 3 * 24 * 60
+
+
+def series_values(series):
+    """
+    It returns the times and the values of a column.
+
+    Parameters
+    ----------
+        series: pandas.Series
+            Column with a TIME index (or a MultiIndex with a TIME level).
+    Returns
+    -------
+        times, values: numpy.ndarray, numpy.ndarray
+    """
+    index = series.index
+    if isinstance(index, pd.MultiIndex):
+        index = index.get_level_values("TIME" if "TIME" in index.names else 0)
+    return np.asarray(index), series.to_numpy()
+
+
+def _reduce_buckets(ids, count, total, squares, minimum, maximum):
+    """It joins the consecutive elements with the same id (ids are
+    ordered)"""
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) \
+        if len(ids) else np.array([], dtype=np.int64)
+    if len(starts) == len(ids):
+        return ids, count, total, squares, minimum, maximum
+    return (ids[starts], np.add.reduceat(count, starts),
+            np.add.reduceat(total, starts), np.add.reduceat(squares, starts),
+            np.minimum.reduceat(minimum, starts),
+            np.maximum.reduceat(maximum, starts))
+
+
+class AggregationPyramid:
+    """
+    Count, sum, sum of squares, min and max of the values of a column in
+    buckets of one minute. Buckets of an hour, a day or a week are made from
+    the minutes, so averages, standard deviations and extremes of any rule
+    are calculated from the buckets, without reading the values again.
+    Sums are of the differences with a reference value, to keep the precision
+    of the standard deviation. Pyramids are not modified: append() and
+    slice() return new pyramids.
+    """
+
+    def __init__(self, minutes, count, total, squares, minimum, maximum,
+                 reference=0.0, dtype=np.float64):
+        """
+        Constructor. Use from_series() or from_values() to make a pyramid.
+
+        Parameters
+        ----------
+            minutes: numpy.ndarray
+                Ordered ids of the buckets with values (minutes since the
+                epoch).
+            count, total, squares, minimum, maximum: numpy.ndarray
+                Values of each bucket.
+            reference: float, optional (reference = 0.0)
+                Value subtracted before the sums.
+            dtype: numpy.dtype, optional (dtype = numpy.float64)
+                Type of the results (type of the column).
+        """
+        self.minutes = minutes
+        self.count = count
+        self.total = total
+        self.squares = squares
+        self.minimum = minimum
+        self.maximum = maximum
+        self.reference = reference
+        self.dtype = dtype
+        # Buckets of each rule: {minutes of the buckets: arrays}
+        self.levels = {}
+
+    @property
+    def nbytes(self):
+        """Size of the buckets in bytes"""
+        return sum(array.nbytes for array in [
+            self.minutes, self.count, self.total, self.squares, self.minimum,
+            self.maximum])
+
+    @classmethod
+    def from_values(cls, times, values, reference=None, dtype=None):
+        """
+        It makes the pyramid of some values with a single vectorised pass.
+
+        Parameters
+        ----------
+            times: numpy.ndarray
+                datetime64 times.
+            values: numpy.ndarray
+                Values, NaN are ignored.
+            reference: float, optional (reference = None)
+                Value subtracted before the sums. None is the first value.
+            dtype: numpy.dtype, optional (dtype = None)
+                Type of the results. None is the type of values.
+        Returns
+        -------
+            pyramid: AggregationPyramid
+        """
+        if dtype is None:
+            dtype = values.dtype if values.dtype.kind == "f" else np.float64
+        values = np.asarray(values, dtype=np.float64)
+        times = np.asarray(times).astype("datetime64[ns]").view(np.int64)
+        valid = ~np.isnan(values)
+        times, values = times[valid], values[valid]
+        if len(times) > 1 and not (times[1:] >= times[:-1]).all():
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+        if reference is None:
+            reference = float(values[0]) if len(values) else 0.0
+        deviations = values - reference
+        buckets = _reduce_buckets(times // MINUTE,
+                                  np.ones(len(values), dtype=np.int64),
+                                  deviations, deviations * deviations,
+                                  values, values)
+        return cls(*buckets, reference=reference, dtype=dtype)
+
+    @classmethod
+    def from_series(cls, series):
+        """
+        It makes the pyramid of a column.
+
+        Parameters
+        ----------
+            series: pandas.Series
+                Numeric column with a TIME index (or a MultiIndex with a TIME
+                level).
+        Returns
+        -------
+            pyramid: AggregationPyramid
+        """
+        return cls.from_values(*series_values(series))
+
+    def buckets(self, rule):
+        """
+        It returns the buckets of a rule.
+
+        Parameters
+        ----------
+            rule: str
+                "T", "H", "D" or "W" (or the pandas names "min" and "h").
+        Returns
+        -------
+            (ids, count, total, squares, minimum, maximum): numpy.ndarray
+                ids are numbers of buckets of the rule since the epoch.
+        """
+        step = RULE_MINUTES[rule]
+        if step == 1:
+            return (self.minutes, self.count, self.total, self.squares,
+                    self.minimum, self.maximum)
+        if step not in self.levels:
+            offset = WEEK_OFFSET if rule == "W" else 0
+            self.levels[step] = _reduce_buckets(
+                (self.minutes + offset) // step, self.count, self.total,
+                self.squares, self.minimum, self.maximum)
+        return self.levels[step]
+
+    @staticmethod
+    def bucket_id(time, rule):
+        """It returns the id of the bucket of a rule that contains time"""
+        minute = pd.Timestamp(time).value // MINUTE
+        offset = WEEK_OFFSET if rule == "W" else 0
+        return (minute + offset) // RULE_MINUTES[rule]
+
+    @staticmethod
+    def bucket_label(bucket_id, rule):
+        """It returns the label of a bucket, like pandas resample()"""
+        if rule == "W":
+            # The Sunday of the week
+            minute = bucket_id * RULE_MINUTES[rule] - WEEK_OFFSET + 6 * 24 * 60
+        else:
+            minute = bucket_id * RULE_MINUTES[rule]
+        return pd.Timestamp(minute * MINUTE)
+
+    def aggregate(self, rule, start=None, end=None):
+        """
+        It returns the statistics of the buckets of a rule, with the same
+        index than pandas resample() (empty buckets are NaN).
+
+        Parameters
+        ----------
+            rule: str
+                "T", "H", "D" or "W".
+            start: Timestamp, optional (start = None)
+                First time of the index. None is the first value.
+            end: Timestamp, optional (end = None)
+                Last time of the index. None is the last value.
+        Returns
+        -------
+            stats: pandas.DataFrame
+                Columns count, mean, std, min and max. Index TIME.
+        """
+        ids, count, total, squares, minimum, maximum = self.buckets(rule)
+        if start is not None:
+            first = self.bucket_id(start, rule)
+        else:
+            first = ids[0] if len(ids) else 0
+        if end is not None:
+            last = self.bucket_id(end, rule)
+        else:
+            last = ids[-1] if len(ids) else -1
+        size = max(int(last - first) + 1, 0)
+        index = pd.date_range(self.bucket_label(first, rule), periods=size,
+                              freq=PANDAS_RULES[rule], name="TIME")
+        inside = (ids >= first) & (ids <= last)
+        positions = (ids[inside] - first).astype(np.int64)
+
+        def dense(values, fill):
+            array = np.full(size, fill, dtype=values.dtype)
+            array[positions] = values[inside]
+            return array
+
+        count = dense(count, 0)
+        total = dense(total, 0.0)
+        squares = dense(squares, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            variance = (squares - total * mean) / (count - 1)
+        variance[count < 2] = np.nan
+        std = np.sqrt(np.maximum(variance, 0.0), where=~np.isnan(variance),
+                      out=np.full(size, np.nan))
+        return pd.DataFrame({
+            "count": count,
+            "mean": (mean + self.reference).astype(self.dtype),
+            "std": std.astype(self.dtype),
+            "min": dense(minimum, np.nan).astype(self.dtype),
+            "max": dense(maximum, np.nan).astype(self.dtype)}, index=index)
+
+    def append(self, times, values):
+        """
+        It returns a pyramid with new values, that are not older than the
+        last bucket.
+
+        Parameters
+        ----------
+            times: numpy.ndarray
+            values: numpy.ndarray
+        Returns
+        -------
+            pyramid: AggregationPyramid
+        """
+        new = AggregationPyramid.from_values(times, values, self.reference,
+                                             self.dtype)
+        if not len(new.minutes):
+            return self
+        if len(self.minutes) and new.minutes[0] < self.minutes[-1]:
+            raise ValueError("Values are older than the last bucket")
+        return AggregationPyramid(*_reduce_buckets(*[
+            np.concatenate([old, added]) for old, added in zip(
+                [self.minutes, self.count, self.total, self.squares,
+                 self.minimum, self.maximum],
+                [new.minutes, new.count, new.total, new.squares, new.minimum,
+                 new.maximum])]), reference=self.reference, dtype=self.dtype)
+
+    def slice(self, series, start=None, end=None):
+        """
+        It returns the pyramid of the values between start and end. The
+        buckets of start and end are made again from the sliced column, the
+        other ones are kept.
+
+        Parameters
+        ----------
+            series: pandas.Series
+                Column sliced between start and end.
+            start: Timestamp, optional (start = None)
+            end: Timestamp, optional (end = None)
+        Returns
+        -------
+            pyramid: AggregationPyramid
+        """
+        inside = np.ones(len(self.minutes), dtype=bool)
+        edges = []
+        if start is not None:
+            edges.append(self.bucket_id(start, "T"))
+            inside &= self.minutes > edges[-1]
+        if end is not None:
+            edges.append(self.bucket_id(end, "T"))
+            inside &= self.minutes < edges[-1]
+        # Values of the sliced column in the minutes of start and end
+        times, values = series_values(series)
+        times = np.asarray(times).astype("datetime64[ns]").view(np.int64)
+        in_edges = np.isin(times // MINUTE, np.unique(edges))
+        new = AggregationPyramid.from_values(
+            times[in_edges].view("datetime64[ns]"), values[in_edges],
+            self.reference, self.dtype)
+        columns = [np.concatenate([old[inside], added]) for old, added in zip(
+            [self.minutes, self.count, self.total, self.squares, self.minimum,
+             self.maximum],
+            [new.minutes, new.count, new.total, new.squares, new.minimum,
+             new.maximum])]
+        order = np.argsort(columns[0], kind="stable")
+        return AggregationPyramid(*[column[order] for column in columns],
+                                  reference=self.reference, dtype=self.dtype)
+
+
+def pyramid_keys(data):
+    """
+    It returns the keys of data that have an AggregationPyramid: numeric
+    columns that are not QC flags.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+    Returns
+    -------
+        keys: list of str
+    """
+    return [key for key in data.keys() if not key.endswith("_QC") and
+            pd.api.types.is_numeric_dtype(data[key].dtype)]
+
+
+def column_pyramid(series, version=None):
+    """
+    It returns the AggregationPyramid of a column, from the aggregation
+    cache.
+
+    Parameters
+    ----------
+        series: pandas.Series
+            Column of WaterFrame.data.
+        version: object, optional (version = None)
+            Version of the column (DataState.key_version()). None does not
+            use the cache.
+    Returns
+    -------
+        pyramid: AggregationPyramid
+    """
+    if version is None:
+        return AggregationPyramid.from_series(series)
+    return aggregation_cache().get(
+        ("pyramid", series.name, version),
+        lambda: AggregationPyramid.from_series(series))
+
+
+def cache_pyramids(data, versions, progress=None):
+    """
+    It makes the AggregationPyramid of the columns and it saves them in the
+    aggregation cache. It is used after a file is opened.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+        versions: dict
+            {key: version of the column}.
+        progress: callable, optional (progress = None)
+            progress(percentage, message).
+    """
+    for i, (key, version) in enumerate(versions.items()):
+        if progress is not None:
+            progress(100 * i // max(len(versions), 1),
+                     "Aggregating {}".format(key))
+        try:
+            series = data[key]
+        except KeyError:
+            # The column has been deleted
+            continue
+        column_pyramid(series, version)
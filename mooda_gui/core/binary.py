@@ -0,0 +1,226 @@
+"""Mooda binary format (.mbin). Each column of the WaterFrame is saved as a
+contiguous array aligned to ALIGNMENT bytes, so the file can be opened with a
+memory map without parsing or copying the values.
+
+File layout:
+    - MAGIC (8 bytes), version (uint32) and length of the header (uint32).
+    - Header: JSON with the metadata, meaning, number of rows and, for each
+      index level and column, its name, dtype and offset.
+    - Data section, that starts at the first aligned position after the
+      header. Offsets of the header are relative to the data section."""
+
+import json
+import os
+import struct
+import numpy as np
+import pandas as pd
+from mooda import WaterFrame
+
+MAGIC = b"MOODABIN"
+VERSION = 1
+# Alignment (bytes) of the header end and of each array
+ALIGNMENT = 64
+
+
+def _no_progress(percentage, message=""):  # pylint: disable=unused-argument
+    """Default progress callback, it does nothing"""
+
+
+def _aligned(position):
+    """It returns the first aligned position after position"""
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def _json_value(value):
+    """It converts numpy values of metadata and meaning to JSON values"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _array(values):
+    """
+    It converts the values of a column or index level to a numpy array that
+    can be memory mapped.
+
+    Parameters
+    ----------
+        values: pandas Series or Index
+    Returns
+    -------
+        array: numpy.ndarray
+            Contiguous array of a fixed size dtype.
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_convert(None) if isinstance(values, pd.Series) \
+            else values.tz_convert(None)
+    array = np.asarray(values)
+    if array.dtype.kind == "O" or isinstance(values.dtype, pd.CategoricalDtype):
+        # Texts are saved as fixed size unicode
+        array = array.astype(str)
+    elif array.dtype.kind == "M":
+        array = array.astype("datetime64[ns]")
+    return np.ascontiguousarray(array)
+
+
+def write_binary(path, wf, progress=None):  # pylint: disable=C0103
+    """
+    It saves the WaterFrame in the mooda binary format.
+
+    Parameters
+    ----------
+        path: str
+            Path of the file.
+        wf: WaterFrame
+            Data to save.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called after each column.
+
+    Returns
+    -------
+        True: bool
+            The file is saved.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    # Arrays to save and their description
+    arrays = []
+    index_info = []
+    column_info = []
+    offset = 0
+    levels = [wf.data.index.get_level_values(i)
+              for i in range(wf.data.index.nlevels)]
+    for info, name, values in \
+            [(index_info, level.name, level) for level in levels] + \
+            [(column_info, key, wf.data[key]) for key in wf.data.keys()]:
+        array = _array(values)
+        info.append({"name": name, "dtype": array.dtype.str, "offset": offset})
+        arrays.append(array)
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({
+        "rows": len(wf.data.index),
+        "index": index_info,
+        "columns": column_info,
+        "metadata": wf.metadata,
+        "meaning": wf.meaning}, default=_json_value).encode()
+    data_start = _aligned(16 + len(header))
+
+    # Windows can not replace a file that is memory mapped
+    if os.name == "nt" and maps_file(wf, path):
+        raise PermissionError(
+            "{} is opened and its columns are memory mapped, it can not be "
+            "replaced. Save the data with another name.".format(path))
+    # The file is written with a temporal name, so a broken saving does not
+    # replace a good file. On POSIX systems, the columns of a file that is
+    # memory mapped by read_binary() (i.e. the opened file) keep the old file
+    # after it is replaced.
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<II", VERSION, len(header)))
+            file.write(header)
+            for i, (array, info) in enumerate(zip(arrays,
+                                                  index_info + column_info)):
+                file.seek(data_start + info["offset"])
+                array.tofile(file)
+                progress(100 * (i + 1) / len(arrays),
+                         "Saving {}".format(info["name"]))
+            # The last array could be shorter than the alignment
+            file.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return True
+
+
+def maps_file(wf, path):  # pylint: disable=C0103
+    """
+    It returns True if a column or an index level of the WaterFrame is
+    memory mapped to the file (i.e. it was opened with read_binary()).
+
+    Parameters
+    ----------
+        wf: WaterFrame
+        path: str
+            Path of the file.
+    Returns
+    -------
+        True/False: bool
+    """
+    if not os.path.exists(path):
+        return False
+    index = wf.data.index
+    levels = [index.get_level_values(i) for i in range(index.nlevels)]
+    for values in levels + [wf.data[key] for key in wf.data.keys()]:
+        array = np.asarray(values)
+        while array is not None:
+            filename = getattr(array, "filename", None)
+            if isinstance(array, np.memmap) and filename is not None and \
+               os.path.exists(filename) and os.path.samefile(filename, path):
+                return True
+            array = array.base if isinstance(array.base, np.ndarray) \
+                else None
+    return False
+
+
+def read_binary(path, progress=None):
+    """
+    It opens a file of the mooda binary format. Columns are memory mapped in
+    copy-on-write mode: they are read from disk when they are used and
+    changes (i.e. new QC flags) are not written to the file.
+
+    Parameters
+    ----------
+        path: str
+            Path of the file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message)
+
+    Returns
+    -------
+        wf: WaterFrame or None
+            Data of the file. None if it is not a mooda binary file.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        version, header_size = struct.unpack("<II", file.read(8))
+        if version > VERSION:
+            return None
+        header = json.loads(file.read(header_size).decode())
+    data_start = _aligned(16 + header_size)
+    rows = header["rows"]
+
+    progress(0, "Mapping {}".format(path))
+    memory = np.memmap(path, dtype=np.uint8, mode="c")
+
+    def view(info):
+        """Array of the file described by info, without copy"""
+        dtype = np.dtype(info["dtype"])
+        start = data_start + info["offset"]
+        return memory[start:start + rows * dtype.itemsize].view(dtype)
+
+    levels = [pd.Index(view(info), name=info["name"], copy=False)
+              for info in header["index"]]
+    if len(levels) == 1:
+        index = levels[0]
+    else:
+        index = pd.MultiIndex.from_arrays(levels)
+
+    wf = WaterFrame()  # pylint: disable=C0103
+    wf.data = pd.DataFrame({info["name"]: view(info)
+                            for info in header["columns"]},
+                           index=index, copy=False)
+    wf.metadata = header["metadata"]
+    wf.meaning = header["meaning"]
+    progress(100, "{} mapped".format(path))
+
+    return wf
@@ -0,0 +1,209 @@
+"""Columnar (Feather) cache of the opened files. The second time that a file
+is opened, its data is read from the cache instead of parsing the file again.
+The size of the cache is limited, the least recently used files are deleted.
+The cache needs pyarrow, without it the files are always parsed."""
+
+import hashlib
+import json
+import os
+import pandas as pd
+from mooda import WaterFrame
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None  # pylint: disable=C0103
+
+# Folder of the cache files
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".mooda_gui", "cache")
+# Maximum size (bytes) of the cache files
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _json_value(value):
+    """It converts numpy values of metadata and meaning to JSON values"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _source_info(path):
+    """It returns the absolute path, size and modification time of a file"""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def cache_paths(path):
+    """
+    It returns the paths of the cache files of a data file.
+
+    Parameters
+    ----------
+        path: str
+            Path of the data file.
+    Returns
+    -------
+        (data_path, info_path): (str, str)
+            Path of the Feather file with the data and path of the JSON file
+            with metadata, meaning and the source information.
+    """
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return (os.path.join(CACHE_PATH, name + ".feather"),
+            os.path.join(CACHE_PATH, name + ".json"))
+
+
+def read_cache(path, progress=None):
+    """
+    It reads the cache of a data file. The cache is only valid if the file
+    has the same size and modification time than when the cache was written.
+
+    Parameters
+    ----------
+        path: str
+            Path of the data file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message)
+
+    Returns
+    -------
+        wf: WaterFrame or None
+            Data of the cache. None if there is no valid cache.
+    """
+    if feather is None:
+        return None
+    data_path, info_path = cache_paths(path)
+    if not os.path.isfile(data_path) or not os.path.isfile(info_path):
+        return None
+    with open(info_path, "r") as info_file:
+        info = json.load(info_file)
+    source, size, mtime = _source_info(path)
+    if [info.get("source"), info.get("size"), info.get("mtime")] != \
+       [source, size, mtime]:
+        return None
+
+    if progress is not None:
+        progress(0, "Reading cache of {}".format(path))
+    # Uncompressed Feather files are read without parsing, but the columns
+    # are copied to pandas. They are not consolidated in blocks and the index
+    # is made apart, so they are copied only once.
+    table = feather.read_table(data_path, memory_map=True)
+    keys = [key for key in table.column_names if key not in info["index"]]
+    index = table.select(info["index"]).to_pandas()
+    wf = WaterFrame()  # pylint: disable=C0103
+    wf.data = table.select(keys).to_pandas(split_blocks=True)
+    if len(info["index"]) == 1:
+        wf.data.index = pd.Index(index.iloc[:, 0], name=info["index"][0])
+    else:
+        wf.data.index = pd.MultiIndex.from_frame(index)
+    wf.metadata = info["metadata"]
+    wf.meaning = info["meaning"]
+    # The modification time of the info file is the last use of the cache
+    try:
+        os.utime(info_path)
+    except OSError:
+        pass
+    if progress is not None:
+        progress(100, "Cache of {} read".format(path))
+    return wf
+
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES, keep=None):
+    """
+    It deletes the least recently used cache files until the cache is not
+    bigger than max_bytes.
+
+    Parameters
+    ----------
+        max_bytes: int, optional (max_bytes = CACHE_MAX_BYTES)
+        keep: str, optional (keep = None)
+            Path of a data file whose cache is not deleted (i.e. the cache
+            that has just been written).
+    Returns
+    -------
+        deleted: int
+            Number of deleted caches.
+    """
+    keep_paths = cache_paths(keep) if keep is not None else ()
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(CACHE_PATH)
+    except OSError:
+        return 0
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        info_path = os.path.join(CACHE_PATH, name)
+        data_path = info_path[:-len(".json")] + ".feather"
+        try:
+            info_stat = os.stat(info_path)
+            last_use, size = info_stat.st_mtime_ns, info_stat.st_size
+            if os.path.isfile(data_path):
+                size += os.stat(data_path).st_size
+        except OSError:
+            continue
+        total += size
+        if info_path not in keep_paths:
+            entries.append((last_use, size, data_path, info_path))
+    deleted = 0
+    for _last_use, size, data_path, info_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            # Without the info file, the data file is not used
+            os.remove(info_path)
+            if os.path.isfile(data_path):
+                os.remove(data_path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+    return deleted
+
+
+def write_cache(path, wf, max_bytes=CACHE_MAX_BYTES):  # pylint: disable=C0103
+    """
+    It writes the cache of a data file. The least recently used caches are
+    deleted if the cache is bigger than max_bytes.
+
+    Parameters
+    ----------
+        path: str
+            Path of the data file.
+        wf: WaterFrame
+            Data of the file.
+        max_bytes: int, optional (max_bytes = CACHE_MAX_BYTES)
+            Maximum size of the cache. Data that is bigger is not cached.
+
+    Returns
+    -------
+        True/False: bool
+            It indicates if the cache was written.
+    """
+    if feather is None:
+        return False
+    if wf.data.memory_usage(index=True, deep=False).sum() > max_bytes:
+        return False
+    data_path, info_path = cache_paths(path)
+    source, size, mtime = _source_info(path)
+    frame = wf.data.reset_index()
+    info = {
+        "source": source,
+        "size": size,
+        "mtime": mtime,
+        "index": list(frame.columns[:wf.data.index.nlevels]),
+        "metadata": wf.metadata,
+        "meaning": wf.meaning}
+    try:
+        os.makedirs(CACHE_PATH, exist_ok=True)
+        # Files are written with a temporal name, so a cache is never half
+        # written
+        feather.write_feather(frame, data_path + ".tmp",
+                              compression="uncompressed")
+        with open(info_path + ".tmp", "w") as info_file:
+            json.dump(info, info_file, default=_json_value)
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(info_path + ".tmp", info_path)
+    except (OSError, ValueError, TypeError):
+        return False
+    prune_cache(max_bytes, keep=path)
+    return True
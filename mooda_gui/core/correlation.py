@@ -0,0 +1,232 @@
+"""Correlation coefficients of the columns of the working data. Coefficients
+are kept for each pair of keys, so a matrix with a new key only calculates the
+new pairs"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from mooda_gui.core.aggregation import aggregation_cache
+
+# Correlation methods, like DataFrame.corr()
+CORRELATION_METHODS = ("pearson", "spearman")
+# Number of rows of a chunk
+CORRELATION_CHUNK = 64 * 1024
+
+
+def average_ranks(values):
+    """
+    It returns the ranks of some values, with the average rank for ties (like
+    Series.rank()).
+
+    Parameters
+    ----------
+        values: numpy.ndarray
+            Values without NaN.
+    Returns
+    -------
+        ranks: numpy.ndarray
+    """
+    # Ties have the same rank, so the sort does not need to be stable
+    sorter = np.argsort(values)
+    inverse = np.empty(len(values), dtype=np.int64)
+    inverse[sorter] = np.arange(len(values))
+    ordered = values[sorter]
+    first = np.concatenate([[True], ordered[1:] != ordered[:-1]])
+    dense = np.cumsum(first)[inverse]
+    bounds = np.concatenate([np.flatnonzero(first), [len(values)]])
+    return 0.5 * (bounds[dense] + bounds[dense - 1] + 1)
+
+
+def column_ranks(data, keys):
+    """
+    It returns the ranks of the values of the keys, NaN where there are no
+    values.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+        keys: list of str
+    Returns
+    -------
+        ranks: numpy.ndarray
+            Array of (rows, keys).
+    """
+    ranks = np.full((len(data.index), len(keys)), np.nan)
+    for i, key in enumerate(keys):
+        values = data[key].to_numpy()
+        valid = ~np.isnan(values)
+        ranks[valid, i] = average_ranks(values[valid])
+    return ranks
+
+
+def pearson_matrix(values, pairs):
+    """
+    It returns the Pearson coefficients of pairs of columns with pairwise
+    masks (rows with NaN in any column of a pair are ignored for that pair).
+    All the pairs are calculated with a single pass over the rows: the sums
+    of each pair are products of the chunks of values and masks.
+
+    Parameters
+    ----------
+        values: numpy.ndarray
+            Array of (rows, columns). Float32 values are converted by chunks.
+        pairs: list of (int, int)
+            Positions of the columns of each pair.
+    Returns
+    -------
+        coefficients: list of (float, int)
+            Coefficient and number of rows of each pair.
+    """
+    columns = values.shape[1]
+    # Values are centred with the means of the first chunk, so the sums do
+    # not lose precision
+    with warnings.catch_warnings():
+        # Columns without values
+        warnings.simplefilter("ignore", RuntimeWarning)
+        centre = np.nan_to_num(np.nanmean(
+            np.asarray(values[:CORRELATION_CHUNK], dtype=np.float64), axis=0))
+    count = np.zeros((columns, columns))
+    sum_x = np.zeros((columns, columns))
+    sum_xx = np.zeros((columns, columns))
+    sum_xy = np.zeros((columns, columns))
+    for start in range(0, len(values), CORRELATION_CHUNK):
+        chunk = np.asarray(values[start:start + CORRELATION_CHUNK],
+                           dtype=np.float64) - centre
+        nan = np.isnan(chunk)
+        if nan.any():
+            mask = (~nan).astype(np.float64)
+            chunk[nan] = 0.0
+            # [i, j]: sums of the column i in the rows with values of i and j
+            count += mask.T @ mask
+            sum_x += chunk.T @ mask
+            sum_xx += (chunk * chunk).T @ mask
+            sum_xy += chunk.T @ chunk
+        else:
+            # Products with a vector of ones are faster than sum(axis=0)
+            products = chunk.T @ chunk
+            count += len(chunk)
+            sum_x += (np.ones(len(chunk)) @ chunk)[:, np.newaxis]
+            sum_xx += np.diag(products)[:, np.newaxis]
+            sum_xy += products
+    coefficients = []
+    for i, j in pairs:
+        size = count[i, j]
+        covariance = size * sum_xy[i, j] - sum_x[i, j] * sum_x[j, i]
+        variance_x = size * sum_xx[i, j] - sum_x[i, j] ** 2
+        variance_y = size * sum_xx[j, i] - sum_x[j, i] ** 2
+        if size < 2 or variance_x <= 0 or variance_y <= 0:
+            coefficient = np.nan
+        else:
+            coefficient = covariance / np.sqrt(variance_x * variance_y)
+            coefficient = float(np.clip(coefficient, -1.0, 1.0))
+        coefficients.append((coefficient, int(size)))
+    return coefficients
+
+
+def spearman_pair(x, y):
+    """
+    It returns the Spearman coefficient of two columns, ranking the rows with
+    values in both columns.
+
+    Parameters
+    ----------
+        x: numpy.ndarray
+        y: numpy.ndarray
+    Returns
+    -------
+        (coefficient, rows): (float, int)
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    ranks = np.column_stack([average_ranks(x[valid]), average_ranks(y[valid])])
+    return pearson_matrix(ranks, [(0, 1)])[0]
+
+
+def correlation_pairs(data, pairs, method="pearson"):
+    """
+    It calculates the correlation coefficients of pairs of keys.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+        pairs: list of (str, str)
+        method: str, optional (method = "pearson")
+            "pearson" or "spearman".
+    Returns
+    -------
+        coefficients: dict
+            {(key, key): (coefficient, number of rows)}.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError("Unknown correlation method {}".format(method))
+    keys = list(dict.fromkeys(key for pair in pairs for key in pair))
+    positions = {key: i for i, key in enumerate(keys)}
+    if method == "pearson":
+        values = np.column_stack([data[key].to_numpy() for key in keys])
+        if values.dtype.kind != "f":
+            values = values.astype(np.float64)
+        return dict(zip(pairs, pearson_matrix(
+            values, [(positions[x], positions[y]) for x, y in pairs])))
+    # Ranks of the whole columns are only valid if all the keys have values
+    # in the same rows
+    masks = np.column_stack([data[key].isna().to_numpy() for key in keys])
+    if (masks == masks[:, :1]).all():
+        ranks = column_ranks(data, keys)
+        return dict(zip(pairs, pearson_matrix(
+            ranks, [(positions[x], positions[y]) for x, y in pairs])))
+    return {(x, y): spearman_pair(data[x].to_numpy(), data[y].to_numpy())
+            for x, y in pairs}
+
+
+def correlation_matrix(data, keys, method="pearson", versions=None):
+    """
+    It returns the correlation matrix of the keys, like DataFrame.corr().
+    Coefficients of each pair are kept in the aggregation cache by the
+    versions of the keys, so only the pairs that are not in the cache are
+    calculated.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+            WaterFrame.data.
+        keys: list of str
+        method: str, optional (method = "pearson")
+            "pearson" or "spearman".
+        versions: dict, optional (versions = None)
+            {key: version of the key} (DataState.key_version()). None does
+            not use the cache.
+    Returns
+    -------
+        (matrix, rows): (pandas.DataFrame, pandas.DataFrame)
+            Coefficients and number of rows used for each pair.
+    """
+    keys = list(dict.fromkeys(keys))
+    cache = aggregation_cache()
+
+    def cache_key(pair):
+        return ("correlation", method) + pair + (versions[pair[0]],
+                                                  versions[pair[1]])
+
+    # Pairs in order of the names, so (a, b) and (b, a) are the same pair
+    pairs = sorted({tuple(sorted((x, y))) for x in keys for y in keys})
+    coefficients = {}
+    missing = []
+    for pair in pairs:
+        result = None if versions is None else cache.peek(cache_key(pair))
+        if result is None:
+            missing.append(pair)
+        else:
+            coefficients[pair] = result
+    if missing:
+        computed = correlation_pairs(data, missing, method)
+        coefficients.update(computed)
+        if versions is not None:
+            for pair, result in computed.items():
+                cache.put(cache_key(pair), result)
+    matrix = pd.DataFrame(np.nan, index=keys, columns=keys)
+    rows = pd.DataFrame(0, index=keys, columns=keys)
+    for x in keys:
+        for y in keys:
+            coefficient, size = coefficients[tuple(sorted((x, y)))]
+            matrix.loc[x, y] = coefficient
+            rows.loc[x, y] = size
+    return matrix, rows
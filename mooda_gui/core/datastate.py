@@ -0,0 +1,180 @@
+"""Versions of the columns of the working data. Plots remember the version of
+the data they were made with, so only the plots whose keys have changed are
+made again"""
+
+from mooda_gui.core.summary import ColumnSummary
+
+
+class DataState:
+    """
+    Version counters of the columns of a WaterFrame. There is a global
+    counter that grows with every change; each key keeps the value of the
+    counter at its last change, and changes of the index (i.e. resample,
+    slice or new rows) change all the keys. It also keeps the ColumnSummary
+    of the keys, made again when the key changes.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # Global counter
+        self.version = 0
+        # Version of the last change of the index
+        self.index_version = 0
+        # {key: version of the last change}
+        self.versions = {}
+        # {key: (version, ColumnSummary)}
+        self.summaries = {}
+
+    def touch(self, keys):
+        """
+        It marks keys as changed.
+
+        Parameters
+        ----------
+            keys: str or list of str
+        Returns
+        -------
+            version: int
+                New version of the data.
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        self.version += 1
+        for key in keys:
+            self.versions[key] = self.version
+        return self.version
+
+    def touch_index(self):
+        """
+        It marks all the keys as changed (the index has changed).
+
+        Returns
+        -------
+            version: int
+                New version of the data.
+        """
+        self.version += 1
+        self.index_version = self.version
+        return self.version
+
+    def rename(self, old_name, new_name):
+        """
+        It renames a key and its _QC key. Both are marked as changed, because
+        the plots show the name of the key.
+
+        Parameters
+        ----------
+            old_name: str
+            new_name: str
+        """
+        # The values do not change, so the summaries are kept
+        summaries = {}
+        for suffix in ("", "_QC"):
+            summary = self.cached_summary(old_name + suffix)
+            self.summaries.pop(old_name + suffix, None)
+            self.versions.pop(old_name + suffix, None)
+            if summary is not None:
+                summaries[new_name + suffix] = summary
+        self.touch([new_name, new_name + "_QC"])
+        for key, summary in summaries.items():
+            self.set_summary(key, summary)
+
+    def signature(self, keys=None):
+        """
+        It returns the version of the data of some keys. It grows when any of
+        the keys changes.
+
+        Parameters
+        ----------
+            keys: list of str, optional (keys = None)
+                Keys used by a plot. None is all the keys.
+        Returns
+        -------
+            version: int
+        """
+        if keys is None:
+            return self.version
+        return max([self.index_version] +
+                   [self.versions.get(key, 0) for key in keys])
+
+    def key_version(self, key):
+        """
+        It returns an identifier of the current values of a key, to cache
+        results calculated from them.
+
+        Parameters
+        ----------
+            key: str
+        Returns
+        -------
+            version: (int, int)
+                Identifier of this DataState and version of the key.
+        """
+        return id(self), self.signature([key])
+
+    def summary(self, key, series):
+        """
+        It returns the ColumnSummary of a key. It is made if the key has
+        changed after the last summary.
+
+        Parameters
+        ----------
+            key: str
+            series: pandas.Series
+                Current values of the key.
+        Returns
+        -------
+            summary: ColumnSummary
+        """
+        version = self.signature([key])
+        cached = self.summaries.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        summary = ColumnSummary.from_series(series)
+        self.summaries[key] = (version, summary)
+        return summary
+
+    def set_summary(self, key, summary):
+        """
+        It saves the ColumnSummary of the current version of a key (i.e. made
+        from the summary of the old version and the new rows).
+
+        Parameters
+        ----------
+            key: str
+            summary: ColumnSummary
+        """
+        self.summaries[key] = (self.signature([key]), summary)
+
+    def cached_summary(self, key):
+        """
+        It returns the ColumnSummary of the current version of a key, if it
+        has been made.
+
+        Parameters
+        ----------
+            key: str
+        Returns
+        -------
+            summary: ColumnSummary or None
+        """
+        cached = self.summaries.get(key)
+        if cached is None or cached[0] != self.signature([key]):
+            return None
+        return cached[1]
+
+    def is_stale(self, keys, version):
+        """
+        It returns True if any of the keys has changed after version.
+
+        Parameters
+        ----------
+            keys: list of str or None
+                Keys used by a plot. None is all the keys.
+            version: int
+                Version of the data of the plot.
+        Returns
+        -------
+            stale: bool
+        """
+        return self.signature(keys) > version
@@ -0,0 +1,261 @@
+"""Level of detail of time series. A series with millions of values is
+reduced to a few points per pixel of the plot, keeping the extreme values
+(min/max) or the visual shape (LTTB) of the series"""
+
+import numpy as np
+import pandas as pd
+
+# Series with less values than this are not reduced
+LOD_THRESHOLD = 1000
+# Number of values of the blocks of the first level of the pyramid
+BASE_BLOCK = 4
+
+
+def series_xy(series):
+    """
+    It returns the time and values of a series without NaN, ordered by time.
+
+    Parameters
+    ----------
+        series: pandas.Series
+            Series with a TIME index (or a MultiIndex with a TIME level).
+    Returns
+    -------
+        (x, y): (numpy.ndarray, numpy.ndarray)
+            x is datetime64 and y is float.
+    """
+    series = series.dropna()
+    index = series.index
+    if isinstance(index, pd.MultiIndex):
+        index = index.get_level_values("TIME" if "TIME" in index.names else 0)
+    x = np.asarray(index)
+    y = np.asarray(series.values, dtype=float)
+    if len(x) > 1 and not (x[1:] >= x[:-1]).all():
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+    return x, y
+
+
+def minmax(x, y, buckets):
+    """
+    It splits the series in buckets of the same number of values and it keeps
+    the min and the max of each bucket, in order of time.
+
+    Parameters
+    ----------
+        x: numpy.ndarray
+        y: numpy.ndarray
+            Values without NaN.
+        buckets: int
+            Number of buckets (i.e. width of the plot in pixels).
+    Returns
+    -------
+        (x, y): (numpy.ndarray, numpy.ndarray)
+            Reduced series, with 2 * buckets values or less.
+    """
+    size = len(y)
+    if size <= 2 * buckets:
+        return x, y
+    starts = np.linspace(0, size, buckets + 1).astype(np.int64)[:-1]
+    starts = np.unique(starts)
+    return _minmax_points(x, y, starts)
+
+
+def _minmax_points(x, y, starts):
+    """It returns the points of min and max of the buckets that begin in
+    starts"""
+    lengths = np.diff(np.append(starts, len(y)))
+    bucket = np.repeat(np.arange(len(starts)), lengths)
+    # Position of the min and max of each bucket
+    order = np.lexsort((y, bucket))
+    first = np.append(0, np.cumsum(lengths)[:-1])
+    min_positions = order[first]
+    max_positions = order[first + lengths - 1]
+    positions = np.unique(np.concatenate([min_positions, max_positions]))
+    return x[positions], y[positions]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets. It keeps threshold points, selecting in
+    each bucket the point that forms the largest triangle with the point of
+    the previous bucket and the average of the next bucket.
+
+    Parameters
+    ----------
+        x: numpy.ndarray
+        y: numpy.ndarray
+            Values without NaN.
+        threshold: int
+            Number of points of the result.
+    Returns
+    -------
+        (x, y): (numpy.ndarray, numpy.ndarray)
+            Reduced series.
+    """
+    size = len(y)
+    if threshold >= size or threshold < 3:
+        return x, y
+    # Times as numbers
+    x_values = x.astype("datetime64[ns]").astype(np.int64).astype(float) \
+        if x.dtype.kind == "M" else x.astype(float)
+
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    positions = np.empty(threshold, dtype=np.int64)
+    positions[0] = 0
+    positions[-1] = size - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        next_start = end
+        average_x = x_values[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        # Area of the triangles
+        areas = np.abs(
+            (x_values[previous] - average_x) * (y[start:end] - y[previous]) -
+            (x_values[previous] - x_values[start:end]) *
+            (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        positions[i + 1] = previous
+    return x[positions], y[positions]
+
+
+def stratified_sample(size, count, seed=0):
+    """
+    It returns the positions of a random sample of rows, with a row of each
+    block of consecutive rows, so all the time interval is in the sample.
+
+    Parameters
+    ----------
+        size: int
+            Number of rows.
+        count: int
+            Number of rows of the sample.
+        seed: int, optional (seed = 0)
+            Seed of the random generator, so the sample does not change when
+            the plot is made again.
+    Returns
+    -------
+        positions: numpy.ndarray
+    """
+    if size <= count:
+        return np.arange(size)
+    bounds = np.linspace(0, size, count + 1).astype(np.int64)
+    generator = np.random.default_rng(seed)
+    return generator.integers(bounds[:-1], bounds[1:])
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max of a series. Level 0 has the min and max of
+    blocks of BASE_BLOCK values and each next level joins two blocks of the
+    previous level. A query returns the points of the finest level that has
+    less blocks than pixels in the requested time interval, so the extreme
+    values are visible at any zoom.
+    """
+
+    def __init__(self, x, y):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            x: numpy.ndarray
+                Times, in order.
+            y: numpy.ndarray
+                Values without NaN.
+        """
+        self.x = x
+        self.y = y
+        # Each level is (min_positions, max_positions), one value per block
+        self.levels = []
+        size = len(y)
+        if size == 0:
+            return
+        # The last block is filled with the last value
+        padded = np.append(y, np.full(-size % BASE_BLOCK, y[-1]))
+        blocks = padded.reshape(-1, BASE_BLOCK)
+        first = np.arange(len(blocks)) * BASE_BLOCK
+        min_positions = np.minimum(first + np.argmin(blocks, axis=1), size - 1)
+        max_positions = np.minimum(first + np.argmax(blocks, axis=1), size - 1)
+        self.levels.append((min_positions, max_positions))
+        while len(min_positions) > 1:
+            min_positions, max_positions = self._join(min_positions,
+                                                      max_positions)
+            self.levels.append((min_positions, max_positions))
+
+    def _join(self, min_positions, max_positions):
+        """It joins the blocks of a level two by two"""
+        if len(min_positions) % 2:
+            min_positions = np.append(min_positions, min_positions[-1])
+            max_positions = np.append(max_positions, max_positions[-1])
+        min_pairs = min_positions.reshape(-1, 2)
+        max_pairs = max_positions.reshape(-1, 2)
+        rows = np.arange(len(min_pairs))
+        min_positions = min_pairs[
+            rows, np.argmin(self.y[min_pairs], axis=1)]
+        max_positions = max_pairs[
+            rows, np.argmax(self.y[max_pairs], axis=1)]
+        return min_positions, max_positions
+
+    def block_size(self, level):
+        """Number of values of the blocks of a level"""
+        return BASE_BLOCK * 2 ** level
+
+    def query(self, pixels, start=None, end=None):
+        """
+        It returns the reduced series of a time interval.
+
+        Parameters
+        ----------
+            pixels: int
+                Width of the plot in pixels.
+            start: datetime64, optional (start = None)
+                Start of the interval. None is the start of the series.
+            end: datetime64, optional (end = None)
+                End of the interval. None is the end of the series.
+        Returns
+        -------
+            (x, y): (numpy.ndarray, numpy.ndarray)
+                Points of the interval, with 2 * pixels values or less, and
+                the previous and next points, so the line reaches the borders
+                of the plot.
+        """
+        size = len(self.y)
+        first = 0 if start is None else \
+            int(np.searchsorted(self.x, start, side="left"))
+        last = size if end is None else \
+            int(np.searchsorted(self.x, end, side="right"))
+        # One more point at each side
+        first = max(first - 1, 0)
+        last = min(last + 1, size)
+        if last - first <= 2 * max(pixels, 1) or not self.levels:
+            return self.x[first:last], self.y[first:last]
+
+        level = 0
+        while level + 1 < len(self.levels) and \
+                (last - first) / self.block_size(level) > pixels:
+            level += 1
+        block_size = self.block_size(level)
+        min_positions, max_positions = self.levels[level]
+        # Blocks that are inside the interval
+        first_block = -(-first // block_size)
+        last_block = last // block_size
+        parts = [[first, last - 1]]
+        if first_block < last_block:
+            parts += [min_positions[first_block:last_block],
+                      max_positions[first_block:last_block]]
+        # The extremes of the blocks at the edges could be out of the
+        # interval, so the parts of the edge blocks in the interval are
+        # reduced apart
+        head_end = min(first_block * block_size, last)
+        tail_start = max(last_block * block_size, head_end)
+        for part_start, part_end in [(first, head_end), (tail_start, last)]:
+            if part_start < part_end:
+                part = self.y[part_start:part_end]
+                parts.append([part_start + np.argmin(part),
+                              part_start + np.argmax(part)])
+        positions = np.unique(np.concatenate(parts).astype(np.int64))
+        return self.x[positions], self.y[positions]
@@ -0,0 +1,376 @@
+"""Histograms of the columns of the working data, calculated by chunks so they
+can be merged (i.e. histograms of appended records)"""
+
+import numpy as np
+from mooda_gui.core.aggregation import aggregation_cache
+
+# Number of bins, like DataFrame.hist()
+HISTOGRAM_BINS = 10
+# Number of values of a chunk
+HISTOGRAM_CHUNK = 1024 * 1024
+# Number of bins of each axis of 2D histograms
+DENSITY_BINS = 100
+
+
+def histogram_range(summary):
+    """
+    It returns the range of the bins of a column, like numpy.histogram()
+    without range.
+
+    Parameters
+    ----------
+        summary: ColumnSummary
+    Returns
+    -------
+        (first, last): (float, float) or None
+            First and last edges. None if the column has no numeric values.
+    """
+    if summary.empty or summary.minimum is None:
+        return None
+    first, last = float(summary.minimum), float(summary.maximum)
+    if first == last:
+        first, last = first - 0.5, last + 0.5
+    return first, last
+
+
+class Histogram:
+    """
+    Counts of the values of a column in equal bins, with the sum of the values
+    to draw the mean line. Histograms with the same bins can be merged, so
+    a histogram can be calculated by chunks.
+    """
+
+    def __init__(self, bins, value_range, counts=None, total=0.0, count=0):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            bins: int
+                Number of bins.
+            value_range: (float, float)
+                First and last edges.
+            counts: numpy.ndarray, optional (counts = None)
+                Number of values of each bin. None is an empty histogram.
+            total: float, optional (total = 0.0)
+                Sum of the values.
+            count: int, optional (count = 0)
+                Number of values (without NaN), also the values out of range.
+        """
+        self.bins = bins
+        self.value_range = value_range
+        if counts is None:
+            counts = np.zeros(bins, dtype=np.int64)
+        self.counts = counts
+        self.total = total
+        self.count = count
+
+    @property
+    def nbytes(self):
+        """Memory used by the counts, for the aggregation cache"""
+        return self.counts.nbytes
+
+    @property
+    def edges(self):
+        """Edges of the bins, like numpy.histogram()"""
+        return np.linspace(self.value_range[0], self.value_range[1],
+                           self.bins + 1)
+
+    def mean(self):
+        """It returns the mean of the values, NaN if there are no values"""
+        if not self.count:
+            return np.nan
+        return self.total / self.count
+
+    @classmethod
+    def from_values(cls, values, bins, value_range):
+        """
+        It makes the histogram of an array with numpy.histogram(), that uses
+        vectorised arithmetic for equal bins.
+
+        Parameters
+        ----------
+            values: numpy.ndarray
+                Values, NaN are ignored.
+            bins: int
+            value_range: (float, float)
+        Returns
+        -------
+            histogram: Histogram
+        """
+        values = np.asarray(values)
+        if values.dtype.kind != "f":
+            values = values.astype(np.float64)
+        values = np.ascontiguousarray(values)
+        values = values[~np.isnan(values)]
+        counts, _ = np.histogram(values, bins, range=value_range)
+        return cls(bins, value_range, counts.astype(np.int64),
+                   float(values.sum(dtype=np.float64)), len(values))
+
+    @classmethod
+    def from_chunks(cls, chunks, bins, value_range, progress=None):
+        """
+        It makes the histogram of some chunks of values (i.e. blocks read
+        from a file), merging the histogram of each chunk.
+
+        Parameters
+        ----------
+            chunks: iterable of numpy.ndarray
+            bins: int
+            value_range: (float, float)
+            progress: callable, optional (progress = None)
+                progress(number of chunks) after each chunk.
+        Returns
+        -------
+            histogram: Histogram
+        """
+        histogram = cls(bins, value_range)
+        for i, chunk in enumerate(chunks):
+            histogram = histogram.merge(cls.from_values(chunk, bins,
+                                                        value_range))
+            if progress is not None:
+                progress(i + 1)
+        return histogram
+
+    @classmethod
+    def from_series(cls, series, bins, value_range,
+                    chunk_size=HISTOGRAM_CHUNK):
+        """
+        It makes the histogram of a column by chunks, so only a chunk of the
+        column is converted or copied at the same time.
+
+        Parameters
+        ----------
+            series: pandas.Series
+            bins: int
+            value_range: (float, float)
+            chunk_size: int, optional (chunk_size = HISTOGRAM_CHUNK)
+        Returns
+        -------
+            histogram: Histogram
+        """
+        values = series.to_numpy()
+        return cls.from_chunks(
+            (values[start:start + chunk_size]
+             for start in range(0, len(values), chunk_size)),
+            bins, value_range)
+
+    def merge(self, other):
+        """
+        It returns the histogram of the values of both histograms.
+
+        Parameters
+        ----------
+            other: Histogram
+                Histogram with the same bins.
+        Returns
+        -------
+            histogram: Histogram
+        """
+        if other.bins != self.bins or other.value_range != self.value_range:
+            raise ValueError("Histograms with different bins")
+        return Histogram(self.bins, self.value_range,
+                         self.counts + other.counts,
+                         self.total + other.total, self.count + other.count)
+
+
+def column_histogram(series, value_range, bins=HISTOGRAM_BINS, version=None):
+    """
+    It returns the Histogram of a column, from the aggregation cache.
+
+    Parameters
+    ----------
+        series: pandas.Series
+            Column of WaterFrame.data.
+        value_range: (float, float)
+            First and last edges (histogram_range()).
+        bins: int, optional (bins = HISTOGRAM_BINS)
+        version: object, optional (version = None)
+            Version of the column (DataState.key_version()). None does not
+            use the cache.
+    Returns
+    -------
+        histogram: Histogram
+    """
+    if version is None:
+        return Histogram.from_series(series, bins, value_range)
+    return aggregation_cache().get(
+        ("histogram", series.name, version, bins, value_range),
+        lambda: Histogram.from_series(series, bins, value_range))
+
+
+def _bin_index(values, bins, value_range):
+    """It returns the bin of each value (-1 if it is out of range)"""
+    first, last = value_range
+    index = ((values - first) * (bins / (last - first))).astype(np.int64)
+    # The last edge is in the last bin, like numpy.histogram()
+    np.minimum(index, bins - 1, out=index)
+    index[(values < first) | (values > last)] = -1
+    return index
+
+
+class Histogram2D:
+    """
+    Counts of pairs of values of two columns in a grid of equal bins (density
+    of a scatter plot). Histograms with the same bins can be merged, so they
+    can be calculated by chunks.
+    """
+
+    def __init__(self, bins, x_range, y_range, counts=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            bins: int
+                Number of bins of each axis.
+            x_range: (float, float)
+                First and last edges of the x axis.
+            y_range: (float, float)
+                First and last edges of the y axis.
+            counts: numpy.ndarray, optional (counts = None)
+                Number of pairs of each bin, with shape (x bins, y bins).
+                None is an empty histogram.
+        """
+        self.bins = bins
+        self.x_range = x_range
+        self.y_range = y_range
+        if counts is None:
+            counts = np.zeros((bins, bins), dtype=np.int64)
+        self.counts = counts
+
+    @property
+    def nbytes(self):
+        """Memory used by the counts, for the aggregation cache"""
+        return self.counts.nbytes
+
+    @property
+    def x_edges(self):
+        """Edges of the bins of the x axis"""
+        return np.linspace(self.x_range[0], self.x_range[1], self.bins + 1)
+
+    @property
+    def y_edges(self):
+        """Edges of the bins of the y axis"""
+        return np.linspace(self.y_range[0], self.y_range[1], self.bins + 1)
+
+    @classmethod
+    def from_values(cls, x, y, bins, x_range, y_range):
+        """
+        It makes the histogram of two arrays with numpy.bincount() of the
+        bins of the pairs.
+
+        Parameters
+        ----------
+            x: numpy.ndarray
+            y: numpy.ndarray
+                Values with the same length than x. Pairs with NaN are
+                ignored.
+            bins: int
+            x_range: (float, float)
+            y_range: (float, float)
+        Returns
+        -------
+            histogram: Histogram2D
+        """
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        if not valid.all():
+            x, y = x[valid], y[valid]
+        x_index = _bin_index(x, bins, x_range)
+        y_index = _bin_index(y, bins, y_range)
+        inside = (x_index >= 0) & (y_index >= 0)
+        counts = np.bincount(x_index[inside] * bins + y_index[inside],
+                             minlength=bins * bins)
+        return cls(bins, x_range, y_range,
+                   counts.astype(np.int64).reshape(bins, bins))
+
+    @classmethod
+    def from_series(cls, x_series, y_series, bins, x_range, y_range,
+                    chunk_size=HISTOGRAM_CHUNK):
+        """
+        It makes the histogram of two columns by chunks.
+
+        Parameters
+        ----------
+            x_series: pandas.Series
+            y_series: pandas.Series
+                Column with the same index than x_series.
+            bins: int
+            x_range: (float, float)
+            y_range: (float, float)
+            chunk_size: int, optional (chunk_size = HISTOGRAM_CHUNK)
+        Returns
+        -------
+            histogram: Histogram2D
+        """
+        x, y = x_series.to_numpy(), y_series.to_numpy()
+        histogram = cls(bins, x_range, y_range)
+        for start in range(0, len(x), chunk_size):
+            histogram = histogram.merge(cls.from_values(
+                x[start:start + chunk_size], y[start:start + chunk_size],
+                bins, x_range, y_range))
+        return histogram
+
+    def merge(self, other):
+        """
+        It returns the histogram of the pairs of both histograms.
+
+        Parameters
+        ----------
+            other: Histogram2D
+                Histogram with the same bins.
+        Returns
+        -------
+            histogram: Histogram2D
+        """
+        if other.bins != self.bins or other.x_range != self.x_range or \
+           other.y_range != self.y_range:
+            raise ValueError("Histograms with different bins")
+        return Histogram2D(self.bins, self.x_range, self.y_range,
+                           self.counts + other.counts)
+
+    def transpose(self):
+        """It returns the histogram with the axes swapped"""
+        return Histogram2D(self.bins, self.y_range, self.x_range,
+                           self.counts.T)
+
+
+def pair_histogram(data, x_key, y_key, x_range, y_range, bins=DENSITY_BINS,
+                   versions=None):
+    """
+    It returns the Histogram2D of two keys, from the aggregation cache. The
+    cache has a histogram for each pair of keys (in any order), so plots with
+    more keys only calculate the new pairs.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+            WaterFrame.data.
+        x_key: str
+        y_key: str
+        x_range: (float, float)
+        y_range: (float, float)
+        bins: int, optional (bins = DENSITY_BINS)
+        versions: (object, object), optional (versions = None)
+            Versions of x_key and y_key (DataState.key_version()). None does
+            not use the cache.
+    Returns
+    -------
+        histogram: Histogram2D
+    """
+    if y_key < x_key:
+        if versions is not None:
+            versions = versions[::-1]
+        return pair_histogram(data, y_key, x_key, y_range, x_range, bins,
+                              versions).transpose()
+
+    def compute():
+        return Histogram2D.from_series(data[x_key], data[y_key], bins,
+                                       x_range, y_range)
+
+    if versions is None:
+        return compute()
+    return aggregation_cache().get(
+        ("density", x_key, y_key, versions, bins, x_range, y_range), compute)
@@ -0,0 +1,261 @@
+"""It contains LazyNetCDF, a NetCDF reader that only loads the variables that
+are used"""
+
+from collections import OrderedDict
+import pandas as pd
+import xarray as xr
+from mooda import WaterFrame
+from mooda_gui.core.readers import netcdf_vars_to_drop
+
+# Maximum size (bytes) of the columns loaded in memory at the same time
+MEMORY_BUDGET = 512 * 1024 * 1024
+
+
+class LazyNetCDF:
+    """
+    It opens a NetCDF file but it only reads its catalogue: variable names,
+    meanings, metadata and the time index. The values of a variable (and its
+    _QC variable) are copied into the WaterFrame the first time that they are
+    required. Columns that have not been used for a while are removed from the
+    WaterFrame (LRU) when the loaded columns exceed the memory budget.
+    """
+
+    def __init__(self, path, memory_budget=MEMORY_BUDGET, progress=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            path: str
+                Path of the NetCDF file.
+            memory_budget: int, optional (memory_budget = MEMORY_BUDGET)
+                Maximum number of bytes of the loaded columns.
+            progress: callable, optional (progress = None)
+                progress(percentage, message). It is called when the
+                catalogue is ready.
+        """
+        # Instance variables
+        self.path = path
+        self.memory_budget = memory_budget
+        # Loaded columns, in order of use: {key: bytes}
+        self.loaded = OrderedDict()
+        # Columns that have been modified, they can not be evicted
+        self.pinned = set()
+
+        # open_dataset() only reads the header, values are read on demand
+        ds = xr.open_dataset(path)  # pylint: disable=C0103
+        self.metadata = dict(ds.attrs)
+        self.ds = ds.drop_vars(netcdf_vars_to_drop(ds))  # pylint: disable=C0103
+        # Dimensions in the same order that xarray uses in to_dataframe()
+        self.dims = list(self.ds.dims)
+        self.index = self.ds.coords.to_index(self.dims)
+        # Same meanings than WaterFrame.from_netcdf()
+        self.meaning = {}
+        for variable in self.ds.variables:
+            if '_QC' in variable:
+                continue
+            self.meaning[variable] = dict(self.ds[variable].attrs)
+        self.meaning['DEPTH'] = {
+            "long_name": "depth_of_measure",
+            "units": "meters"}
+        # Keys of the WaterFrame and the variable of the file of each one
+        self.variables = OrderedDict(
+            (variable, variable) for variable in self.ds.variables
+            if variable not in self.dims)
+
+        if progress is not None:
+            progress(100, "Catalogue of {} ready".format(path))
+
+    def keys(self):
+        """It returns all the keys of the file (loaded or not)"""
+        return list(self.variables.keys())
+
+    def parameters(self):
+        """It returns the keys with a _QC key, like WaterFrame.parameters()"""
+        return [key for key in self.variables
+                if "_QC" not in key
+                if key + "_QC" in self.variables]
+
+    def time_extent(self):
+        """
+        It returns the first and last value of the time index.
+
+        Returns
+        -------
+            (start, end): (Timestamp, Timestamp) or (None, None)
+        """
+        if 'TIME' not in self.ds.indexes or self.ds.indexes['TIME'].empty:
+            return None, None
+        time_index = self.ds.indexes['TIME']
+        return time_index.min(), time_index.max()
+
+    def waterframe(self):
+        """
+        It creates a WaterFrame with the index, metadata and meaning of the
+        file, but without any column.
+
+        Returns
+        -------
+            wf: WaterFrame
+        """
+        wf = WaterFrame()  # pylint: disable=C0103
+        wf.metadata = dict(self.metadata)
+        wf.meaning = dict(self.meaning)
+        wf.data = pd.DataFrame(index=self.index)
+        return wf
+
+    def read(self, key):
+        """
+        It reads the values of a key from the file.
+
+        Parameters
+        ----------
+            key: str
+                Key of the WaterFrame.
+        Returns
+        -------
+            values: numpy.ndarray
+                Values with the same order that the index.
+        """
+        array = self.ds[self.variables[key]]
+        if list(array.dims) != self.dims:
+            array = array.broadcast_like(self.ds).transpose(*self.dims)
+        return array.values.reshape(-1)
+
+    def load(self, wf, keys, protected=None):  # pylint: disable=C0103
+        """
+        It copies the keys (and their _QC keys) into wf.data if they are not
+        there yet and it evicts the least recently used columns.
+
+        Parameters
+        ----------
+            wf: WaterFrame
+                WaterFrame created with self.waterframe().
+            keys: list of str
+                Keys to load.
+            protected: set of str, optional (protected = None)
+                Keys that can not be evicted (i.e. keys that are in a plot).
+        Returns
+        -------
+            loaded_keys: list of str
+                Keys that have been read from the file.
+        """
+        requested = []
+        for key in keys:
+            if key.endswith("_QC"):
+                key = key[:-3]
+            requested.append(key)
+            if key + "_QC" in self.variables:
+                requested.append(key + "_QC")
+
+        loaded_keys = []
+        for key in requested:
+            if key not in self.variables:
+                continue
+            if key in self.loaded and key in wf.data.keys():
+                self.loaded.move_to_end(key)
+                continue
+            wf.data[key] = self.read(key)
+            self.loaded[key] = int(wf.data[key].memory_usage(index=False))
+            loaded_keys.append(key)
+
+        self.evict(wf, set(requested) | set(protected or []))
+        return loaded_keys
+
+    def load_all(self, wf):  # pylint: disable=C0103
+        """
+        It copies all the keys into wf.data, without memory limit. It is used
+        before operations that need the full WaterFrame (save, slice...).
+
+        Parameters
+        ----------
+            wf: WaterFrame
+                WaterFrame created with self.waterframe().
+        """
+        for key in self.variables:
+            if key not in wf.data.keys():
+                wf.data[key] = self.read(key)
+        # The order of the columns is the same than the file
+        wf.data = wf.data[self.keys()]
+
+    def evict(self, wf, protected):  # pylint: disable=C0103
+        """
+        It removes the least recently used columns from wf.data until the
+        loaded columns fit in the memory budget.
+
+        Parameters
+        ----------
+            wf: WaterFrame
+                WaterFrame created with self.waterframe().
+            protected: set of str
+                Keys that can not be evicted.
+        """
+        used = sum(self.loaded.values())
+        for key in list(self.loaded.keys()):
+            if used <= self.memory_budget:
+                break
+            # A parameter is evicted with its _QC column. Pinned flags are
+            # kept, their values can be read again from the file
+            base_key = key[:-3] if key.endswith("_QC") else key
+            if base_key in protected or base_key in self.pinned or \
+               key in protected or key in self.pinned:
+                continue
+            used -= self.loaded.pop(key)
+            if key in wf.data.keys():
+                del wf.data[key]
+
+    def pin(self, keys):
+        """
+        Modified columns are not in the file, so they can not be evicted.
+        Only the modified columns are pinned (i.e. new flags of a parameter
+        do not pin its values).
+
+        Parameters
+        ----------
+            keys: list of str
+                Keys that have been modified.
+        """
+        self.pinned.update(keys)
+
+    def rename(self, old_name, new_name):
+        """
+        It renames a key (and its _QC key) like WaterFrame.rename().
+
+        Parameters
+        ----------
+            old_name: str
+                Key to change.
+            new_name: str
+                New name of the key.
+        """
+        for old_key, new_key in [(old_name, new_name),
+                                 (old_name + "_QC", new_name + "_QC")]:
+            if old_key not in self.variables:
+                continue
+            self.variables = OrderedDict(
+                (new_key if key == old_key else key, variable)
+                for key, variable in self.variables.items())
+            if old_key in self.loaded:
+                self.loaded[new_key] = self.loaded.pop(old_key)
+            if old_key in self.pinned:
+                self.pinned.discard(old_key)
+                self.pinned.add(new_key)
+
+    def drop(self, keys):
+        """
+        It removes keys (and their _QC keys) from the catalogue.
+
+        Parameters
+        ----------
+            keys: list of str
+                Keys to remove.
+        """
+        for key in keys:
+            for key_ in [key, key + "_QC"]:
+                self.variables.pop(key_, None)
+                self.loaded.pop(key_, None)
+                self.pinned.discard(key_)
+
+    def close(self):
+        """It closes the file"""
+        self.ds.close()
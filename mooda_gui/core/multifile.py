@@ -0,0 +1,120 @@
+"""Functions to open many files at the same time and to merge them in a
+single WaterFrame"""
+
+import os
+import numpy as np
+import pandas as pd
+from mooda import WaterFrame
+from mooda_gui.core.pool import run_in_pool
+from mooda_gui.core.readers import read_file
+
+
+def _no_progress(percentage, message=""):  # pylint: disable=unused-argument
+    """Default progress callback, it does nothing"""
+
+
+def _merge_metadata(metadata, new_metadata):
+    """It merges two metadata dicts with the same rules that
+    WaterFrame.concat()"""
+    for key, value in new_metadata.items():
+        if key not in metadata:
+            metadata[key] = value
+        elif metadata[key] != value:
+            metadata[key] = "{}, {}".format(metadata[key], value)
+
+
+def merge_waterframes(wfs):  # pylint: disable=C0103
+    """
+    It merges WaterFrames of the same instrument (i.e. daily files) along the
+    time index. Files are ordered by their first time and concatenated only
+    once. If their times overlap, the rows are ordered with a stable merge of
+    the sorted files. Repeated times keep the row of the file that starts
+    first.
+
+    Parameters
+    ----------
+        wfs: list of WaterFrame
+            WaterFrames to merge.
+
+    Returns
+    -------
+        wf: WaterFrame
+            Merged data.
+    """
+    wfs = [wf for wf in wfs if wf is not None and not wf.data.empty]
+    wf = WaterFrame()  # pylint: disable=C0103
+    if not wfs:
+        return wf
+
+    # Each file is sorted, so the merge only has to order the files
+    frames = []
+    for wf_file in wfs:
+        data = wf_file.data
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind="mergesort")
+        frames.append(data)
+    order = sorted(range(len(frames)),
+                   key=lambda i: (frames[i].index[0], i))
+    frames = [frames[i] for i in order]
+
+    data = pd.concat(frames, axis=0, sort=False)
+    if not data.index.is_monotonic_increasing:
+        # Overlapped files. The sort is stable and the data is a list of
+        # sorted runs, so it is a k-way merge.
+        if isinstance(data.index, pd.MultiIndex):
+            data = data.sort_index(kind="mergesort")
+        else:
+            data = data.iloc[np.argsort(data.index.values, kind="stable")]
+    # A repeated time keeps the row of the file that starts first
+    data = data.loc[~data.index.duplicated(keep="first")]
+
+    # QC flags of the new rows of a key that is not in all files
+    for key in data.keys():
+        if key.endswith("_QC") and data[key].isna().any():
+            data[key] = data[key].fillna(0)
+    wf.data = data
+
+    for wf_file in wfs:
+        wf.meaning = {**wf.meaning, **wf_file.meaning}
+        _merge_metadata(wf.metadata, wf_file.metadata)
+    return wf
+
+
+def read_files(paths, progress=None, use_cache=True):
+    """
+    It reads the files in the process pool and it merges them with
+    merge_waterframes().
+
+    Parameters
+    ----------
+        paths: list of str
+            Paths of the files.
+        progress: callable, optional (progress = None)
+            progress(percentage, message)
+        use_cache: bool, optional (use_cache = True)
+            It reads and writes the columnar cache (see read_file()).
+
+    Returns
+    -------
+        (wf, failed): (WaterFrame, list of str)
+            Merged data and paths of the files that could not be read.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    # A file that can not be read does not stop the reading of the others
+    results = run_in_pool(read_file,
+                          [(path, None, use_cache) for path in paths],
+                          progress=lambda percentage, message: progress(
+                              0.9 * percentage, message),
+                          message="Reading {} files".format(len(paths)),
+                          return_exceptions=True)
+    wfs = [None if isinstance(result, Exception) else result
+           for result in results]
+    failed = [path for path, wf in zip(paths, wfs) if wf is None]
+
+    progress(90, "Merging {} files".format(len(paths) - len(failed)))
+    wf = merge_waterframes(wfs)  # pylint: disable=C0103
+    progress(100, "Files {} merged".format(
+        ", ".join(os.path.basename(path) for path in paths)))
+    return wf, failed
@@ -0,0 +1,87 @@
+"""Process pool shared by the tasks that use more than one CPU"""
+
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Maximum number of processes of the pool
+MAX_PROCESSES = os.cpu_count() or 1
+# Seconds between two progress reports while the pool is working
+WAIT_INTERVAL = 0.2
+
+_POOL = None
+
+
+def process_pool():
+    """
+    It returns the process pool. It is created the first time that it is
+    used and it is closed when the application exits. Processes are started
+    with "spawn", because forking a process with the threads of Qt and of the
+    QThreadPool can copy locks that are held by other threads.
+
+    Returns
+    -------
+        pool: concurrent.futures.ProcessPoolExecutor
+    """
+    global _POOL  # pylint: disable=global-statement
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(
+            max_workers=MAX_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(shutdown_pool)
+    return _POOL
+
+
+def shutdown_pool():
+    """It closes the process pool and its processes"""
+    global _POOL  # pylint: disable=global-statement
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def run_in_pool(function, args_list, progress=None, message="Working",
+                return_exceptions=False):
+    """
+    It runs function(*args) for each args of args_list in the process pool.
+
+    Parameters
+    ----------
+        function: callable
+            Function of a module (it must be pickable).
+        args_list: list of tuple
+            Arguments of each call.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called periodically, so if it
+            raises an exception (i.e. Cancelled), the pending calls are
+            cancelled.
+        message: str, optional (message = "Working")
+            Message of the progress.
+        return_exceptions: bool, optional (return_exceptions = False)
+            If it is True, the exception of a failed call is returned as its
+            result, so the other calls are not lost. Otherwise, the first
+            exception is raised.
+
+    Returns
+    -------
+        results: list
+            Results of the calls, in the same order than args_list.
+    """
+    futures = [process_pool().submit(function, *args) for args in args_list]
+    pending = set(futures)
+    try:
+        while pending:
+            _done, pending = wait(pending, timeout=WAIT_INTERVAL,
+                                  return_when=FIRST_COMPLETED)
+            if progress is not None:
+                done = len(futures) - len(pending)
+                progress(100 * done / max(len(futures), 1),
+                         "{} ({} of {})".format(message, done, len(futures)))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    if not return_exceptions:
+        return [future.result() for future in futures]
+    return [future.exception() or future.result() for future in futures]
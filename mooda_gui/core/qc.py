@@ -0,0 +1,384 @@
+"""QC tests of many parameters. Parameters are independent, so the tests of
+each parameter run in a process of the pool with only its values and flags.
+The tests of a parameter are fused in a single pass over its values"""
+
+import numpy as np
+import pandas as pd
+from mooda import WaterFrame
+from mooda_gui.core.pool import run_in_pool
+
+# Jobs with less values (rows by parameters) run in the calling thread,
+# because starting the processes of the pool takes longer
+QC_POOL_VALUES = 1000 * 1000
+
+
+def _no_progress(percentage, message=""):  # pylint: disable=unused-argument
+    """Default progress callback, it does nothing"""
+
+
+def qc_options(list_qc):
+    """
+    It returns the options of the QC tests of the list emitted by QCWidget.
+
+    Parameters
+    ----------
+        list_qc: list
+            [reset flag, range flag, flat flag, spike flag, spike threshold,
+            window, flag2flag original flag, flag2flag translated flag,
+            keys...]. Empty flags are tests that are not applied.
+    Returns
+    -------
+        options: dict
+            {"reset": flag, "spike": (flag, window, threshold), "range": flag,
+            "flat": (flag, window), "flag2flag": (original, translated)}.
+            Tests that are not applied are None.
+    """
+    window = int(list_qc[5]) if list_qc[5] else 0
+    return {
+        "reset": int(list_qc[0]) if list_qc[0] else None,
+        "spike": (int(list_qc[3]), window,
+                  float(list_qc[4].replace(',', '.'))) if list_qc[3] else None,
+        "range": int(list_qc[1]) if list_qc[1] else None,
+        "flat": (int(list_qc[2]), window) if list_qc[2] else None,
+        "flag2flag": (int(list_qc[6]), int(list_qc[7])) if list_qc[6]
+                     else None,
+    }
+
+
+def spike_window(window, size):
+    """
+    It returns the window of the spike test, like WaterFrame.spike_test():
+    if it is 0, it is the 1% of the values, between 3 and 100.
+
+    Parameters
+    ----------
+        window: int
+        size: int
+            Number of values.
+    Returns
+    -------
+        window: int
+    """
+    if window == 0:
+        window = min(max(int(size / 100), 3), 100)
+    return window
+
+
+def range_mask(key, values):
+    """
+    It returns the values that fail the range test of WaterFrame.range_test()
+    (the limits of each parameter are in the WaterFrame method).
+
+    Parameters
+    ----------
+        key: str
+        values: numpy.ndarray
+    Returns
+    -------
+        mask: numpy.ndarray
+            Boolean array, all False if the parameter has no limits.
+    """
+    wf = WaterFrame()  # pylint: disable=C0103
+    wf.data = pd.DataFrame({key: values,
+                            key + "_QC": np.zeros(len(values), dtype=np.int8)})
+    wf.range_test(parameters=key, flag=1)
+    return wf.data[key + "_QC"].to_numpy() == 1
+
+
+def qc_column(key, values, flags, options, tests=True):
+    """
+    It applies the QC tests to a parameter with the same results than the
+    WaterFrame methods in the order of PlotSplitter (reset, spike, range, flat
+    and flag2flag), but in a single pass: the rolling mean of the spike test
+    and the rolling deviation of the flat test are calculated once for the
+    column, and the flags of all the tests are chosen with a single
+    numpy.select() (later tests have priority, like when they write their
+    flags one after another).
+
+    Parameters
+    ----------
+        key: str
+            Parameter.
+        values: numpy.ndarray
+            Values of the parameter.
+        flags: numpy.ndarray
+            Flags of the parameter (_QC key). They are not modified.
+        options: dict
+            Options of qc_options().
+        tests: bool, optional (tests = True)
+            It applies the spike, range and flat tests. They do not flag
+            parameters without values.
+    Returns
+    -------
+        flags: numpy.ndarray
+            New flags.
+    """
+    if options["reset"] is not None:
+        # WaterFrame.reset_flag() makes a new column of int64
+        base = np.full(len(flags), options["reset"], dtype=np.int64)
+    else:
+        base = flags
+    conditions = []
+    choices = []
+    if tests and any(options[test] is not None
+                     for test in ("spike", "range", "flat")):
+        series = pd.Series(values)
+        numbers = series.to_numpy(dtype=np.float64)
+        # Tests in reverse order, numpy.select() uses the first condition
+        if options["flat"] is not None:
+            flag, window = options["flat"]
+            # Rolling window of pandas, so the deviation is the same
+            deviation = series.rolling(window or 2).std().to_numpy()
+            conditions.append(deviation == 0)
+            choices.append(flag)
+        if options["range"] is not None:
+            conditions.append(range_mask(key, values))
+            choices.append(options["range"])
+        if options["spike"] is not None:
+            flag, window, threshold = options["spike"]
+            signals = series.rolling(
+                window=spike_window(window, len(values)),
+                center=True).mean().bfill().to_numpy()
+            with np.errstate(invalid="ignore"):
+                conditions.append(np.abs(numbers - signals) > threshold)
+            choices.append(flag)
+    if conditions:
+        result = np.select(conditions, choices, default=base)
+    else:
+        result = base.copy()
+    if options["flag2flag"] is not None:
+        original_flag, translated_flag = options["flag2flag"]
+        result = np.where(result == original_flag, translated_flag, result)
+    return result.astype(base.dtype, copy=False)
+
+
+def resolve_options(options, size):
+    """
+    It returns the options with the window of the spike test of a column
+    (spike_window()), so the tests of a part of the column use the same
+    window than the tests of all the column.
+
+    Parameters
+    ----------
+        options: dict
+            Options of qc_options().
+        size: int
+            Number of values of the column.
+    Returns
+    -------
+        options: dict
+    """
+    if options["spike"] is None:
+        return options
+    flag, window, threshold = options["spike"]
+    return dict(options, spike=(flag, spike_window(window, size), threshold))
+
+
+def qc_signature(options):
+    """It returns a hashable identifier of resolved options"""
+    return tuple(sorted(options.items()))
+
+
+def _last_run_end(valid, end, length):
+    """
+    It returns the last position before end where a run of length valid
+    values ends, -1 if there is no run. Runs are looked for in blocks from
+    end, so it only reads the values near end.
+    """
+    size = max(4 * length, 1024)
+    while True:
+        start = max(end - size, 0)
+        invalid = np.flatnonzero(~valid(start, end))
+        bounds = np.concatenate([[-1], invalid, [end - start]])
+        runs = np.flatnonzero(np.diff(bounds) - 1 >= length)
+        if runs.size:
+            return start + bounds[runs[-1] + 1] - 1
+        if start == 0:
+            return -1
+        size *= 4
+
+
+def qc_start(values, processed, options):
+    """
+    It returns the first row whose flags can change when the rows after
+    processed are new. Only the spike test has windows with rows after the
+    value (centred rolling mean, filled backwards where it is NaN), so the
+    start goes back to the last mean calculated only with tested rows.
+
+    Parameters
+    ----------
+        values: numpy.ndarray
+            Values of the column.
+        processed: int
+            Number of rows that have been tested with the same options.
+        options: dict
+            Resolved options (resolve_options()).
+    Returns
+    -------
+        start: int
+            0 if all the column must be tested.
+    """
+    if processed <= 0 or processed > len(values):
+        return 0
+    if options["spike"] is None:
+        return processed
+    window = options["spike"][1]
+    if values.dtype.kind == "f":
+        def valid(start, end):
+            return ~np.isnan(values[start:end])
+    else:
+        def valid(start, end):
+            return np.ones(end - start, dtype=bool)
+    # A mean is not NaN if all the values of its window are not NaN
+    end = _last_run_end(valid, processed, 2 * window + 1)
+    if end < 0:
+        return 0
+    return end - window + 1
+
+
+def qc_context(options):
+    """It returns the number of rows before the start that the tests use"""
+    context = 0
+    if options["spike"] is not None:
+        context = options["spike"][1]
+    if options["flat"] is not None:
+        context = max(context, options["flat"][1] or 2)
+    return context
+
+
+class QCMemory:
+    """
+    Rows of each parameter that have been tested with some options. If the
+    QC tests are applied again with the same options after some rows have
+    been appended (i.e. with File > Add or the follow mode), only the new
+    rows and the rows whose windows have changed are tested. The rolling mean
+    of pandas keeps the rounding of the previous rows, so a value at the
+    threshold of the spike test (within the rounding) can have a different
+    flag than if all the column was tested.
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # {key: (signature of the options, number of rows, last index)}
+        self.memory = {}
+
+    def processed(self, key, index, signature):
+        """
+        It returns the number of rows of the key that have been tested with
+        the options.
+
+        Parameters
+        ----------
+            key: str
+            index: pandas.Index
+                Current index of the data.
+            signature: tuple
+                qc_signature() of the options.
+        Returns
+        -------
+            rows: int
+                0 if the key has not been tested with the options or if
+                its first rows have changed.
+        """
+        entry = self.memory.get(key)
+        if entry is None or entry[0] != signature:
+            return 0
+        _signature, rows, last = entry
+        # Rows have been inserted or deleted before the last tested row
+        if rows > len(index) or index[rows - 1] != last:
+            return 0
+        return rows
+
+    def remember(self, key, signature, rows, last):
+        """
+        It keeps the rows of the key that have been tested.
+
+        Parameters
+        ----------
+            key: str
+            signature: tuple
+            rows: int
+            last: object
+                Index of the last tested row.
+        """
+        if rows:
+            self.memory[key] = (signature, rows, last)
+        else:
+            self.memory.pop(key, None)
+
+    def forget(self, keys=None):
+        """
+        It forgets the tested rows of some keys (i.e. the rows have
+        changed).
+
+        Parameters
+        ----------
+            keys: list of str, optional (keys = None)
+                None forgets all the keys.
+        """
+        if keys is None:
+            self.memory.clear()
+            return
+        for key in keys:
+            self.memory.pop(key, None)
+
+    def rename(self, old_name, new_name):
+        """It keeps the tested rows of a renamed key"""
+        if old_name in self.memory:
+            self.memory[new_name] = self.memory.pop(old_name)
+
+
+def _qc_rows(key, values, flags, options, tests, start):
+    """It applies qc_column() to some rows and it returns the flags of the
+    rows after start (the rows before start are in the windows of the
+    tests)"""
+    return qc_column(key, values, flags, options, tests)[start:]
+
+
+def run_qc(columns, options, progress=None):
+    """
+    It applies the QC tests to many parameters. If there are many values,
+    each parameter is tested in a process of the pool. Only the rows after
+    qc_start() (and the rows of their windows) are sent to the tests.
+
+    Parameters
+    ----------
+        columns: list of (str, numpy.ndarray, numpy.ndarray, bool, int)
+            Key, values, flags, tests (see qc_column()) and number of
+            tested rows (see QCMemory) of each parameter.
+        options: dict
+            Options of qc_options().
+        progress: callable, optional (progress = None)
+            progress(percentage, message)
+    Returns
+    -------
+        flags: dict
+            {key: (start, new flags of the rows after start)}.
+    """
+    if progress is None:
+        progress = _no_progress
+    message = "Applying QC tests to {} parameters".format(len(columns))
+    jobs = []
+    starts = []
+    for key, values, flags, tests, processed in columns:
+        column_options = resolve_options(options, len(values))
+        start = qc_start(values, processed, column_options)
+        first = max(start - qc_context(column_options), 0)
+        # Only the rows of the tests are sent to the pool
+        jobs.append((key, values[first:], flags[first:], column_options,
+                     tests, start - first))
+        starts.append(start)
+    size = sum(len(job[1]) for job in jobs)
+    if len(jobs) > 1 and size >= QC_POOL_VALUES:
+        results = run_in_pool(_qc_rows, jobs, progress=progress,
+                              message=message)
+    else:
+        results = []
+        for i, job in enumerate(jobs):
+            progress(100 * i / len(jobs),
+                     "{} ({}: {} of {})".format(message, job[0], i + 1,
+                                                len(jobs)))
+            results.append(_qc_rows(*job))
+    progress(100, "QC tests applied to {} parameters".format(len(columns)))
+    return {job[0]: (start, flags)
+            for job, start, flags in zip(jobs, starts, results)}
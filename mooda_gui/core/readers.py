@@ -0,0 +1,448 @@
+"""Functions to read data files into WaterFrames. They are written to run in
+a Worker, so they report their progress and they can be cancelled."""
+
+import os
+import pickle
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import xarray as xr
+from mooda import WaterFrame
+from mooda_gui.core.binary import read_binary
+from mooda_gui.core.cache import read_cache, write_cache
+
+# Size of the blocks read from disk when we report byte progress
+BLOCK_SIZE = 4 * 1024 * 1024
+# Number of rows of the CSV files that are parsed each time
+CSV_CHUNK_SIZE = 200000
+# Formats tried to parse the time column of CSV files. The first one that
+# works with the first value is used for the whole file.
+TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%SZ',
+                '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f',
+                '%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M:%S',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y-%m-%d']
+# Columns of CSV files that are not parameters, they do not get a _QC column
+CSV_COORDINATES = ['DEPTH', 'LATITUDE', 'LONGITUDE']
+
+
+def _no_progress(percentage, message=""):  # pylint: disable=unused-argument
+    """Default progress callback, it does nothing"""
+
+
+def _megabytes(size):
+    """It returns the number of bytes as a string in MB"""
+    return "{:.1f} MB".format(size / 1000000)
+
+
+class _ProgressFile:
+    """
+    File wrapper that reports the bytes read through the progress callback.
+    It is used to unpickle a file without loading it in memory first.
+    """
+
+    def __init__(self, file, size, progress):
+        self.file = file
+        self.size = max(size, 1)
+        self.progress = progress
+        self.done = 0
+        self.reported = 0
+
+    def _update(self, count):
+        self.done += count
+        if self.done - self.reported >= BLOCK_SIZE or self.done >= self.size:
+            self.reported = self.done
+            self.progress(100 * self.done / self.size,
+                          "Reading {} of {}".format(_megabytes(self.done),
+                                                    _megabytes(self.size)))
+
+    def read(self, size=-1):
+        """Same as file.read()"""
+        chunk = self.file.read(size)
+        self._update(len(chunk))
+        return chunk
+
+    def readline(self, size=-1):
+        """Same as file.readline()"""
+        line = self.file.readline(size)
+        self._update(len(line))
+        return line
+
+
+def netcdf_vars_to_drop(ds):
+    """
+    It returns the variables of the dataset that WaterFrame.from_netcdf()
+    does not load.
+
+    Parameters
+    ----------
+        ds: xarray.Dataset
+            Input dataset.
+    Returns
+    -------
+        vars2drop: list of str
+            Variables to drop.
+    """
+    vars2drop = [key for key in ds.variables.keys() if '_DM' in key]
+    for key in ['POSITIONING_SYSTEM', 'DC_REFERENCE', 'LATITUDE', 'LONGITUDE',
+                'POSITION_QC', 'DEPH', 'DEPH_QC']:
+        if key in ds.variables.keys():
+            vars2drop.append(key)
+    return vars2drop
+
+
+def read_netcdf(path, progress=None):
+    """
+    It reads a NetCDF file variable by variable. The result is the same as
+    WaterFrame.from_netcdf().
+
+    Parameters
+    ----------
+        path: str
+            Path of the NetCDF file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called after each variable.
+
+    Returns
+    -------
+        wf: WaterFrame
+            WaterFrame with the data of the file.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    wf = WaterFrame()  # pylint: disable=C0103
+    # open_dataset() only reads the header, values are loaded on demand
+    with xr.open_dataset(path) as ds:  # pylint: disable=C0103
+        # Save metadata
+        wf.metadata = dict(ds.attrs)
+        # Delete not used vars
+        ds = ds.drop_vars(netcdf_vars_to_drop(ds))  # pylint: disable=C0103
+        # Save the meanings
+        for variable in ds.variables:
+            if '_QC' in variable:
+                continue
+            wf.meaning[variable] = dict(ds[variable].attrs)
+        # We add the meaning of DEPTH
+        wf.meaning['DEPTH'] = {
+            "long_name": "depth_of_measure",
+            "units": "meters"}
+
+        # Load the values, one variable each time
+        total_size = max(ds.nbytes, 1)
+        read_size = 0
+        for variable in ds.variables:
+            progress(100 * read_size / total_size,
+                     "Reading {} ({} of {})".format(variable,
+                                                    _megabytes(read_size),
+                                                    _megabytes(total_size)))
+            ds.variables[variable].load()
+            read_size += ds.variables[variable].nbytes
+
+        progress(100, "Creating the WaterFrame")
+        # Conversion to the dataframe
+        wf.data = ds.to_dataframe()
+
+    return wf
+
+
+def _csv_header(file):
+    """
+    It reads the comment lines at the beginning of a CSV file, like the ones
+    written by WaterFrame.to_csv().
+
+    Parameters
+    ----------
+        file: file object
+            CSV file opened in binary mode.
+    Returns
+    -------
+        (metadata, skip_rows, header): (dict, int, str)
+            Metadata of the comments, number of lines before the header of the
+            table and the header line.
+    """
+    metadata = {}
+    skip_rows = 0
+    header = ""
+    for line in file:
+        text = line.decode(errors="replace").strip()
+        if text.startswith("#"):
+            # Lines like: # key;="value"
+            if ';=' in text:
+                key, value = text[1:].split(';=', 1)
+                metadata[key.strip()] = value.strip().strip('"')
+        elif text:
+            header = text
+            break
+        skip_rows += 1
+    file.seek(0)
+    return metadata, skip_rows, header
+
+
+def _time_format(value):
+    """
+    It returns the first format of TIME_FORMATS that parses the value.
+
+    Parameters
+    ----------
+        value: str
+            Example of the time column.
+    Returns
+    -------
+        time_format: str or None
+            None if no format works.
+    """
+    for time_format in TIME_FORMATS:
+        try:
+            datetime.strptime(value.strip(), time_format)
+            return time_format
+        except ValueError:
+            continue
+    return None
+
+
+def csv_layout(file):
+    """
+    It detects how a CSV file is written: comments, separator, columns, time
+    column and types. The separator (";", "," or tabs) is detected from the
+    header and the time column is the "TIME" column or the first column with
+    "time" or "date" in its name.
+
+    Parameters
+    ----------
+        file: file object
+            CSV file opened in binary mode, at the beginning.
+    Returns
+    -------
+        layout: dict
+            metadata, skip_rows, separator, columns, time_key, time_format,
+            dtypes (for pandas.read_csv()) and data_start (position of the
+            first row after the header).
+    """
+    metadata, skip_rows, header = _csv_header(file)
+    file.seek(0)
+    for _ in range(skip_rows + 1):
+        file.readline()
+    data_start = file.tell()
+    separator = max([";", ",", "\t"], key=header.count)
+
+    # Detect the time column and the types with the first rows
+    file.seek(0)
+    sample = pd.read_csv(file, sep=separator, skiprows=skip_rows, nrows=1000)
+    columns = list(sample.keys())
+    time_key = columns[0]
+    if "TIME" in columns:
+        time_key = "TIME"
+    else:
+        for key in columns:
+            if "time" in key.lower() or "date" in key.lower():
+                time_key = key
+                break
+    time_format = None
+    if not sample.empty:
+        time_format = _time_format(str(sample[time_key].iloc[0]))
+    dtypes = {time_key: str}
+    for key in columns:
+        if key == time_key:
+            continue
+        if pd.api.types.is_numeric_dtype(sample[key]):
+            dtypes[key] = np.float32
+        else:
+            dtypes[key] = object
+
+    return {"metadata": metadata, "skip_rows": skip_rows,
+            "separator": separator, "columns": columns, "time_key": time_key,
+            "time_format": time_format, "dtypes": dtypes,
+            "data_start": data_start}
+
+
+def csv_chunk_arrays(chunk, layout):
+    """
+    It converts a chunk of rows of a CSV file to arrays of compact types:
+    datetime64 for the time column and int8 for the QC flags.
+
+    Parameters
+    ----------
+        chunk: pandas.DataFrame
+            Rows read with the dtypes of the layout.
+        layout: dict
+            Result of csv_layout().
+    Returns
+    -------
+        arrays: dict
+            {key: numpy.ndarray} of all the columns of the layout.
+    """
+    arrays = {}
+    for key in layout["columns"]:
+        if key == layout["time_key"]:
+            arrays[key] = pd.to_datetime(
+                chunk[key], format=layout["time_format"]).values
+            continue
+        values = chunk[key].values
+        if key.endswith("_QC"):
+            values = np.nan_to_num(values).astype(np.int8)
+        arrays[key] = values
+    return arrays
+
+
+def add_missing_qc(data, dtypes, size):
+    """
+    It adds the missing QC keys to the columns of a CSV file, like
+    WaterFrame.from_dataframe().
+
+    Parameters
+    ----------
+        data: dict
+            {key: numpy.ndarray} without the time column.
+        dtypes: dict
+            dtypes of csv_layout().
+        size: int
+            Number of rows.
+    """
+    for key in list(data.keys()):
+        if key.endswith("_QC") or key in CSV_COORDINATES:
+            continue
+        if dtypes[key] is np.float32 and key + "_QC" not in data:
+            data[key + "_QC"] = np.zeros(size, dtype=np.int8)
+
+
+def read_csv(path, progress=None, chunk_size=CSV_CHUNK_SIZE):
+    """
+    It reads a CSV file in chunks of rows. Values are saved as float32 and QC
+    flags as int8, so big instrument files fit in memory. The text of the
+    file is never in memory at the same time that the parsed data, only one
+    chunk of it.
+
+    The file can contain the metadata comments of WaterFrame.to_csv(). The
+    separator and the time column are detected with csv_layout().
+
+    Parameters
+    ----------
+        path: str
+            Path of the CSV file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called after each chunk.
+        chunk_size: int, optional (chunk_size = CSV_CHUNK_SIZE)
+            Number of rows parsed each time.
+
+    Returns
+    -------
+        wf: WaterFrame
+            WaterFrame with the data of the file.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    size = max(os.path.getsize(path), 1)
+    with open(path, "rb") as file:
+        layout = csv_layout(file)
+        file.seek(0)
+        columns = layout["columns"]
+        time_key = layout["time_key"]
+        dtypes = layout["dtypes"]
+
+        # Parse the file. Each chunk is converted to arrays of compact types
+        chunks = {key: [] for key in columns}
+        reader = pd.read_csv(file, sep=layout["separator"],
+                             skiprows=layout["skip_rows"], dtype=dtypes,
+                             chunksize=chunk_size)
+        for chunk in reader:
+            for key, values in csv_chunk_arrays(chunk, layout).items():
+                chunks[key].append(values)
+            del chunk
+            progress(100 * file.tell() / size,
+                     "Reading {} of {}".format(_megabytes(file.tell()),
+                                               _megabytes(size)))
+
+    progress(100, "Creating the WaterFrame")
+    # Join the chunks column by column, so only one column is duplicated
+    index = pd.DatetimeIndex(np.concatenate(chunks.pop(time_key)), name="TIME")
+    data = {}
+    for key in columns:
+        if key == time_key:
+            continue
+        data[key] = np.concatenate(chunks.pop(key))
+    add_missing_qc(data, dtypes, len(index))
+
+    wf = WaterFrame()  # pylint: disable=C0103
+    wf.metadata = layout["metadata"]
+    wf.data = pd.DataFrame(data, index=index)
+    if not wf.data.index.is_monotonic_increasing:
+        wf.data.sort_index(inplace=True)
+
+    return wf
+
+
+def read_pickle(path, progress=None):
+    """
+    It reads a pickle file of a WaterFrame. The result is the same as
+    WaterFrame.from_pickle().
+
+    Parameters
+    ----------
+        path: str
+            Path of the pickle file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called every BLOCK_SIZE bytes.
+
+    Returns
+    -------
+        wf: WaterFrame
+            WaterFrame with the data of the file.
+    """
+    if progress is None:
+        progress = _no_progress
+
+    wf = WaterFrame()  # pylint: disable=C0103
+    with open(path, "rb") as file:
+        temp_dict = pickle.load(
+            _ProgressFile(file, os.path.getsize(path), progress))
+    wf.__dict__.clear()
+    wf.__dict__.update(temp_dict)
+
+    return wf
+
+
+def read_file(path, progress=None, use_cache=True):
+    """
+    It reads a data file. The reader is selected with the extension of the
+    path. NetCDF and CSV files are read from the columnar cache if it is
+    valid, otherwise the cache is written after the file is parsed.
+
+    Parameters
+    ----------
+        path: str
+            Path of the file.
+        progress: callable, optional (progress = None)
+            progress(percentage, message)
+        use_cache: bool, optional (use_cache = True)
+            It reads and writes the columnar cache.
+
+    Returns
+    -------
+        wf: WaterFrame or None
+            WaterFrame with the data of the file. None if the extension is
+            not supported.
+    """
+    extension = path.split(".")[-1]
+    if extension == "pkl":
+        return read_pickle(path, progress=progress)
+    elif extension == "mbin":
+        return read_binary(path, progress=progress)
+    elif extension not in ["nc", "csv"]:
+        return None
+
+    if use_cache:
+        wf = read_cache(path, progress=progress)  # pylint: disable=C0103
+        if wf is not None:
+            return wf
+
+    if extension == "nc":
+        wf = read_netcdf(path, progress=progress)  # pylint: disable=C0103
+    else:
+        wf = read_csv(path, progress=progress)  # pylint: disable=C0103
+
+    if use_cache:
+        if progress is not None:
+            progress(100, "Writing cache of {}".format(path))
+        write_cache(path, wf)
+    return wf
@@ -0,0 +1,156 @@
+"""Registry of the plot widgets of the PlotSplitter"""
+
+
+class PlotRegistry:
+    """
+    Plot widgets indexed by (kind of plot, keys) and by the keys of the data
+    that they use, so finding a plot or the plots of a key does not need to
+    look through all the plots. Widgets must have the method dependencies()
+    that returns the keys they use (None if they use all the keys).
+    """
+
+    def __init__(self):
+        """Constructor"""
+        # {(kind, keys): widget}
+        self.plots = {}
+        # {widget: (kind, keys)}, in order of creation
+        self.entries = {}
+        # {widget: keys of the data that it uses}
+        self.dependencies = {}
+        # {key of the data: set of widgets that use it}
+        self.users = {}
+        # Widgets that use all the keys
+        self.all_users = set()
+
+    @staticmethod
+    def plot_id(kind, keys):
+        """
+        It returns the identifier of a plot.
+
+        Parameters
+        ----------
+            kind: str
+                Kind of plot (i.e. "ts", "hist", "qc").
+            keys: str, list of str or None
+                Keys of the plot.
+        Returns
+        -------
+            (kind, keys): (str, tuple of str)
+        """
+        if keys is None:
+            keys = ()
+        elif isinstance(keys, str):
+            keys = (keys,)
+        return kind, tuple(keys)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        """It iterates over a copy, so widgets can be removed meanwhile"""
+        return iter(list(self.entries))
+
+    def __contains__(self, widget):
+        return widget in self.entries
+
+    def get(self, kind, keys=None):
+        """
+        It returns the widget of a plot.
+
+        Parameters
+        ----------
+            kind: str
+            keys: str, list of str or None, optional (keys = None)
+        Returns
+        -------
+            widget: QWidget or None
+        """
+        return self.plots.get(self.plot_id(kind, keys))
+
+    def add(self, kind, keys, widget):
+        """
+        It adds a widget.
+
+        Parameters
+        ----------
+            kind: str
+            keys: str, list of str or None
+            widget: QWidget
+        """
+        self.remove(widget)
+        plot_id = self.plot_id(kind, keys)
+        self.plots[plot_id] = widget
+        self.entries[widget] = plot_id
+        dependencies = widget.dependencies()
+        if dependencies is None:
+            self.all_users.add(widget)
+        else:
+            self.dependencies[widget] = list(dependencies)
+            for key in dependencies:
+                self.users.setdefault(key, set()).add(widget)
+
+    def update(self, widget, keys):
+        """
+        It changes the keys of a widget (i.e. after a rename).
+
+        Parameters
+        ----------
+            widget: QWidget
+            keys: str, list of str or None
+                New keys of the plot.
+        """
+        kind, _ = self.entries[widget]
+        self.add(kind, keys, widget)
+
+    def remove(self, widget):
+        """
+        It removes a widget, if it is in the registry.
+
+        Parameters
+        ----------
+            widget: QWidget
+        """
+        plot_id = self.entries.pop(widget, None)
+        if plot_id is None:
+            return
+        if self.plots.get(plot_id) is widget:
+            del self.plots[plot_id]
+        self.all_users.discard(widget)
+        for key in self.dependencies.pop(widget, []):
+            self.users[key].discard(widget)
+            if not self.users[key]:
+                del self.users[key]
+
+    def kind(self, widget):
+        """It returns the kind of plot of a widget"""
+        return self.entries[widget][0]
+
+    def using(self, keys, include_all=True):
+        """
+        It returns the widgets that use any of the keys.
+
+        Parameters
+        ----------
+            keys: str or list of str
+            include_all: bool, optional (include_all = True)
+                It includes the widgets that use all the keys.
+        Returns
+        -------
+            widgets: list of QWidget
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        widgets = set()
+        for key in keys:
+            widgets.update(self.users.get(key, ()))
+        if include_all:
+            widgets.update(self.all_users)
+        return list(widgets)
+
+    def clear(self):
+        """It removes all the widgets"""
+        self.plots.clear()
+        self.entries.clear()
+        self.dependencies.clear()
+        self.users.clear()
+        self.all_users.clear()
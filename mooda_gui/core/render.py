@@ -0,0 +1,83 @@
+"""Rendering of figures out of the GUI thread. Figures are made with the
+object-oriented API of Matplotlib (Figure and the Agg canvas, without pyplot),
+so they can be made in a Worker of the QThreadPool"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Dots per inch of the figures
+DPI = 100
+
+
+def new_figure(width, height, dpi=DPI):
+    """
+    It creates a Figure with an Agg canvas.
+
+    Parameters
+    ----------
+        width: int
+            Width in pixels.
+        height: int
+            Height in pixels.
+        dpi: int, optional (dpi = DPI)
+    Returns
+    -------
+        fig: matplotlib.figure.Figure
+    """
+    fig = Figure(figsize=(max(width, 1) / dpi, max(height, 1) / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def rasterize(fig, width=None, height=None, progress=None):  # pylint: disable=unused-argument
+    """
+    It draws the figure with Agg.
+
+    Parameters
+    ----------
+        fig: matplotlib.figure.Figure
+            Figure with an Agg canvas.
+        width: int, optional (width = None)
+            New width in pixels.
+        height: int, optional (height = None)
+            New height in pixels.
+        progress: callable, optional (progress = None)
+            Not used, it is here to run the function in a Worker.
+    Returns
+    -------
+        image: numpy.ndarray
+            RGBA values, with shape (height, width, 4).
+    """
+    if width and height:
+        fig.set_size_inches(width / fig.dpi, height / fig.dpi)
+        fig.tight_layout()
+    fig.canvas.draw()
+    return np.array(fig.canvas.buffer_rgba())
+
+
+def render_figure(draw, width, height, progress=None):  # pylint: disable=unused-argument
+    """
+    It creates a figure, it calls draw(fig) to make the plot and it draws it
+    with Agg.
+
+    Parameters
+    ----------
+        draw: callable
+            draw(fig). It adds the axes and plots to the figure, without
+            pyplot. It can return the state of the plot (i.e. its artists),
+            that is given to the GUI thread with the figure.
+        width: int
+            Width in pixels.
+        height: int
+            Height in pixels.
+        progress: callable, optional (progress = None)
+            Not used, it is here to run the function in a Worker.
+    Returns
+    -------
+        (fig, image, state): (matplotlib.figure.Figure, numpy.ndarray, object)
+            Figure, its RGBA values and the value returned by draw(fig).
+    """
+    fig = new_figure(width, height)
+    state = draw(fig)
+    return fig, rasterize(fig), state
@@ -0,0 +1,303 @@
+"""Spectrograms of acoustic data (columns with frequencies as keys). The power
+is kept in a contiguous array with levels of lower time resolution, divided in
+tiles, so a plot only draws the tiles of the visible interval"""
+
+import math
+import tempfile
+import numpy as np
+import pandas as pd
+from mooda_gui.core.aggregation import aggregation_cache
+
+# Number of times of a tile
+SPECTROGRAM_TILE = 512
+# Number of pairs of times of a chunk to make a level
+SPECTROGRAM_CHUNK = 64 * 1024
+
+
+def acoustic_keys(keys):
+    """
+    It returns the keys of the acoustic data (keys that are frequencies),
+    ordered by frequency.
+
+    Parameters
+    ----------
+        keys: list of str
+    Returns
+    -------
+        (frequencies, keys): (numpy.ndarray, list of str)
+    """
+    columns = []
+    for key in keys:
+        try:
+            frequency = float(key)
+        except ValueError:
+            continue
+        if not np.isnan(frequency):
+            columns.append((frequency, key))
+    columns.sort()
+    return (np.array([frequency for frequency, _ in columns]),
+            [key for _, key in columns])
+
+
+def _halve(power):
+    """It returns the mean of each pair of consecutive times (NaN are
+    ignored). Pairs are calculated by chunks, so a memory mapped level is not
+    copied to memory, and the halved level of a memory mapped level is also
+    memory mapped to a temporary file"""
+    shape = ((len(power) + 1) // 2, power.shape[1])
+    if isinstance(power, np.memmap):
+        # The file is deleted when the map is closed
+        halved = np.memmap(tempfile.TemporaryFile(), dtype=power.dtype,
+                           mode="w+", shape=shape)
+    else:
+        halved = np.empty(shape, dtype=power.dtype)
+    for start in range(0, len(halved), SPECTROGRAM_CHUNK):
+        chunk = np.asarray(power[2 * start:2 * (start + SPECTROGRAM_CHUNK)])
+        if len(chunk) % 2:
+            chunk = np.concatenate([chunk, np.full((1, chunk.shape[1]),
+                                                   np.nan, dtype=chunk.dtype)])
+        pairs = chunk.reshape(-1, 2, chunk.shape[1])
+        valid = ~np.isnan(pairs)
+        total = np.where(valid, pairs, 0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            halved[start:start + len(pairs)] = total / valid.sum(axis=1)
+    return halved
+
+
+class SpectrogramPyramid:
+    """
+    Power of the acoustic data in a contiguous float32 array of (times,
+    frequencies), with levels that halve the number of times (mean of
+    consecutive times) until a level fits in a tile. Each level is divided in
+    tiles of SPECTROGRAM_TILE times, that are views of the level.
+    """
+
+    def __init__(self, times, frequencies, levels):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            times: numpy.ndarray
+                datetime64[ns] times of the first level.
+            frequencies: numpy.ndarray
+            levels: list of numpy.ndarray
+                Power of each level, (times, frequencies).
+        """
+        self.times = times
+        self.frequencies = frequencies
+        self.levels = levels
+        # Range of the colour scale of all the tiles (fmin and fmax ignore
+        # NaN)
+        self.limits = (0.0, 1.0)
+        if levels[0].size:
+            minimum = float(np.fmin.reduce(levels[0], axis=None))
+            maximum = float(np.fmax.reduce(levels[0], axis=None))
+            if not np.isnan(minimum):
+                self.limits = (minimum, maximum)
+
+    @property
+    def nbytes(self):
+        """Memory used by the levels, for the aggregation cache"""
+        return sum(level.nbytes for level in self.levels) + self.times.nbytes
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        It makes the pyramid of the acoustic keys of data.
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                WaterFrame.data with a TIME index (or a MultiIndex with a
+                TIME level).
+        Returns
+        -------
+            pyramid: SpectrogramPyramid
+        """
+        frequencies, keys = acoustic_keys(data.keys())
+        index = data.index
+        if isinstance(index, pd.MultiIndex):
+            index = index.get_level_values(
+                "TIME" if "TIME" in index.names else 0)
+        times = np.asarray(index).astype("datetime64[ns]")
+        return cls.from_power(
+            times, frequencies,
+            np.ascontiguousarray(data[keys].to_numpy(dtype=np.float32)))
+
+    @classmethod
+    def from_power(cls, times, frequencies, power):
+        """
+        It makes the pyramid of an array of power. The array is the first
+        level, without copy, if the times are ordered.
+
+        Parameters
+        ----------
+            times: numpy.ndarray
+                datetime64[ns] times.
+            frequencies: numpy.ndarray
+            power: numpy.ndarray
+                Contiguous float32 array of (times, frequencies).
+        Returns
+        -------
+            pyramid: SpectrogramPyramid
+        """
+        if len(times) > 1 and not (times[1:] >= times[:-1]).all():
+            order = np.argsort(times, kind="stable")
+            times, power = times[order], power[order]
+        levels = [power]
+        while len(levels[-1]) > SPECTROGRAM_TILE:
+            levels.append(_halve(levels[-1]))
+        return cls(times, frequencies, levels)
+
+    def frequency_edges(self):
+        """
+        It returns the edges of the rows of the frequencies: the middle
+        between two frequencies and half a step before the first and after
+        the last one.
+
+        Returns
+        -------
+            edges: numpy.ndarray
+                len(frequencies) + 1 edges.
+        """
+        frequencies = np.asarray(self.frequencies, dtype=np.float64)
+        if not len(frequencies):
+            return np.array([0.0, 1.0])
+        if len(frequencies) == 1:
+            return frequencies[0] + np.array([-0.5, 0.5])
+        middles = (frequencies[1:] + frequencies[:-1]) / 2
+        return np.concatenate([
+            [frequencies[0] - (middles[0] - frequencies[0])], middles,
+            [frequencies[-1] + (frequencies[-1] - middles[-1])]])
+
+    def evenly_spaced(self):
+        """
+        It returns True if the frequencies have the same step, so the rows
+        of an image (that have the same height) are at their frequencies.
+
+        Returns
+        -------
+            True/False: bool
+        """
+        if len(self.frequencies) < 3:
+            return True
+        steps = np.diff(np.asarray(self.frequencies, dtype=np.float64))
+        return bool(np.allclose(steps, steps.mean(), rtol=1e-3, atol=0))
+
+    def frequency_extent(self):
+        """
+        It returns the first and last edges of the frequencies.
+
+        Returns
+        -------
+            (first, last): (float, float)
+        """
+        edges = self.frequency_edges()
+        return float(edges[0]), float(edges[-1])
+
+    def time_edge(self, position):
+        """
+        It returns the time of the start of a position of the first level
+        (the end of the data after the last position).
+
+        Parameters
+        ----------
+            position: int
+        Returns
+        -------
+            time: numpy.datetime64
+        """
+        if position < len(self.times):
+            return self.times[position]
+        if len(self.times) > 1:
+            return self.times[-1] + (self.times[-1] - self.times[-2])
+        return self.times[-1] + np.timedelta64(1, "s")
+
+    def level_for(self, count, pixels):
+        """
+        It returns the level with about one time for each pixel.
+
+        Parameters
+        ----------
+            count: int
+                Number of times of the first level in the view.
+            pixels: int
+                Width of the view.
+        Returns
+        -------
+            level: int
+        """
+        if count <= pixels:
+            return 0
+        return min(int(math.log2(count / pixels)), len(self.levels) - 1)
+
+    def tiles(self, start=None, end=None, pixels=1000):
+        """
+        It returns the tiles of the view.
+
+        Parameters
+        ----------
+            start: numpy.datetime64, optional (start = None)
+                Start of the view. None is the first time.
+            end: numpy.datetime64, optional (end = None)
+                End of the view. None is the last time.
+            pixels: int, optional (pixels = 1000)
+                Width of the view.
+        Returns
+        -------
+            tiles: list of (int, int)
+                (level, tile) of each tile.
+        """
+        if not len(self.times):
+            return []
+        first = 0 if start is None else \
+            max(int(np.searchsorted(self.times, start, "right")) - 1, 0)
+        last = len(self.times) if end is None else \
+            int(np.searchsorted(self.times, end, "left")) + 1
+        last = min(max(last, first + 1), len(self.times))
+        level = self.level_for(last - first, pixels)
+        span = SPECTROGRAM_TILE << level
+        return [(level, tile)
+                for tile in range(first // span, (last - 1) // span + 1)]
+
+    def tile(self, level, tile):
+        """
+        It returns the power of a tile and its time interval.
+
+        Parameters
+        ----------
+            level: int
+            tile: int
+        Returns
+        -------
+            (power, start, end): (numpy.ndarray, datetime64, datetime64)
+                power is a view of the level, (times, frequencies).
+        """
+        power = self.levels[level][tile * SPECTROGRAM_TILE:
+                                   (tile + 1) * SPECTROGRAM_TILE]
+        first = (tile * SPECTROGRAM_TILE) << level
+        last = first + (len(power) << level)
+        return power, self.time_edge(first), \
+            self.time_edge(min(last, len(self.times)))
+
+
+def spectrogram_pyramid(data, version=None):
+    """
+    It returns the SpectrogramPyramid of data, from the aggregation cache.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+            WaterFrame.data.
+        version: object, optional (version = None)
+            Version of the acoustic keys (DataState.key_version() of the
+            keys). None does not use the cache.
+    Returns
+    -------
+        pyramid: SpectrogramPyramid
+    """
+    if version is None:
+        return SpectrogramPyramid.from_data(data)
+    return aggregation_cache().get(("spectrogram", version),
+                                   lambda: SpectrogramPyramid.from_data(data))
@@ -0,0 +1,160 @@
+"""Summary statistics of the columns of the working data, so widgets can decide
+how to show a column without reading all its values"""
+
+import numpy as np
+import pandas as pd
+from mooda_gui.core.aggregation import series_values
+
+
+class ColumnSummary:
+    """
+    Number of values (without NaN), times of the first and last values,
+    minimum and maximum of a column.
+    """
+
+    def __init__(self, count=0, first=None, last=None, minimum=None,
+                 maximum=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            count: int, optional (count = 0)
+                Number of values that are not NaN.
+            first: Timestamp, optional (first = None)
+                Time of the first value.
+            last: Timestamp, optional (last = None)
+                Time of the last value.
+            minimum: float, optional (minimum = None)
+                Minimum value. None if the column is not numeric.
+            maximum: float, optional (maximum = None)
+                Maximum value. None if the column is not numeric.
+        """
+        self.count = count
+        self.first = first
+        self.last = last
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return "ColumnSummary(count={}, first={}, last={}, minimum={}, " \
+               "maximum={})".format(self.count, self.first, self.last,
+                                    self.minimum, self.maximum)
+
+    @classmethod
+    def from_series(cls, series):
+        """
+        It makes the summary of a column with a single pass over its values,
+        without copies of the column.
+
+        Parameters
+        ----------
+            series: pandas.Series
+                Column with a TIME index (or a MultiIndex with a TIME level).
+        Returns
+        -------
+            summary: ColumnSummary
+        """
+        times, values = series_values(series)
+        numeric = values.dtype.kind in "biuf"
+        if values.dtype.kind == "f":
+            valid = ~np.isnan(values)
+        elif numeric:
+            valid = np.ones(len(values), dtype=bool)
+        else:
+            valid = ~pd.isna(values)
+        count = int(np.count_nonzero(valid))
+        if not count:
+            return cls()
+        if not isinstance(series.index, pd.MultiIndex) and \
+           series.index.is_monotonic_increasing:
+            # Positions of the first and last values
+            first = times[valid.argmax()]
+            last = times[len(valid) - 1 - valid[::-1].argmax()]
+        else:
+            first, last = times[valid].min(), times[valid].max()
+        summary = cls(count, pd.Timestamp(first), pd.Timestamp(last))
+        if values.dtype.kind == "f":
+            # fmin and fmax ignore NaN
+            summary.minimum = np.fmin.reduce(values).item()
+            summary.maximum = np.fmax.reduce(values).item()
+        elif numeric:
+            summary.minimum = values.min().item()
+            summary.maximum = values.max().item()
+        return summary
+
+    @property
+    def empty(self):
+        """It is True if the column has no values"""
+        return self.count == 0
+
+    def span(self):
+        """
+        It returns the time between the first and the last value.
+
+        Returns
+        -------
+            span: Timedelta or None
+        """
+        if self.empty:
+            return None
+        return self.last - self.first
+
+    def value_range(self):
+        """
+        It returns the range of the values, to make histograms.
+
+        Returns
+        -------
+            (minimum, maximum): (float, float) or None
+                None if the column is empty, it is not numeric or it has a
+                single value.
+        """
+        if self.minimum is None or not self.minimum < self.maximum:
+            return None
+        return self.minimum, self.maximum
+
+    def merge(self, other):
+        """
+        It returns the summary of the values of both summaries (i.e. a column
+        and its appended rows).
+
+        Parameters
+        ----------
+            other: ColumnSummary
+        Returns
+        -------
+            summary: ColumnSummary
+        """
+        if other.empty:
+            return self
+        if self.empty:
+            return other
+        summary = ColumnSummary(self.count + other.count,
+                                min(self.first, other.first),
+                                max(self.last, other.last))
+        if self.minimum is not None and other.minimum is not None:
+            summary.minimum = min(self.minimum, other.minimum)
+            summary.maximum = max(self.maximum, other.maximum)
+        return summary
+
+
+def column_summary(data, key, data_state=None):
+    """
+    It returns the ColumnSummary of a key of data.
+
+    Parameters
+    ----------
+        data: pandas.DataFrame
+            WaterFrame.data.
+        key: str
+        data_state: DataState, optional (data_state = None)
+            DataState of data. The summary is kept in it until the key
+            changes. None makes the summary again.
+    Returns
+    -------
+        summary: ColumnSummary
+    """
+    if data_state is None:
+        return ColumnSummary.from_series(data[key])
+    return data_state.summary(key, data[key])
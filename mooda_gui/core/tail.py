@@ -0,0 +1,284 @@
+"""Follow mode: it reads the new records of a file that is growing and it
+appends them to the data without copying the old records"""
+
+import io
+import numpy as np
+import pandas as pd
+import xarray as xr
+from mooda_gui.core.readers import (add_missing_qc, csv_chunk_arrays,
+                                    csv_layout, netcdf_vars_to_drop)
+
+# Bytes read each step while looking for the last read record of a CSV file
+TAIL_BLOCK_SIZE = 64 * 1024
+# Minimum number of rows of the AppendBuffer
+MIN_CAPACITY = 1024
+
+
+class FileTail:
+    """
+    It reads the records of a CSV or NetCDF file that are newer than the
+    last record that has been read. A CSV file is read from the byte offset
+    of the last complete line and a NetCDF file from the last TIME record,
+    so only the new part of the file is parsed.
+    """
+
+    def __init__(self, path, last_time):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            path: str
+                Path of the CSV or NetCDF file.
+            last_time: Timestamp
+                Time of the last record that is in the data.
+        """
+        self.path = path
+        self.last_time = pd.Timestamp(last_time)
+        self.extension = path.split(".")[-1]
+        if self.extension == "csv":
+            with open(path, "rb") as file:
+                self.layout = csv_layout(file)
+                self.offset = self._csv_offset(file)
+        elif self.extension == "nc":
+            with xr.open_dataset(path, cache=False) as ds:  # pylint: disable=C0103
+                if "TIME" not in ds.indexes:
+                    raise ValueError("{} has not a TIME dimension".format(path))
+                self.records = int(ds.indexes["TIME"].searchsorted(
+                    self.last_time, side="right"))
+        else:
+            raise ValueError("Only CSV and NetCDF files can be followed")
+
+    def _line_time(self, line):
+        """It returns the time of a CSV line or None"""
+        values = line.decode(errors="replace").split(self.layout["separator"])
+        position = self.layout["columns"].index(self.layout["time_key"])
+        try:
+            return pd.to_datetime(values[position].strip(),
+                                  format=self.layout["time_format"])
+        except (IndexError, ValueError):
+            return None
+
+    def _csv_offset(self, file):
+        """
+        It looks for the first line of the CSV file that could be newer than
+        last_time, reading blocks from the end of the file.
+
+        Parameters
+        ----------
+            file: file object
+                CSV file opened in binary mode.
+        Returns
+        -------
+            offset: int
+                Position of the line.
+        """
+        file.seek(0, io.SEEK_END)
+        size = file.tell()
+        block_size = TAIL_BLOCK_SIZE
+        while True:
+            start = max(size - block_size, self.layout["data_start"])
+            file.seek(start)
+            if start > self.layout["data_start"]:
+                # The first line of the block is not complete
+                file.readline()
+            offset = file.tell()
+            line_time = self._line_time(file.readline())
+            if start == self.layout["data_start"] or \
+               (line_time is not None and line_time <= self.last_time):
+                return offset
+            block_size *= 2
+
+    def read_new(self, progress=None):  # pylint: disable=unused-argument
+        """
+        It reads the records that have been written since the last call.
+
+        Parameters
+        ----------
+            progress: callable, optional (progress = None)
+                Not used, it is here to run the method in a Worker.
+
+        Returns
+        -------
+            data: pandas.DataFrame or None
+                New records, with the same keys and types than the data of
+                the file. None if there are no new records.
+        """
+        if self.extension == "csv":
+            data = self._read_csv()
+        else:
+            data = self._read_netcdf()
+        if data is None:
+            return None
+        # Records that were already read (i.e. the file has been rewritten)
+        data = data.loc[data.index.get_level_values(0) > self.last_time]
+        if data.empty:
+            return None
+        self.last_time = data.index.get_level_values(0).max()
+        return data
+
+    def _read_csv(self):
+        """It parses the complete lines after self.offset"""
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            text = file.read()
+        # The last line can be half written
+        end = text.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        self.offset += end
+
+        layout = self.layout
+        chunk = pd.read_csv(io.BytesIO(text[:end]), sep=layout["separator"],
+                            header=None, names=layout["columns"],
+                            dtype=layout["dtypes"])
+        if chunk.empty:
+            return None
+        data = csv_chunk_arrays(chunk, layout)
+        index = pd.DatetimeIndex(data.pop(layout["time_key"]), name="TIME")
+        add_missing_qc(data, layout["dtypes"], len(index))
+        return pd.DataFrame(data, index=index)
+
+    def _read_netcdf(self):
+        """It reads the TIME records after self.records"""
+        with xr.open_dataset(self.path, cache=False) as ds:  # pylint: disable=C0103
+            records = ds.sizes["TIME"]
+            if records <= self.records:
+                return None
+            ds = ds.drop_vars(netcdf_vars_to_drop(ds))  # pylint: disable=C0103
+            data = ds.isel(TIME=slice(self.records, records)).to_dataframe()
+        self.records = records
+        return data
+
+
+class AppendBuffer:
+    """
+    Columns of a DataFrame with free space at the end, like a list. New rows
+    are written in the free space and the DataFrame is created again with
+    views of the columns, so appending rows does not copy the old rows (the
+    space grows by doubling).
+    """
+
+    def __init__(self, data):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                Initial data, with a single level index.
+        """
+        self.size = 0
+        self.index = None
+        self.index_name = None
+        self.columns = {}
+        self.adopt(data)
+
+    @property
+    def capacity(self):
+        """Number of rows that fit in the buffer"""
+        return len(self.index)
+
+    def adopt(self, data):
+        """
+        It copies all the data into a new buffer.
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+        Returns
+        -------
+            data: pandas.DataFrame
+                Same data, with columns that are views of the buffer.
+        """
+        self.size = len(data.index)
+        capacity = max(MIN_CAPACITY, 2 * self.size)
+        self.index_name = data.index.name
+        self.index = self._allocate(np.asarray(data.index), capacity)
+        self.columns = {key: self._allocate(data[key].to_numpy(), capacity)
+                        for key in data.keys()}
+        return self.frame()
+
+    @staticmethod
+    def _allocate(values, capacity):
+        """It returns an array of capacity rows that starts with values"""
+        array = np.empty(capacity, dtype=values.dtype)
+        if values.dtype.kind == "O":
+            array[:] = None
+        array[:len(values)] = values
+        return array
+
+    def frame(self):
+        """It returns a DataFrame with views of the buffer"""
+        index = pd.Index(self.index[:self.size], name=self.index_name,
+                         copy=False)
+        return pd.DataFrame(
+            {key: values[:self.size] for key, values in self.columns.items()},
+            index=index, copy=False)
+
+    def _sync(self, data):
+        """
+        The data could have been modified after the last append (i.e. new QC
+        flags or a slice). Modified columns are copied into the buffer again.
+        """
+        if len(data.index) != self.size or isinstance(data.index, pd.MultiIndex) \
+           or not np.may_share_memory(np.asarray(data.index), self.index):
+            return self.adopt(data)
+        for key in list(self.columns.keys()):
+            if key not in data.keys():
+                del self.columns[key]
+        for key in data.keys():
+            if key in self.columns and \
+               not isinstance(data[key].dtype, np.dtype):
+                # Texts are copied by pandas in frame(), they are not modified
+                continue
+            values = data[key].to_numpy()
+            if key not in self.columns or \
+               not np.may_share_memory(values, self.columns[key]):
+                self.columns[key] = self._allocate(values, self.capacity)
+
+    def append(self, data, rows):
+        """
+        It appends rows to data.
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                Current data (the last result of this method or the data of
+                the constructor, maybe modified).
+            rows: pandas.DataFrame
+                New rows.
+        Returns
+        -------
+            data: pandas.DataFrame
+                data with the new rows.
+        """
+        if isinstance(data.index, pd.MultiIndex) or \
+           isinstance(rows.index, pd.MultiIndex):
+            return pd.concat([data, rows], axis=0, sort=False)
+        self._sync(data)
+
+        size = self.size + len(rows.index)
+        if size > self.capacity:
+            capacity = max(2 * self.capacity, size)
+            self.index = self._allocate(self.index[:self.size], capacity)
+            self.columns = {
+                key: self._allocate(values[:self.size], capacity)
+                for key, values in self.columns.items()}
+
+        self.index[self.size:size] = np.asarray(rows.index,
+                                                dtype=self.index.dtype)
+        for key, values in self.columns.items():
+            if key in rows.keys():
+                new_values = rows[key].to_numpy()
+                if values.dtype.kind in "iu" and new_values.dtype.kind == "f":
+                    new_values = np.nan_to_num(new_values)
+                values[self.size:size] = new_values
+            elif values.dtype.kind == "f":
+                values[self.size:size] = np.nan
+            elif values.dtype.kind == "O":
+                values[self.size:size] = None
+            else:
+                values[self.size:size] = 0
+        self.size = size
+        return self.frame()
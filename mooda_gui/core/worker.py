@@ -0,0 +1,95 @@
+"""Module with the Worker used to run long tasks in the QThreadPool, out of
+the GUI thread"""
+# pylint: disable=no-name-in-module
+# pylint: disable=import-error
+
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+
+
+class Cancelled(Exception):
+    """The task has been cancelled by the user"""
+
+
+class WorkerSignals(QObject):
+    """
+    Signals of the Worker. A QRunnable is not a QObject, so it can not emit
+    signals by itself.
+    """
+    # (percentage, message)
+    progress = pyqtSignal(int, str)
+    # Returned value of the task
+    result = pyqtSignal(object)
+    # Traceback of the exception raised by the task
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    # It is always emitted at the end of the task
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    It runs a function in a thread of a QThreadPool.
+
+    The function receives a "progress" keyword argument. It is a callable
+    progress(percentage, message) that the function has to call from time to
+    time. It emits the progress signal and it raises Cancelled if the user
+    cancelled the task, so it is also the point where the task stops.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            function: callable
+                Function to run. It must accept the "progress" keyword.
+            *args, **kwargs:
+                Arguments of the function.
+        """
+        super().__init__()
+
+        # Instance variables
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def cancel(self):
+        """It asks the task to stop in its next call to progress()"""
+        self.is_cancelled = True
+
+    def progress(self, percentage, message=""):
+        """
+        It emits the progress of the task.
+
+        Parameters
+        ----------
+            percentage: int
+                Percentage of the task that is done (0 - 100).
+            message: str, optional (message = "")
+                Description of the current step.
+        """
+        if self.is_cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(int(percentage), message)
+
+    @pyqtSlot()
+    def run(self):
+        """Thread main function"""
+        try:
+            answer = self.function(*self.args, progress=self.progress,
+                                   **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception:  # pylint: disable=broad-except
+            self.signals.error.emit(traceback.format_exc())
+        else:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.result.emit(answer)
+        finally:
+            self.signals.finished.emit()
@@ -0,0 +1,212 @@
+"""Writers of WaterFrames that report their progress, so they can run in a
+Worker"""
+
+import os
+import numpy as np
+import pandas as pd
+import netCDF4
+
+# Number of values of the TIME dimension written each time
+NETCDF_CHUNK_SIZE = 100000
+# zlib compression level (1-9)
+NETCDF_COMPLEVEL = 4
+# Units of the TIME variable. Seconds are exact values, so times are the same
+# when the file is read
+TIME_UNITS = "seconds since 1970-01-01T00:00:00Z"
+# Attributes that are set by the writer (values are written without packing).
+# The attributes of the conversion of a coordinate (i.e. units and calendar of
+# TIME) are also set by the writer
+_RESERVED_ATTRS = ["_FillValue", "missing_value", "scale_factor", "add_offset",
+                   "dtype"]
+
+
+def _no_progress(percentage, message=""):  # pylint: disable=unused-argument
+    """Default progress callback, it does nothing"""
+
+
+def _attribute_value(value):
+    """It converts a value of metadata or meaning to a NetCDF attribute"""
+    if isinstance(value, (str, bytes, int, float, np.number, np.ndarray)):
+        return value
+    if isinstance(value, (list, tuple)) and value and \
+       all(isinstance(item, (int, float, np.number)) for item in value):
+        return np.asarray(value)
+    return str(value)
+
+
+def _attributes(values, reserved=None):
+    """It returns a dict of valid NetCDF attributes"""
+    reserved = reserved or []
+    return {str(key): _attribute_value(value)
+            for key, value in values.items()
+            if key not in reserved and value is not None}
+
+
+def _coordinate(level):
+    """
+    It converts a level of the index to the values of a NetCDF coordinate.
+
+    Parameters
+    ----------
+        level: pandas.Index
+    Returns
+    -------
+        (values, attrs): (numpy.ndarray, dict)
+            Values to write and attributes of the conversion.
+    """
+    if isinstance(level, pd.DatetimeIndex):
+        if level.tz is not None:
+            level = level.tz_convert(None)
+        epoch = pd.Timestamp(TIME_UNITS.split("since ")[1]).tz_convert(None)
+        seconds = np.asarray((level - epoch) / pd.Timedelta(seconds=1),
+                             dtype="f8")
+        if np.array_equal(seconds, np.round(seconds)):
+            seconds = seconds.astype("i8")
+        return seconds, {"units": TIME_UNITS, "calendar": "standard"}
+    return np.asarray(level), {}
+
+
+def _column(values, key):
+    """
+    It converts a column of the WaterFrame to the values of a NetCDF variable.
+
+    Parameters
+    ----------
+        values: pandas.Series
+        key: str
+            Key of the column.
+    Returns
+    -------
+        (values, fill_value): (numpy.ndarray, value or False)
+            Values to write and _FillValue of the variable (False if the
+            variable has no _FillValue).
+    """
+    if key.endswith("_QC"):
+        # Flags are always int8, without _FillValue, like read_csv() makes
+        array = np.nan_to_num(pd.to_numeric(values, errors="coerce")
+                              .to_numpy(dtype="f8", na_value=np.nan))
+        return array.astype("i1"), False
+    if pd.api.types.is_numeric_dtype(values.dtype) and \
+       not pd.api.types.is_bool_dtype(values.dtype):
+        array = values.to_numpy(na_value=np.nan)
+        if array.dtype.kind in "iu":
+            return array, False
+        array = array.astype(array.dtype if array.dtype.kind == "f" else "f8")
+        return array, np.nan
+    # Texts are written as variable length strings
+    return values.astype(str).to_numpy(dtype=object), False
+
+
+def write_netcdf(path, wf, progress=None,  # pylint: disable=C0103
+                 chunk_size=NETCDF_CHUNK_SIZE, complevel=NETCDF_COMPLEVEL):
+    """
+    It saves the WaterFrame in a NetCDF4 file. Each variable is written in
+    chunks of chunk_size values of TIME, compressed with zlib and shuffle.
+    Metadata are saved as global attributes, meanings as attributes of the
+    variables and the _QC columns as int8 variables, so the file can be opened
+    with WaterFrame.from_netcdf() or read_netcdf().
+
+    Parameters
+    ----------
+        path: str
+            Path of the file.
+        wf: WaterFrame
+            Data to save.
+        progress: callable, optional (progress = None)
+            progress(percentage, message). It is called after each chunk.
+        chunk_size: int, optional (chunk_size = NETCDF_CHUNK_SIZE)
+            Number of values of TIME of each chunk.
+        complevel: int, optional (complevel = NETCDF_COMPLEVEL)
+            zlib compression level, from 1 to 9.
+
+    Returns
+    -------
+        True: bool
+            The file is saved.
+
+    It raises a ValueError if the index has repeated values (NetCDF
+    dimensions have unique coordinates).
+    """
+    if progress is None:
+        progress = _no_progress
+
+    index = wf.data.index
+    # Each row is a position of the grid of the dimensions, so rows with the
+    # same index would overwrite each other
+    if index.has_duplicates:
+        repeated = index[index.duplicated()]
+        raise ValueError(
+            "The data has {} rows with a repeated index (i.e. {}), they can "
+            "not be saved in a NetCDF file. Resample the data or drop the "
+            "repeated rows".format(len(repeated), repeated[0]))
+    if isinstance(index, pd.MultiIndex):
+        levels = list(index.levels)
+        codes = [np.asarray(code) for code in index.codes]
+    else:
+        code, unique = pd.factorize(index, sort=True)
+        levels = [pd.Index(unique, name=index.name)]
+        codes = [code]
+    dims = [level.name or "LEVEL_{}".format(i)
+            for i, level in enumerate(levels)]
+    shape = tuple(len(level) for level in levels)
+    # Rows are written directly if each row is a position of the grid
+    direct = len(levels) == 1 and len(index) == shape[0] and \
+        np.array_equal(codes[0], np.arange(shape[0]))
+
+    # The chunks of the file are chunk_size values of the first dimension
+    chunk_size = max(1, min(chunk_size, shape[0] or 1))
+    chunks = [chunk_size] + list(shape[1:])
+    keys = list(wf.data.keys())
+    total = max(1, len(keys) * (-(-shape[0] // chunk_size)))
+    done = 0
+
+    # The file is written with a temporal name, so a cancelled or broken
+    # saving does not replace a good file
+    tmp_path = path + ".tmp"
+    try:
+        with netCDF4.Dataset(tmp_path, "w", format="NETCDF4") as dataset:
+            dataset.setncatts(_attributes(wf.metadata))
+            for dim, level, size in zip(dims, levels, shape):
+                dataset.createDimension(dim, size)
+                values, attrs = _coordinate(level)
+                variable = dataset.createVariable(
+                    dim, values.dtype if values.dtype.kind != "O" else str,
+                    (dim,))
+                variable.setncatts(_attributes(wf.meaning.get(dim, {}),
+                                               _RESERVED_ATTRS + list(attrs)))
+                variable.setncatts(attrs)
+                variable[:] = values
+
+            for key in keys:
+                if key in dims:
+                    continue
+                values, fill_value = _column(wf.data[key], key)
+                is_text = values.dtype.kind == "O"
+                variable = dataset.createVariable(
+                    key, str if is_text else values.dtype, tuple(dims),
+                    zlib=not is_text, shuffle=not is_text,
+                    complevel=complevel,
+                    chunksizes=None if is_text else chunks,
+                    fill_value=fill_value)
+                variable.setncatts(_attributes(wf.meaning.get(key, {}),
+                                               _RESERVED_ATTRS))
+                if direct:
+                    grid = values
+                else:
+                    # Rows are moved to their position of the grid, missing
+                    # positions are filled with the _FillValue (or 0)
+                    grid = np.full(shape, np.nan if fill_value is not False
+                                   else ("" if is_text else 0),
+                                   dtype=values.dtype)
+                    grid[tuple(codes)] = values
+                for start in range(0, shape[0], chunk_size):
+                    variable[start:start + chunk_size] = \
+                        grid[start:start + chunk_size]
+                    done += 1
+                    progress(100 * done / total, "Saving {}".format(key))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return True
@@ -1,5 +1,6 @@
 """Constructor of package"""
 
+from mooda_gui.widgets.plotcanvas import PlotCanvas
 from mooda_gui.widgets.dropwidget import DropWidget
 from mooda_gui.widgets.qcwidget import QCWidget
 from mooda_gui.widgets.renamewidget import RenameWidget
@@ -12,6 +13,7 @@ from mooda_gui.widgets.tsplotwidget import TSPlotWidget
 from mooda_gui.widgets.qcbarplotwidget import QCBarPlotWidget
 from mooda_gui.widgets.spectrogramplotwidget \
     import SpectrogramPlotWidget
+from mooda_gui.widgets.correlationplotwidget import CorrelationPlotWidget
 from mooda_gui.widgets.textframe import TextFrame
 from mooda_gui.widgets.plotsplitter import PlotSplitter
 from mooda_gui.widgets.egimdownloaderframe import EgimDownloaderFrame
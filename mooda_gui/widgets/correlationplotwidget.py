@@ -0,0 +1,170 @@
+"""Widget module"""
+# pylint: disable=no-name-in-module
+# pylint: disable=import-error
+
+import os
+from functools import partial
+import numpy as np
+import seaborn as sms
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import (QAction, QComboBox, QLabel, QToolBar,
+                             QVBoxLayout, QWidget)
+from mooda_gui.core.correlation import correlation_matrix
+from mooda_gui.widgets.plotcanvas import PlotCanvas
+
+
+class CorrelationPlotWidget(QWidget):
+    """
+    Pyqt5 widget to show the correlation matrix of some keys as a heatmap. It
+    is used in PlotSplitter.
+    """
+
+    # Signals
+    msg2statusbar = pyqtSignal(str)
+    msg2TextArea = pyqtSignal(str)
+
+    def __init__(self, wf, keys, data_state=None):  # pylint: disable=C0103
+        """
+        Constructor
+        :param wf: inWater WaterFrame object
+        :param keys: keys of wf.data to correlate
+        :param data_state: DataState of wf, to keep the coefficients of each
+        pair of keys
+        """
+        super().__init__()
+
+        # Instance variables
+        self.wf = wf  # pylint: disable=C0103
+        self.key = keys
+        # Name of this object
+        self.name = "corr_" + "_".join(keys)
+        # Versions of the keys, it is given by the PlotSplitter
+        self.data_state = data_state
+        # Coefficients and number of rows of the last figure
+        self.matrix = None
+        self.rows = None
+        # Method of the last figure
+        self.method = None
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+
+        self.init_ui()
+
+        # Creation of the figure
+        self.refresh_plot()
+
+    def plot(self, fig, data, method="pearson", versions=None):
+        """
+        It calculates the correlation matrix of the keys and it draws it as a
+        heatmap in a new figure. It runs in the Worker of the PlotCanvas, so
+        it does not change the widget: write_table() keeps the result.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            data: pandas.DataFrame
+                Columns of the keys, taken in the GUI thread.
+            method: str, optional (method = "pearson")
+                "pearson" or "spearman".
+            versions: dict, optional (versions = None)
+                {key: version of the key}, to use the aggregation cache.
+        Returns
+        -------
+            state: dict
+                "axes", "matrix", "rows" and "method".
+        """
+        matrix, rows = correlation_matrix(data, self.key, method, versions)
+        axes = fig.add_subplot(1, 1, 1)
+        image = axes.imshow(matrix.values, vmin=-1, vmax=1, cmap="RdBu_r")
+        fig.colorbar(image, ax=axes)
+        axes.set_xticks(range(len(matrix.columns)))
+        axes.set_xticklabels(matrix.columns, rotation=90)
+        axes.set_yticks(range(len(matrix.index)))
+        axes.set_yticklabels(matrix.index)
+        for (row, column), value in np.ndenumerate(matrix.values):
+            if not np.isnan(value):
+                axes.text(column, row, "{:.2f}".format(value), ha="center",
+                          va="center",
+                          color="w" if abs(value) > 0.6 else "k")
+        axes.set_title("{} correlation".format(method.capitalize()))
+        # Plot custom view
+        fig.tight_layout()
+        sms.despine(fig=fig, left=True, bottom=True)
+        return {"axes": axes, "matrix": matrix, "rows": rows,
+                "method": method}
+
+    def write_table(self, fig, state):
+        """
+        The PlotCanvas shows the new figure. It keeps the correlation matrix
+        made by plot() and it writes it in the datalog.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+            state: dict
+                Result of plot().
+        """
+        self.fig, self.axes = fig, state["axes"]
+        self.matrix, self.rows, self.method = state["matrix"], \
+            state["rows"], state["method"]
+        self.msg2TextArea.emit(
+            "\n{} correlation:\n{}\nNumber of values:\n{}".format(
+                self.method.capitalize(), self.matrix.round(3).to_string(),
+                self.rows.to_string()))
+
+    def dependencies(self):
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: list of str
+        """
+        return list(self.key)
+
+    def init_ui(self):
+        """Layout and main functionalities"""
+        path_icon = str(os.path.dirname(os.path.abspath(__file__))) + "\\..\\icon\\"
+
+        # Canvas
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.msg2statusbar.connect(self.msg2statusbar.emit)
+        self.plot_canvas.figure_ready.connect(self.write_table)
+
+        # Custom Toolbar
+        action_toolbar = QToolBar(self)
+        # - Method -
+        method_label = QLabel("Method:")
+        self.method_combo = QComboBox(self)
+        self.method_combo.addItems(["Pearson", "Spearman"])
+        self.method_combo.currentIndexChanged.connect(self.refresh_plot)
+        # - Actions -
+        close_act = QAction(QIcon(path_icon+"close.png"), 'Close', self)
+        close_act.triggered.connect(self.hide)
+        # - Format -
+        action_toolbar.addWidget(method_label)
+        action_toolbar.addWidget(self.method_combo)
+        action_toolbar.addAction(close_act)
+
+        # Layout
+        # - For the Widget
+        v_plot = QVBoxLayout()
+        v_plot.addWidget(self.plot_canvas)
+        v_plot.addWidget(action_toolbar)
+        self.setLayout(v_plot)
+
+    def refresh_plot(self):
+        """It makes the correlation matrix again (i.e. the data has changed)"""
+        self.msg2statusbar.emit("Making figure")
+        versions = None
+        if self.data_state is not None:
+            versions = {key: self.data_state.key_version(key)
+                        for key in self.key}
+        # The Worker uses a copy of the columns, self.wf.data can change
+        self.plot_canvas.render(partial(
+            self.plot, data=self.wf.data[list(dict.fromkeys(self.key))],
+            method=self.method_combo.currentText().lower(),
+            versions=versions))
@@ -3,15 +3,18 @@
 # pylint: disable=import-error
 
 import os
+import math
+from functools import partial
+import numpy as np
 import seaborn as sms
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import \
-    FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import \
-    NavigationToolbar2QT as NavigationToolbar
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QAction, QToolBar, QVBoxLayout, QWidget)
+from mooda_gui.core.aggregation import aggregation_cache
+from mooda_gui.core.histogram import (Histogram, column_histogram,
+                                      histogram_range)
+from mooda_gui.core.summary import column_summary
+from mooda_gui.widgets.plotcanvas import PlotCanvas
 
 
 class HistoPlotWidget(QWidget):
@@ -22,11 +25,12 @@ class HistoPlotWidget(QWidget):
     # Signals
     msg2Statusbar = pyqtSignal(str)
 
-    def __init__(self, wf, keys):  # pylint: disable=C0103
+    def __init__(self, wf, keys, data_state=None):  # pylint: disable=C0103
         """
         Constructor
         :param wf: inWater WaterFrame object
         :param keys: keys of wf.data to plot
+        :param data_state: DataState of wf, with the summaries of the keys
         """
         super().__init__()
 
@@ -36,26 +40,139 @@ class HistoPlotWidget(QWidget):
         # Name of this object
         self.name = "_".join(keys)
         self.name = "hist_"+self.name
+        # Versions and summaries of the keys, it is given by the PlotSplitter
+        self.data_state = data_state
+        # Histograms of the figure: {key: Histogram}
+        self.histograms = {}
+        # Bars and mean lines of the keys: {key: BarContainer}, {key: Line2D}
+        self.bars = {}
+        self.mean_lines = {}
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+
+        self.init_ui()
 
         # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
-        self.axes = self.wf.hist(self.key, mean_line=True, ax=self.axes)
+        self.refresh_plot()
+
+    @staticmethod
+    def layout(size):
+        """
+        It returns the rows and columns of the subplots, like DataFrame.hist().
+
+        Parameters
+        ----------
+            size: int
+                Number of subplots.
+        Returns
+        -------
+            (rows, columns): (int, int)
+        """
+        if size <= 1:
+            return 1, 1
+        if size == 2:
+            return 1, 2
+        columns = math.ceil(math.sqrt(size))
+        return math.ceil(size / columns), columns
+
+    def plot(self, fig, data, ranges, versions):
+        """
+        It calculates the histograms of the keys and it draws them in a new
+        figure. It runs in the Worker of the PlotCanvas.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            data: pandas.DataFrame
+                Columns of the keys, taken in the GUI thread.
+            ranges: dict
+                {key: range of the bins}, keys without values are not in it.
+            versions: dict
+                {key: version of the key}, to use the aggregation cache.
+        Returns
+        -------
+            state: dict
+                Result of draw().
+        """
+        histograms = {key: column_histogram(data[key], value_range,
+                                            version=versions[key])
+                      for key, value_range in ranges.items()}
+        return self.draw(fig, histograms)
+
+    def draw(self, fig, histograms):
+        """
+        It draws the histograms like WaterFrame.hist(): a subplot for each
+        key with the mean line. It does not change the widget, plot_ready()
+        keeps the returned artists in the GUI thread.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            histograms: dict
+                {key: Histogram}.
+        Returns
+        -------
+            state: dict
+                "axes", "histograms", "bars" and "mean_lines".
+        """
+        rows, columns = self.layout(len(histograms))
+        bars, mean_lines = {}, {}
+        axes = None
+        for i, (key, histogram) in enumerate(histograms.items()):
+            axes = fig.add_subplot(rows, columns, i + 1)
+            edges = histogram.edges
+            bars[key] = axes.bar(edges[:-1], histogram.counts,
+                                 width=np.diff(edges), align="edge")
+            mean_lines[key] = axes.axvline(histogram.mean(), color='k',
+                                           linestyle='dashed', linewidth=1)
+            axes.set_title(key)
+            axes.set_xlabel("Values")
+            axes.set_ylabel("Frequency")
+            axes.grid(True)
+        if axes is None:
+            axes = fig.add_subplot(1, 1, 1)
         # Plot custom view
-        plt.tight_layout()
-        sms.despine()
+        fig.tight_layout()
+        sms.despine(fig=fig)
+        return {"axes": axes, "histograms": histograms, "bars": bars,
+                "mean_lines": mean_lines}
 
-        self.init_ui()
+    def plot_ready(self, fig, state):
+        """
+        The PlotCanvas shows the new figure. It keeps the histograms and the
+        artists made by draw() in the Worker.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+            state: dict
+                Result of draw().
+        """
+        self.fig, self.axes = fig, state["axes"]
+        self.histograms, self.bars, self.mean_lines = state["histograms"], \
+            state["bars"], state["mean_lines"]
+
+    def dependencies(self):
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: list of str
+        """
+        return list(self.key)
 
     def init_ui(self):
         """Layout and main functionality"""
         path_icon = str(os.path.dirname(os.path.abspath(__file__))) + "\\..\\icon\\"
 
         # Canvas
-        self.plot_canvas = FigureCanvas(self.fig)
-        self.plot_canvas.draw()
-
-        # Matplotlib toolbar
-        plot_toolbar = NavigationToolbar(self.plot_canvas, self)
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.figure_ready.connect(self.plot_ready)
+        self.plot_canvas.msg2statusbar.connect(self.msg2Statusbar.emit)
 
         # Custom Toolbar
         action_toolbar = QToolBar(self)
@@ -69,61 +186,80 @@ class HistoPlotWidget(QWidget):
         # - For the Widget
         v_plot = QVBoxLayout()
         v_plot.addWidget(self.plot_canvas)
-        v_plot.addWidget(plot_toolbar)
         v_plot.addWidget(action_toolbar)
         self.setLayout(v_plot)
 
+    def ranges(self):
+        """
+        It returns the range of the bins of the keys with values, from their
+        ColumnSummary.
+
+        Returns
+        -------
+            ranges: dict
+                {key: (first edge, last edge)}.
+        """
+        ranges = {}
+        for key in self.key:
+            value_range = histogram_range(
+                column_summary(self.wf.data, key, self.data_state))
+            if value_range is not None:
+                ranges[key] = value_range
+        return ranges
+
+    def versions(self):
+        """It returns the versions of the keys, None without DataState"""
+        return {key: None if self.data_state is None else
+                self.data_state.key_version(key) for key in self.key}
+
     def refresh_plot(self):
         """
-        It refresh the plot according to the actions of the action_toolbar
+        It makes the histogram again (i.e. the data has changed)
         :return:
         """
-
         self.msg2Statusbar.emit("Making figure")
+        # Keys without values can not be drawn
+        ranges = self.ranges()
+        self.plot_canvas.render(partial(self.plot,
+                                        data=self.wf.data[list(ranges)],
+                                        ranges=ranges,
+                                        versions=self.versions()))
 
-        # Remove previous axes from the figure
-        self.axes.cla()
-
-        # Rol value
-        rol = self.rolling.value()
-        if rol == 0:
-            rol = None
-
-        # Average value
-        average = None
-        if self.average.currentText() == 'Minutely':
-            average = "T"
-        elif self.average.currentText() == 'Hourly':
-            average = "H"
-        elif self.average.currentText() == 'Daily':
-            average = "D"
-        elif self.average.currentText() == 'Weekly':
-            average = "W"
-
-        if len(self.key) > 1:
-            for key in self.key:
-                second_y = False
-                if key == self.right:
-                    second_y = True
-                self.axes = self.wf.tsplot(keys=key, ax=self.axes,
-                                           secondary_y=second_y,
-                                           average_time=average,
-                                           rolling=rol)
-        else:
-            key = self.key[0]
-            if "_QC" in key:
-                self.axes = self.wf.qcplot(key[:-3], ax=self.axes)
-            else:
-                self.axes = self.wf.tsplot(keys=key, rolling=rol, ax=self.axes,
-                                           average_time=average,
-                                           secondary_y=False)
-        # Plot custom view
-        plt.tight_layout()
-        if self.right is None:
-            sms.despine()
-
-        self.plot_canvas.draw()
-
-        self.msg2Statusbar.emit("Ready")
+    def append_data(self, rows):
+        """
+        It adds the values of new rows to the histograms. If the range of the
+        bins does not change, only the height of the bars changes.
 
-        print("Done")
+        Parameters
+        ----------
+            rows: pandas.DataFrame
+                Rows that have been appended to self.wf.data.
+        """
+        keys = [key for key in self.key if key in rows.keys()]
+        if not keys:
+            return
+        ranges = self.ranges()
+        if self.axes is None or ranges.keys() != self.histograms.keys() or \
+           any(self.histograms[key].value_range != ranges[key]
+               for key in ranges):
+            self.refresh_plot()
+            return
+        versions = self.versions()
+        for key in ranges:
+            if key not in keys:
+                continue
+            histogram = self.histograms[key]
+            histogram = histogram.merge(Histogram.from_values(
+                rows[key].to_numpy(), histogram.bins, histogram.value_range))
+            if versions[key] is not None:
+                aggregation_cache().put(
+                    ("histogram", key, versions[key], histogram.bins,
+                     histogram.value_range), histogram)
+            self.histograms[key] = histogram
+            for patch, count in zip(self.bars[key], histogram.counts):
+                patch.set_height(count)
+            mean = histogram.mean()
+            self.mean_lines[key].set_xdata([mean, mean])
+            self.bars[key][0].axes.relim()
+            self.bars[key][0].axes.autoscale_view()
+        self.plot_canvas.draw_idle()
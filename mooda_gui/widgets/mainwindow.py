@@ -4,7 +4,7 @@
 
 import os
 from PyQt5.QtWidgets import (QMainWindow, QAction, qApp, QSplitter,
-                             QFileDialog, QMenu)
+                             QFileDialog, QMenu, QProgressBar, QPushButton)
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import QDateTime, Qt
 from mooda import WaterFrame
@@ -26,6 +26,13 @@ class MOODA(QMainWindow):
         # Status bar
         self.statusbar = self.statusBar()
         self.statusbar.showMessage('Ready')
+        # - Progress of the file reading
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(200)
+        self.cancel_button = QPushButton("Cancel")
+        self.statusbar.addPermanentWidget(self.progress_bar)
+        self.statusbar.addPermanentWidget(self.cancel_button)
 
         # Create text zone
         self.datalog = TextFrame()
@@ -35,6 +42,11 @@ class MOODA(QMainWindow):
         self.plot_area = PlotSplitter()
         self.plot_area.msg2statusbar[str].connect(self.statusbar.showMessage)
         self.plot_area.msg2TextArea[str].connect(self.datalog.write)
+        self.plot_area.progress2statusbar[int].connect(self.progress_bar.setValue)
+        self.plot_area.running2statusbar[bool].connect(self.progress_bar.setVisible)
+        self.plot_area.running2statusbar[bool].connect(self.cancel_button.setVisible)
+        self.plot_area.data_opened.connect(self.enable_data_actions)
+        self.cancel_button.clicked.connect(self.plot_area.cancel_running)
 
         # EGIM Downloader
         self.egim_downloader = EgimDownloaderFrame()
@@ -62,6 +74,29 @@ class MOODA(QMainWindow):
         add_act.setStatusTip('Add data to the current dataset')
         add_act.triggered.connect(lambda: self.open_file(concat=True))
         file_menu.addAction(add_act)
+        # -- Lazy open --
+        lazy_act = QAction('Open &lazily', self)
+        lazy_act.setCheckable(True)
+        lazy_act.setStatusTip(
+            'Open NetCDF files reading only the variables that are used')
+        lazy_act.toggled.connect(self.plot_area.set_lazy_open)
+        file_menu.addAction(lazy_act)
+        # -- Use cache --
+        cache_act = QAction('Use &cache', self)
+        cache_act.setCheckable(True)
+        cache_act.setChecked(True)
+        cache_act.setStatusTip(
+            'Save the parsed files in a cache to open them faster next time')
+        cache_act.toggled.connect(self.plot_area.set_use_cache)
+        file_menu.addAction(cache_act)
+        # -- Follow file --
+        self.follow_act = QAction('&Follow file', self)
+        self.follow_act.setCheckable(True)
+        self.follow_act.setEnabled(False)
+        self.follow_act.setStatusTip(
+            'Append the new records of the opened file while it grows')
+        self.follow_act.toggled.connect(self.follow_file)
+        file_menu.addAction(self.follow_act)
         # --- EGIM downloader ---
         downloader_act = QAction(QIcon(path_icon+'\\cloud.png'), '&EGIM downloader', self)
         downloader_act.setStatusTip('Open and analyze data from EMSODEV servers')
@@ -158,6 +193,8 @@ class MOODA(QMainWindow):
         self.egim_downloader.hide()
         self.datalog.hide()
         self.plot_area.hide()
+        self.progress_bar.hide()
+        self.cancel_button.hide()
         # - Write date and time into 'text'
         datetime_ = QDateTime.currentDateTime()
         self.datalog.write(datetime_.toString(Qt.DefaultLocaleLongDate))
@@ -188,27 +225,42 @@ class MOODA(QMainWindow):
         if wf:
             file_name = wf
         else:
-            # Open the save file dialog
-            file_name, _ = QFileDialog.getOpenFileName(
+            # Open the save file dialog. If many files are selected, they are
+            # merged in a single WaterFrame
+            file_name, _ = QFileDialog.getOpenFileNames(
                 caption="Open data file", directory="",
-                filter="NetCDF (*.nc);;CSV (*.csv);;Pickle (*.pkl)")
+                filter="NetCDF (*.nc);;CSV (*.csv);;Pickle (*.pkl);;"
+                       "Mooda binary (*.mbin)")
 
         # Send the path to the PlotFrame to be opened
+        # The actions are enabled when the plot_area emits data_opened
         if file_name:
-            ok = self.plot_area.open_data(file_name, concat)  # pylint: disable=C0103
-            if ok:
-                # Show plot area
-                self.plot_area.show()
-                # Enable actions
-                self.delete_act.setEnabled(True)
-                self.save_act.setEnabled(True)
-                self.metadata_act.setEnabled(True)
-                self.data_view_act.setEnabled(True)
-                self.qc_preferences_act.setEnabled(True)
-                self.qc_auto_act.setEnabled(True)
-                self.rename_act.setEnabled(True)
-                self.resample_act.setEnabled(True)
-                self.slice_act.setEnabled(True)
+            self.follow_act.setChecked(False)
+            self.plot_area.open_data(file_name, concat)
+
+    def enable_data_actions(self):
+        """It shows the plot area and enables the actions to work with data"""
+        # Show plot area
+        self.plot_area.show()
+        # Enable actions
+        self.delete_act.setEnabled(True)
+        self.save_act.setEnabled(True)
+        self.metadata_act.setEnabled(True)
+        self.data_view_act.setEnabled(True)
+        self.qc_preferences_act.setEnabled(True)
+        self.qc_auto_act.setEnabled(True)
+        self.rename_act.setEnabled(True)
+        self.resample_act.setEnabled(True)
+        self.slice_act.setEnabled(True)
+        self.follow_act.setEnabled(True)
+
+    def follow_file(self, checked):
+        """It starts or stops the follow mode of the opened file"""
+        if not self.plot_area.set_follow(checked):
+            # The file can not be followed
+            self.follow_act.blockSignals(True)
+            self.follow_act.setChecked(False)
+            self.follow_act.blockSignals(False)
 
     def save_file(self):
         """
@@ -217,6 +269,7 @@ class MOODA(QMainWindow):
         # Open the save file dialog
         file_name, _ = QFileDialog.getSaveFileName(
             caption="Open data file", directory="",
-            filter="Pickle (*.pkl);;CSV (*.csv)")
+            filter="NetCDF (*.nc);;Pickle (*.pkl);;CSV (*.csv);;"
+                   "Mooda binary (*.mbin)")
         if file_name:
-            self.plot_area.saveData(file_name)
+            self.plot_area.save_data(file_name)
@@ -0,0 +1,343 @@
+"""It contains PlotCanvas, the area of the plot widgets"""
+# pylint: disable=no-name-in-module
+# pylint: disable=import-error
+
+from matplotlib.backends.backend_qt5agg import \
+    FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import \
+    NavigationToolbar2QT as NavigationToolbar
+from PyQt5.QtCore import pyqtSignal, Qt, QThreadPool, QTimer
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QLabel, QSizePolicy, QVBoxLayout, QWidget
+from mooda_gui.core import Worker
+from mooda_gui.core.render import rasterize, render_figure
+
+# Milliseconds without resizes before the figure is drawn with the new size
+RESIZE_DELAY = 200
+# Kinds of tasks, in the order that pending tasks are started: a new figure,
+# new values of the artists of the figure and a drawing of the figure
+TASK_KINDS = ("render", "update", "draw")
+# Size (pixels) of the figures that are made before the widget is shown
+DEFAULT_WIDTH = 640
+DEFAULT_HEIGHT = 480
+
+
+class PlotToolbar(NavigationToolbar):
+    """NavigationToolbar that saves the dynamic artists of the PlotCanvas"""
+
+    def __init__(self, canvas, plot_canvas):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            canvas: FigureCanvas
+            plot_canvas: PlotCanvas
+        """
+        super().__init__(canvas, plot_canvas)
+        self.plot_canvas = plot_canvas
+
+    def save_figure(self, *args):
+        """Animated artists are not drawn by savefig()"""
+        self.plot_canvas.set_animated(False)
+        try:
+            super().save_figure(*args)
+        finally:
+            self.plot_canvas.set_animated(True)
+
+
+class PlotCanvas(QWidget):
+    """
+    Area of a plot. Figures are made and drawn in a Worker of the QThreadPool
+    and they are shown as an image, so the GUI is not blocked. When the user
+    clicks or scrolls on the image, it is changed by an interactive canvas
+    with the NavigationToolbar.
+
+    Plots can change some artists of the figure (the dynamic artists) and
+    draw them again with redraw(). In the interactive canvas they are
+    animated and blitted over a cached background, so the rest of the figure
+    is not drawn again.
+    """
+
+    # Signals
+    # A new figure has been made: the figure and the value returned by draw()
+    figure_ready = pyqtSignal(object, object)
+    msg2statusbar = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        """Constructor"""
+        super().__init__(parent)
+
+        # Instance variables
+        self.figure = None
+        # RGBA values of the image (QImage does not copy them)
+        self.image = None
+        # Interactive canvas and toolbar
+        self.canvas = None
+        self.toolbar = None
+        self.draw_connection = None
+        # Artists that change without drawing the rest of the figure
+        self.dynamic = []
+        # Figure without the dynamic artists (interactive canvas)
+        self.background = None
+        # Worker that is rendering and next task of each kind (TASK_KINDS)
+        self.worker = None
+        self.pending = {}
+        self.thread_pool = QThreadPool.globalInstance()
+
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DELAY)
+        self.resize_timer.timeout.connect(self.draw_idle)
+
+        self.init_ui()
+
+    def init_ui(self):
+        """Layout"""
+        self.label = QLabel("Making figure", self)
+        self.label.setAlignment(Qt.AlignCenter)
+        self.label.setMinimumSize(200, 150)
+        # The size of the image does not change the size of the widget
+        self.label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.label.setToolTip("Click on the plot to zoom or pan")
+
+        self.v_layout = QVBoxLayout()
+        self.v_layout.setContentsMargins(0, 0, 0, 0)
+        self.v_layout.addWidget(self.label)
+        self.setLayout(self.v_layout)
+
+    def _size(self):
+        """Size of the figure in pixels"""
+        if self.isVisible() and self.label.width() > 50:
+            return self.label.width(), self.label.height()
+        return DEFAULT_WIDTH, DEFAULT_HEIGHT
+
+    def _start(self, task, kind):
+        """
+        It runs the task (a Worker factory) now or after the current one.
+        Only the last task of each kind is important. A new figure replaces
+        the pending tasks (it is drawn with the current values), and a
+        drawing is not needed while a new figure is pending.
+
+        Parameters
+        ----------
+            task: callable
+                task() returns the Worker.
+            kind: str
+                Kind of the task, one of TASK_KINDS.
+        """
+        if self.worker is not None:
+            if kind == "render":
+                self.pending = {kind: task}
+            elif kind != "draw" or "render" not in self.pending:
+                self.pending[kind] = task
+            return
+        worker = task()
+        worker.signals.error.connect(self.render_error)
+        worker.signals.finished.connect(self.render_finished)
+        self.worker = worker
+        self.thread_pool.start(worker)
+
+    def render(self, draw):
+        """
+        It makes a new figure in a Worker. draw(fig) adds the plots to the
+        figure, it must not use pyplot. It runs out of the GUI thread, so it
+        must not change the plot widget: it returns the state of the plot
+        (i.e. its artists), that figure_ready gives to the GUI thread.
+
+        Parameters
+        ----------
+            draw: callable
+                draw(fig).
+        """
+        def task():
+            width, height = self._size()
+            worker = Worker(render_figure, draw, width, height)
+            worker.signals.result.connect(self.new_figure)
+            return worker
+        self._start(task, "render")
+
+    def draw_idle(self):
+        """It draws the current figure again (i.e. after changes of data or
+        size)"""
+        if self.figure is None:
+            return
+        if self.canvas is not None:
+            self.canvas.draw_idle()
+            return
+
+        def task():
+            width, height = self._size()
+            figure = self.figure
+            worker = Worker(rasterize, figure, width, height)
+            worker.signals.result.connect(
+                lambda image: self.show_image(image) if figure is self.figure
+                else None)
+            return worker
+        self._start(task, "draw")
+
+    def update_artists(self, compute, apply):
+        """
+        It changes the current figure. compute() runs in a Worker (i.e. new
+        values of the lines) and apply(result) changes the artists in the GUI
+        thread; apply() should call redraw().
+
+        Parameters
+        ----------
+            compute: callable
+                compute(progress).
+            apply: callable
+                apply(result).
+        """
+        def task():
+            figure = self.figure
+            worker = Worker(compute)
+            worker.signals.result.connect(
+                lambda result: apply(result) if figure is self.figure
+                else None)
+            return worker
+        self._start(task, "update")
+
+    def set_dynamic(self, artists):
+        """
+        It selects the artists that redraw() can draw alone.
+
+        Parameters
+        ----------
+            artists: list of matplotlib.artist.Artist
+        """
+        if self.canvas is not None:
+            for artist in self.dynamic:
+                artist.set_animated(False)
+            for artist in artists:
+                artist.set_animated(True)
+            # The new background is made by the next draw
+            self.background = None
+        self.dynamic = list(artists)
+
+    def set_animated(self, animated):
+        """It changes the animated state of the dynamic artists"""
+        for artist in self.dynamic:
+            artist.set_animated(animated and self.canvas is not None)
+
+    def redraw(self, blit=True):
+        """
+        It draws the figure after changes of the dynamic artists.
+
+        Parameters
+        ----------
+            blit: bool, optional (blit = True)
+                Only the dynamic artists have changed (not the limits of the
+                axes nor the labels), so they can be drawn over the cached
+                background of the interactive canvas.
+        """
+        if self.figure is None:
+            return
+        if self.canvas is None:
+            # The layout of the image does not change
+            def task():
+                figure = self.figure
+                worker = Worker(rasterize, figure)
+                worker.signals.result.connect(
+                    lambda image: self.show_image(image)
+                    if figure is self.figure else None)
+                return worker
+            self._start(task, "draw")
+        elif blit and self.background is not None:
+            self.canvas.restore_region(self.background)
+            self.draw_dynamic()
+        else:
+            self.canvas.draw_idle()
+
+    def draw_dynamic(self):
+        """It draws the dynamic artists on the interactive canvas"""
+        for artist in self.dynamic:
+            self.figure.draw_artist(artist)
+        self.canvas.blit(self.figure.bbox)
+
+    def on_draw(self, event):  # pylint: disable=unused-argument
+        """
+        The interactive canvas has drawn the figure without the dynamic
+        artists. It caches the background and it draws the dynamic artists.
+        """
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self.dynamic:
+            self.draw_dynamic()
+
+    def new_figure(self, result):
+        """It shows the figure made by the Worker"""
+        self.figure, image, state = result
+        self.make_static()
+        self.dynamic = []
+        self.show_image(image)
+        self.figure_ready.emit(self.figure, state)
+
+    def show_image(self, image):
+        """It shows the RGBA values of the figure"""
+        self.image = image
+        height, width, _ = image.shape
+        qimage = QImage(image.data, width, height, 4 * width,
+                        QImage.Format_RGBA8888)
+        self.label.setPixmap(QPixmap.fromImage(qimage))
+
+    def render_error(self, error):
+        """It informs about an exception while the figure was made"""
+        self.label.setText("Error making the figure")
+        # The error is a traceback, its last line is the exception
+        lines = str(error).strip().splitlines()
+        self.msg2statusbar.emit("Error making the figure{}".format(
+            ": " + lines[-1] if lines else ""))
+
+    def render_finished(self):
+        """It starts the next pending task"""
+        self.worker = None
+        for kind in TASK_KINDS:
+            if kind in self.pending:
+                self._start(self.pending.pop(kind), kind)
+                return
+
+    def make_interactive(self):
+        """It changes the image by an interactive canvas"""
+        if self.figure is None or self.canvas is not None or \
+           self.worker is not None:
+            return
+        self.canvas = FigureCanvas(self.figure)
+        self.toolbar = PlotToolbar(self.canvas, self)
+        self.draw_connection = self.canvas.mpl_connect("draw_event",
+                                                       self.on_draw)
+        self.set_animated(True)
+        self.label.hide()
+        self.v_layout.addWidget(self.canvas)
+        self.v_layout.addWidget(self.toolbar)
+        self.canvas.draw_idle()
+
+    def make_static(self):
+        """It removes the interactive canvas and it shows the image"""
+        if self.canvas is None:
+            return
+        self.canvas.mpl_disconnect(self.draw_connection)
+        for widget in [self.toolbar, self.canvas]:
+            self.v_layout.removeWidget(widget)
+            widget.deleteLater()
+        self.canvas = None
+        self.toolbar = None
+        self.draw_connection = None
+        self.background = None
+        self.set_animated(False)
+        self.label.show()
+
+    def mousePressEvent(self, event):  # pylint: disable=C0103
+        """The first click changes the image by the interactive canvas"""
+        self.make_interactive()
+        super().mousePressEvent(event)
+
+    def wheelEvent(self, event):  # pylint: disable=C0103
+        """Scrolling changes the image by the interactive canvas"""
+        self.make_interactive()
+        super().wheelEvent(event)
+
+    def resizeEvent(self, event):  # pylint: disable=C0103
+        """The image is drawn again with the new size"""
+        super().resizeEvent(event)
+        if self.canvas is None and self.figure is not None:
+            self.resize_timer.start()
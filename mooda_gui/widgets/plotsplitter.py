@@ -2,16 +2,34 @@
 # pylint: disable=no-name-in-module
 # pylint: disable=import-error
 
+import os
+import numpy as np
+import pandas as pd
 from PyQt5.QtWidgets import (QWidget, QLabel, QListWidget, QPushButton,
                              QVBoxLayout, QSplitter, QGroupBox, QRadioButton,
                              QAbstractItemView, QPlainTextEdit)
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtCore import (pyqtSignal, Qt, QThreadPool, QFileSystemWatcher,
+                          QTimer)
 from mooda import WaterFrame
+from mooda_gui.core import (Worker, LazyNetCDF, read_file, read_files,
+                            write_binary, write_netcdf, AppendBuffer,
+                            FileTail, DataState, PlotRegistry,
+                            aggregation_cache, ColumnSummary,
+                            column_summary, AcousticData)
+from mooda_gui.core.acoustic import is_acoustic_key
+from mooda_gui.core.qc import (QCMemory, qc_options, qc_signature,
+                               resolve_options, run_qc)
+from mooda_gui.core.aggregation import (RULE_MINUTES, cache_pyramids,
+                                        column_pyramid, pyramid_keys,
+                                        series_values)
 from mooda_gui.widgets import (DropWidget, QCWidget, RenameWidget, ResampleWidget, SliceWidget,
                                ScatterMatrixPlotWidget, QCPlotWidget, TSPlotWidget, QCBarPlotWidget,
-                               SpectrogramPlotWidget)
+                               SpectrogramPlotWidget, CorrelationPlotWidget)
 from mooda_gui.widgets.histoplotwidget import HistoPlotWidget
 
+# Milliseconds without changes of a followed file before reading it
+FOLLOW_DELAY = 500
+
 
 class PlotSplitter(QSplitter):
     """Pyqt5 widget to show data in plots and lists."""
@@ -19,6 +37,11 @@ class PlotSplitter(QSplitter):
     # Signals
     msg2statusbar = pyqtSignal(str)
     msg2TextArea = pyqtSignal(str)
+    # Progress of the file reading
+    progress2statusbar = pyqtSignal(int)
+    running2statusbar = pyqtSignal(bool)
+    # New data is ready to use
+    data_opened = pyqtSignal()
 
     def __init__(self):
         """
@@ -28,8 +51,41 @@ class PlotSplitter(QSplitter):
 
         # Instance variables
         self.wf = WaterFrame()  # pylint: disable=C0103
-        # List of PlotWidget, to control them in any case
-        self.plot_widget_list = []
+        # PlotWidgets by kind and keys, to control them in any case
+        self.plot_registry = PlotRegistry()
+        # Versions of the keys of self.wf, plots are made again only if
+        # their keys have changed
+        self.data_state = DataState()
+        # Worker that is reading a file
+        self.load_worker = None
+        # Worker that is writing a file
+        self.save_worker = None
+        # Worker that is applying the QC tests
+        self.qc_worker = None
+        self.thread_pool = QThreadPool.globalInstance()
+        # NetCDF files are opened with a LazyNetCDF if lazy_open is True
+        self.lazy_open = False
+        self.lazy_source = None
+        # NetCDF and CSV files are read from the columnar cache if use_cache
+        # is True
+        self.use_cache = True
+        # Spectra of acoustic data, they are kept out of self.wf.data
+        self.acoustic = None
+        # Rows of each key that have been tested by the QC tests
+        self.qc_memory = QCMemory()
+        # Path of the opened file (None if data comes from many files)
+        self.data_path = None
+        # Follow mode: new records of the opened file are appended
+        self.follow_tail = None
+        self.follow_buffer = None
+        self.tail_worker = None
+        self.tail_pending = False
+        self.follow_watcher = QFileSystemWatcher(self)
+        self.follow_watcher.fileChanged.connect(self.file_changed)
+        self.follow_timer = QTimer(self)
+        self.follow_timer.setSingleShot(True)
+        self.follow_timer.setInterval(FOLLOW_DELAY)
+        self.follow_timer.timeout.connect(self.read_tail)
 
         self.init_ui()
 
@@ -66,12 +122,15 @@ class PlotSplitter(QSplitter):
         self.auto_plot_radio_button.setChecked(True)
         self.multiple_parameter_radio_button = QRadioButton("Multiparameter", self)
         self.correlation_radio_button = QRadioButton("Correlation", self)
+        self.correlation_matrix_radio_button = QRadioButton(
+            "Correlation matrix", self)
         self.histogram_radio_button = QRadioButton("Histogram", self)
         self.parameter_qc_radio_button = QRadioButton("QC of the parameter", self)
         v_plot_group_box.addWidget(self.auto_plot_radio_button)
         v_plot_group_box.addWidget(self.histogram_radio_button)
         v_plot_group_box.addWidget(self.multiple_parameter_radio_button)
         v_plot_group_box.addWidget(self.correlation_radio_button)
+        v_plot_group_box.addWidget(self.correlation_matrix_radio_button)
         v_plot_group_box.addWidget(self.parameter_qc_radio_button)
         plot_group_box.setLayout(v_plot_group_box)
 
@@ -180,42 +239,45 @@ class PlotSplitter(QSplitter):
         if self.parameter_qc_radio_button.isChecked():
             keys = [keys[0] + "_QC"]
 
-        # Check if it is a correlation
-        if self.correlation_radio_button.isChecked():
-            plot_widget = ScatterMatrixPlotWidget(wf=self.wf, keys=keys)
-            self.addWidget(plot_widget)
-            self.msg2statusbar.emit("Ready")
-            return
+        self.ensure_loaded(keys)
 
-        # Create name of the plot
-        name = '_'.join(keys)
-
-        if self.histogram_radio_button.isChecked():
-            name = "hist_" + name
+        # Kind of plot
+        if self.correlation_radio_button.isChecked():
+            kind = "correlation"
+        elif self.correlation_matrix_radio_button.isChecked():
+            kind = "heatmap"
+        elif len(keys) == 1 and "_QC" in keys[0]:
+            kind = "qc"
+        elif self.histogram_radio_button.isChecked():
+            kind = "hist"
+        else:
+            kind = "ts"
 
         # Check if plot is done
-        new = True
-        for plot_widget in self.plot_widget_list:
-            if plot_widget.name == name:
-                if ~plot_widget.isVisible():
-                    plot_widget.refresh_plot()
-                    plot_widget.show()
-                new = False
-                break
-
+        plot_widget = self.plot_registry.get(kind, keys)
+        if plot_widget is not None:
+            self.show_plot(plot_widget)
         # Create the plot if is new
-        if new:
-            if len(keys) == 1 and "_QC" in keys[0]:
+        else:
+            if kind == "correlation":
+                plot_widget = ScatterMatrixPlotWidget(
+                    wf=self.wf, keys=keys, data_state=self.data_state)
+            elif kind == "qc":
                 plot_widget = QCPlotWidget(wf=self.wf, key=keys[0])
+            elif kind == "heatmap":
+                plot_widget = CorrelationPlotWidget(
+                    wf=self.wf, keys=keys, data_state=self.data_state)
+                plot_widget.msg2statusbar[str].connect(self.msg2statusbar.emit)
+                plot_widget.msg2TextArea[str].connect(self.msg2TextArea.emit)
+            elif kind == "hist":
+                plot_widget = HistoPlotWidget(wf=self.wf, keys=keys,
+                                              data_state=self.data_state)
+                plot_widget.msg2Statusbar[str].connect(self.msg2statusbar.emit)
             else:
-                if self.histogram_radio_button.isChecked():
-                    plot_widget = HistoPlotWidget(wf=self.wf, keys=keys)
-                else:
-                    plot_widget = TSPlotWidget(wf=self.wf, keys=keys)
+                plot_widget = TSPlotWidget(wf=self.wf, keys=keys,
+                                           data_state=self.data_state)
                 plot_widget.msg2statusbar[str].connect(self.msg2statusbar.emit)
-            self.addWidget(plot_widget)
-            # Add the widget to the list
-            self.plot_widget_list.append(plot_widget)
+            self.add_plot_widget(kind, keys, plot_widget)
 
         self.msg2statusbar.emit("Ready")
 
@@ -224,21 +286,15 @@ class PlotSplitter(QSplitter):
         It creates a FigureCanvas with the input figure (QC)
         """
         self.msg2statusbar.emit("Making the figure")
+        # The QC plot uses all parameters
+        self.materialize()
         # Check if the plot exists
-        plot_widget = None
-        for plot_widget_ in self.plot_widget_list:
-            if plot_widget_.name == "QC":
-                plot_widget = plot_widget_
-                plot_widget.wf = self.wf
-                plot_widget.refresh_plot()
-                plot_widget.show()
-                break
-        if plot_widget is None:
-
+        plot_widget = self.plot_registry.get("qcbar")
+        if plot_widget is not None:
+            self.show_plot(plot_widget)
+        else:
             plot_widget = QCBarPlotWidget(wf=self.wf)
-            self.addWidget(plot_widget)
-            # Add the widget to the list
-            self.plot_widget_list.append(plot_widget)
+            self.add_plot_widget("qcbar", None, plot_widget)
         self.msg2statusbar.emit("Ready")
 
     def add_spectro_plot(self):
@@ -246,36 +302,94 @@ class PlotSplitter(QSplitter):
 
         self.msg2statusbar.emit("Making the figure")
         # Check if the plot exists
-        plot_widget = None
-        for plot_widget_ in self.plot_widget_list:
-            if plot_widget_.name == "Spectrogram":
-                plot_widget = plot_widget_
-                plot_widget.wf = self.wf
-                plot_widget.refresh_plot()
-                plot_widget.show()
-                break
-        if plot_widget is None:
-            plot_widget = SpectrogramPlotWidget(wf=self.wf)
-            self.addWidget(plot_widget)
-            # Add the widget to the list
-            self.plot_widget_list.append(plot_widget)
+        plot_widget = self.plot_registry.get("spectrogram")
+        if plot_widget is not None:
+            self.show_plot(plot_widget)
+        else:
+            plot_widget = SpectrogramPlotWidget(wf=self.wf,
+                                                data_state=self.data_state,
+                                                acoustic=self.acoustic)
+            plot_widget.msg2statusbar[str].connect(self.msg2statusbar.emit)
+            self.add_plot_widget("spectrogram", None, plot_widget)
         self.msg2statusbar.emit("Ready")
 
+    def add_plot_widget(self, kind, keys, plot_widget):
+        """
+        It adds a new plot widget to the splitter. It has been made with the
+        current version of the data.
+
+        Parameters
+        ----------
+            kind: str
+                Kind of plot ("ts", "hist", "qc", "correlation", "heatmap",
+                "qcbar" or "spectrogram").
+            keys: list of str or None
+                Keys of the plot. None for plots of all the keys.
+            plot_widget: QWidget
+                Plot widget with the methods dependencies() and
+                refresh_plot().
+        """
+        plot_widget.data_version = self.data_state.version
+        if hasattr(plot_widget, "data_state"):
+            plot_widget.data_state = self.data_state
+        if hasattr(plot_widget, "acoustic"):
+            plot_widget.acoustic = self.acoustic
+        self.addWidget(plot_widget)
+        # Add the widget to the registry
+        self.plot_registry.add(kind, keys, plot_widget)
+
+    def remove_plot_widget(self, plot_widget):
+        """It removes a plot widget from the splitter and the registry"""
+        self.plot_registry.remove(plot_widget)
+        plot_widget.hide()
+        plot_widget.deleteLater()
+
+    def is_stale(self, plot_widget):
+        """It returns True if the data of the plot has changed after it was
+        made"""
+        return self.data_state.is_stale(plot_widget.dependencies(),
+                                        getattr(plot_widget, "data_version", -1))
+
+    def update_plot(self, plot_widget):
+        """It makes the plot again with the current version of the data"""
+        plot_widget.data_version = self.data_state.version
+        if hasattr(plot_widget, "acoustic"):
+            plot_widget.acoustic = self.acoustic
+        plot_widget.refresh_plot()
+
+    def show_plot(self, plot_widget):
+        """
+        It shows a plot widget. It is made again if its data has changed
+        while it was hidden.
+
+        Parameters
+        ----------
+            plot_widget: QWidget
+        """
+        if self.is_stale(plot_widget):
+            self.update_plot(plot_widget)
+        plot_widget.show()
+
     def open_data(self, path, concat=False):
         """
-        It opens the netcdf of the path.
+        It opens the netcdf of the path. Files are read in a Worker of the
+        QThreadPool, so the GUI is not blocked. When the data is ready, the
+        signal data_opened is emitted.
 
         Parameters
         ----------
-            path: str or WaterFrame
-                Path where the file is or WaterFrame object.
+            path: str, list of str or WaterFrame
+                Path where the file is, paths of many files or WaterFrame
+                object. Many files are read at the same time in the process
+                pool and they are merged in a single WaterFrame.
             concat: bool, optional (concat = False)
                 It adds the new dataframe to the current dataframe.
 
         Returns
         -------
             True/False: bool
-                It indicates if the operation is ok.
+                It indicates if the operation is ok (or, if path is a str, if
+                the reading has started).
         """
         debug = True  # Variable for debug reasons
 
@@ -284,44 +398,54 @@ class PlotSplitter(QSplitter):
             print("  - Emit msg2statusbar: Opening data")
 
         self.msg2statusbar.emit("Opening data")
-        if isinstance(path, str):
+        if isinstance(path, list) and len(path) == 1:
+            path = path[0]
+        if isinstance(path, list):
+            # Only one file is read each time
+            self.cancel_loading()
+
+            worker = Worker(read_files, path, use_cache=self.use_cache)
+            worker.signals.result.connect(
+                lambda result: self.files_loading_done(result, path, concat))
+            worker.signals.progress.connect(self.loading_progress)
+            worker.signals.error.connect(self.loading_error)
+            worker.signals.cancelled.connect(
+                lambda: self.msg2statusbar.emit("Opening data cancelled"))
+            worker.signals.finished.connect(
+                lambda: self.loading_finished(worker))
+            self.load_worker = worker
+
+            self.running2statusbar.emit(True)
+            self.progress2statusbar.emit(0)
+            self.thread_pool.start(worker)
+            return True
+        elif isinstance(path, str):
             if debug:
                 print("  - path is a string:", path)
-            # Obtain type of file
-            extension = path.split(".")[-1]
-            # Init ok
-            ok = False  # pylint: disable=C0103
-            wf_new = WaterFrame()
-            if extension == "nc":
-                ok = wf_new.from_netcdf(path)  # pylint: disable=C0103
-            elif extension == "pkl":
-                ok = wf_new.from_pickle(path)  # pylint: disable=C0103
-            if ok:
-                # Check if we want actual data
-                if not concat:
-                    self.new_waterframe()
-                self.wf.concat(wf_new)
-
-                self.msg2TextArea.emit("Working with file {}".format(path))
-                # Add metadata information into metadataList
-                self.add_metadata(self.wf.metadata)
-                # Add other information
-                self.other_info_plain_text.setPlainText(repr(self.wf))
-                # Add data information into data_list
-                self.add_data(self.wf.data)
-                # Plot QC
-                self.add_qc_bar_plot()
-                self.msg2statusbar.emit("Ready")
-                if debug:
-                    print("  - Emit msg2statusbar: Ready")
-                    print("  - Exit from PlotSplitter.open_data()")
-                return True
+            # Only one file is read each time
+            self.cancel_loading()
+
+            if self.lazy_open and not concat and path.split(".")[-1] == "nc":
+                # Only the catalogue of the file is read
+                worker = Worker(LazyNetCDF, path)
+                worker.signals.result.connect(
+                    lambda source: self.lazy_loading_done(source, path))
             else:
-                self.msg2statusbar.emit("Error opening data")
-                if debug:
-                    print("  - Emit msg2statusbar: Error opening data")
-                    print("  - Exit from PlotSplitter.open_data()")
-                return False
+                worker = Worker(read_file, path, use_cache=self.use_cache)
+                worker.signals.result.connect(
+                    lambda wf_new: self.loading_done(wf_new, path, concat))
+            worker.signals.progress.connect(self.loading_progress)
+            worker.signals.error.connect(self.loading_error)
+            worker.signals.cancelled.connect(
+                lambda: self.msg2statusbar.emit("Opening data cancelled"))
+            worker.signals.finished.connect(
+                lambda: self.loading_finished(worker))
+            self.load_worker = worker
+
+            self.running2statusbar.emit(True)
+            self.progress2statusbar.emit(0)
+            self.thread_pool.start(worker)
+            return True
         else:
             # Path is a WaterFrame
             if debug:
@@ -333,19 +457,251 @@ class PlotSplitter(QSplitter):
 
             # Check if it is a dataframe of an acoustic data.
             # In this case, we are going to delete the previous dataframe.
-            if "Sequence" in self.wf.data.keys():
+            if self.acoustic is not None and "Sequence" in self.acoustic:
                 self.wf.clear()
+                self.acoustic = None
+                self.qc_memory.forget()
+            self.materialize()
+            self.join_acoustic()
             self.wf.concat(path)
+            self.data_state.touch_index()
+            self.store_acoustic()
 
-            # Add data information into data_list
-            self.add_data(self.wf.data)
-            self.add_metadata(self.wf.metadata)
-            # Add other information
-            self.other_info_plain_text.setPlainText(repr(self.wf))
-            # Plot QC
-            self.add_qc_bar_plot()
+            self.show_data()
+            self.data_opened.emit()
             return True
 
+    def loading_progress(self, percentage, message):
+        """It sends the progress of the file reading to the status bar"""
+        self.progress2statusbar.emit(percentage)
+        self.msg2statusbar.emit(message)
+
+    def loading_done(self, wf_new, path, concat):
+        """
+        It adds the WaterFrame read by the load Worker to self.wf and it
+        refresh the lists and plots.
+
+        Parameters
+        ----------
+            wf_new: WaterFrame or None
+                Data of the file. None if the file could not be read.
+            path: str
+                Path of the file.
+            concat: bool
+                It adds the new dataframe to the current dataframe.
+        """
+        if wf_new is None:
+            self.msg2statusbar.emit("Error opening data")
+            return
+        # Check if we want actual data
+        if not concat:
+            self.new_waterframe()
+            self.data_path = path
+        else:
+            self.materialize()
+            self.join_acoustic()
+            self.data_path = None
+        self.wf.concat(wf_new)
+        self.data_state.touch_index()
+        self.store_acoustic()
+
+        self.msg2TextArea.emit("Working with file {}".format(path))
+        self.show_data()
+        self.refresh_plots()
+        self.build_pyramids()
+        self.msg2statusbar.emit("Ready")
+        self.data_opened.emit()
+
+    def files_loading_done(self, result, paths, concat):
+        """
+        It adds the WaterFrame of many files, merged by the load Worker, to
+        self.wf with a single concat.
+
+        Parameters
+        ----------
+            result: (WaterFrame, list of str)
+                Merged data and paths of the files that could not be read.
+            paths: list of str
+                Paths of the files.
+            concat: bool
+                It adds the new dataframe to the current dataframe.
+        """
+        wf_new, failed = result
+        for path in failed:
+            self.msg2TextArea.emit("Error opening file {}".format(path))
+        if wf_new.data.empty:
+            self.msg2statusbar.emit("Error opening data")
+            return
+        self.loading_done(wf_new, ", ".join(
+            path for path in paths if path not in failed), concat)
+        # Many files can not be followed
+        self.data_path = None
+
+    def lazy_loading_done(self, source, path):
+        """
+        It creates an empty WaterFrame with the catalogue of a LazyNetCDF.
+        Columns are loaded by self.ensure_loaded() when they are used.
+
+        Parameters
+        ----------
+            source: LazyNetCDF
+                Catalogue of the file.
+            path: str
+                Path of the file.
+        """
+        self.new_waterframe()
+        self.lazy_source = source
+        self.wf = source.waterframe()
+
+        self.msg2TextArea.emit(
+            "Working with file {} (lazy open mode)".format(path))
+        self.show_data()
+        self.msg2statusbar.emit("Ready")
+        self.data_opened.emit()
+
+    def set_lazy_open(self, lazy_open):
+        """
+        It selects how the next NetCDF files are opened.
+
+        Parameters
+        ----------
+            lazy_open: bool
+                If True, values of the variables are read when they are used.
+        """
+        self.lazy_open = lazy_open
+
+    def set_use_cache(self, use_cache):
+        """
+        It selects if the next files are read from the columnar cache
+        (~/.mooda_gui/cache).
+
+        Parameters
+        ----------
+            use_cache: bool
+                If True, parsed NetCDF and CSV files are saved in the cache
+                and they are read from it the next time.
+        """
+        self.use_cache = use_cache
+
+    def ensure_loaded(self, keys):
+        """
+        In lazy open mode, it reads the keys (and their _QC keys) from the file
+        if they are not in self.wf.data.
+
+        Parameters
+        ----------
+            keys: list of str
+                Keys that are going to be used.
+        """
+        if self.lazy_source is None:
+            return
+        loaded_keys = self.lazy_source.load(self.wf, keys,
+                                            protected=self.keys_in_use())
+        if loaded_keys:
+            self.msg2TextArea.emit(
+                "Loaded from file: {}".format(", ".join(loaded_keys)))
+
+    def keys_in_use(self):
+        """It returns the keys of the visible plots"""
+        keys = set()
+        for plot_widget in self.plot_registry:
+            if not plot_widget.isVisible():
+                continue
+            key = getattr(plot_widget, "key", [])
+            if isinstance(key, str):
+                key = [key]
+            for key_ in key:
+                keys.add(key_[:-3] if key_.endswith("_QC") else key_)
+        return keys
+
+    def materialize(self):
+        """
+        In lazy open mode, it reads all the columns of the file. It is used
+        before operations that work with the full WaterFrame.
+        """
+        if self.lazy_source is None:
+            return
+        self.msg2statusbar.emit("Loading all the data of the file")
+        self.lazy_source.load_all(self.wf)
+        self.lazy_source.close()
+        self.lazy_source = None
+        self.msg2TextArea.emit("All data loaded in memory")
+
+    def store_acoustic(self):
+        """
+        It moves the spectra of acoustic data from self.wf.data to
+        self.acoustic, a single array of power instead of a column for each
+        frequency. It is not done in lazy open mode.
+        """
+        if self.acoustic is not None or self.lazy_source is not None:
+            return
+        acoustic, data = AcousticData.from_data(self.wf.data)
+        if acoustic is None:
+            return
+        self.wf.data = data
+        self.acoustic = acoustic
+        self.msg2TextArea.emit(
+            "Acoustic data: {} spectra of {} frequencies{}".format(
+                len(acoustic), len(acoustic.frequencies),
+                " (memory mapped)" if acoustic.mapped else ""))
+
+    def join_acoustic(self):
+        """
+        It adds the spectra of self.acoustic to self.wf.data. It is used
+        before operations that work with all the columns of the WaterFrame.
+        """
+        if self.acoustic is None:
+            return
+        self.wf.data = self.acoustic.join(self.wf.data)
+        self.acoustic = None
+
+    def loading_error(self, error):
+        """It informs about an exception while the file was read"""
+        self.msg2statusbar.emit("Error opening data")
+        self.msg2TextArea.emit("\nError opening data:\n{}".format(error))
+
+    def loading_finished(self, worker):
+        """It hides the progress of the status bar at the end of the reading"""
+        if worker is self.load_worker:
+            self.load_worker = None
+            self.running_finished()
+
+    def running_finished(self):
+        """It hides the progress of the status bar if no Worker is running"""
+        if self.load_worker is None and self.save_worker is None and \
+           self.qc_worker is None:
+            self.running2statusbar.emit(False)
+
+    def cancel_loading(self):
+        """It stops the reading of the current file"""
+        if self.load_worker is not None:
+            self.load_worker.cancel()
+
+    def cancel_saving(self):
+        """It stops the writing of the current file"""
+        if self.save_worker is not None:
+            self.save_worker.cancel()
+
+    def cancel_running(self):
+        """It stops the Workers of the progress of the status bar (Cancel
+        button)"""
+        self.cancel_loading()
+        self.cancel_saving()
+        self.cancel_qc()
+
+    def show_data(self):
+        """It writes the information of self.wf in the lists and QC plot"""
+        # Add metadata information into metadataList
+        self.add_metadata(self.wf.metadata)
+        # Add other information
+        self.other_info_plain_text.setPlainText(repr(self.wf))
+        # Add data information into data_list
+        self.add_data(self.wf.data)
+        # Plot QC. In lazy open mode, it is done on demand because it reads
+        # all the file
+        if self.lazy_source is None:
+            self.add_qc_bar_plot()
+
     def add_metadata(self, metadata_dict):
         """
         Add Metadata information into self.metadata_plain_text
@@ -369,34 +725,31 @@ class PlotSplitter(QSplitter):
         :param data: WaterFrame data variable
         """
 
-        def is_acoustic_data(a):  # pylint: disable=C0103
-            # will be True also for 'NaN'
-            if a == "Sequence":
-                return True
-            elif a == "Data Points":
-                return True
-            try:
-                float(a)
-                return True
-            except ValueError:
-                return False
+        # In lazy open mode, data only contains the loaded keys
+        if self.lazy_source is None:
+            data_keys = list(data.keys())
+            extent = ""
+        else:
+            data_keys = self.lazy_source.keys()
+            extent = "\n{} - {}".format(*self.lazy_source.time_extent())
 
         # Clear the list
         self.data_list.clear()
         # Parameter keys (without QC)
         # NO DEPTH in nc files, NO TIME
-        keys_to_work = [key for key in data.keys() if 'TIME' not in key
-                        if not is_acoustic_data(key)
-                        if key + "_QC" in data.keys()]
+        # Spectra of self.acoustic are not in data
+        keys_to_work = [key for key in data_keys if 'TIME' not in key
+                        if self.acoustic is not None or
+                        not is_acoustic_key(key)
+                        if key + "_QC" in data_keys]
         self.data_list.addItems(keys_to_work)
         # Add graphs
         self.graph_list.clear()
         self.graph_list.addItem("QC")
         # Check if we have acoustic data
-        for key in data.keys():
-            if is_acoustic_data(key):
-                self.graph_list.addItem("Spectrogram")
-                break
+        if self.acoustic is not None or \
+           any(is_acoustic_key(key) for key in data_keys):
+            self.graph_list.addItem("Spectrogram")
 
         # Add tooltip
         msg = "\nData:"
@@ -406,11 +759,12 @@ class PlotSplitter(QSplitter):
                     'QC flags of {}'.format(self.data_list.item(i).text()[:-3]))
             else:
                 try:
-                    self.data_list.item(i).setToolTip('{} ({})'.format(
+                    self.data_list.item(i).setToolTip('{} ({}){}'.format(
                         self.wf.meaning[
                             self.data_list.item(i).text()]['long_name'],
                         self.wf.meaning[
-                            self.data_list.item(i).text()]['units']))
+                            self.data_list.item(i).text()]['units'],
+                        extent))
                     msg += "\n- {}: {} ({})".format(
                         self.data_list.item(i).text(),
                         self.wf.meaning[
@@ -425,30 +779,149 @@ class PlotSplitter(QSplitter):
         self.drop_widget.add_labels(keys_to_work)
         self.qc_widget.add_labels(keys_to_work)
         self.rename_widget.add_labels(keys_to_work)
-        self.slice_widget.refresh(self.wf.data.index[0], self.wf.data.index[-1])
+        start, end = self.time_extent(keys_to_work)
+        if start is not None:
+            self.slice_widget.refresh(start, end)
+
+    def time_extent(self, keys):
+        """
+        It returns the time of the first and the last value of the keys, from
+        their ColumnSummary. Without values, it is the extent of the index.
+
+        Parameters
+        ----------
+            keys: list of str
+        Returns
+        -------
+            (start, end): (Timestamp, Timestamp) or (None, None)
+        """
+        if self.lazy_source is not None:
+            return self.lazy_source.time_extent()
+        summaries = [self.get_summary(key) for key in keys
+                     if key in self.wf.data.keys()]
+        summaries = [summary for summary in summaries if not summary.empty]
+        if not summaries:
+            # Extent of the index
+            if self.wf.data.empty:
+                return None, None
+            times = self.wf.data.index.get_level_values(0)
+            return times.min(), times.max()
+        return (min(summary.first for summary in summaries),
+                max(summary.last for summary in summaries))
+
+    def get_summary(self, key):
+        """
+        It returns the ColumnSummary of a key. It is made only if the key has
+        changed after the last summary.
+
+        Parameters
+        ----------
+            key: str
+        Returns
+        -------
+            summary: ColumnSummary
+        """
+        return column_summary(self.wf.data, key, self.data_state)
 
     def save_data(self, path):
         """
-        Save current data into a pickle file
+        Save current data into a file. NetCDF files are written in a Worker
+        of the QThreadPool.
         :param path: File path
-        :return: Bool
+        :return: Bool (if it is a NetCDF, if the writing has started)
         """
         self.msg2statusbar.emit("Saving data")
+        self.materialize()
+        self.join_acoustic()
         extension = path.split(".")[-1]
         # Init ok
         ok = False  # pylint: disable=C0103
         if extension == "nc":
-            pass
-        elif extension == "pkl":
-            ok = self.wf.to_pickle(path)  # pylint: disable=C0103
-        elif extension == "csv":
-            ok = self.wf.to_csv(path)  # pylint: disable=C0103
+            ok = self.save_netcdf(path)  # pylint: disable=C0103
+            # The Worker uses a copy of self.wf
+            self.store_acoustic()
+            return ok
+        try:
+            if extension == "pkl":
+                ok = self.wf.to_pickle(path)  # pylint: disable=C0103
+            elif extension == "csv":
+                ok = self.wf.to_csv(path)  # pylint: disable=C0103
+            elif extension == "mbin":
+                ok = write_binary(path, self.wf)  # pylint: disable=C0103
+        except OSError as error:
+            self.msg2statusbar.emit("Error saving data")
+            self.msg2TextArea.emit("\nError saving data:\n{}".format(error))
+        finally:
+            self.store_acoustic()
 
         if ok:
             self.msg2TextArea.emit("Data saved on file {}".format(path))
             self.msg2statusbar.emit("Ready")
         return ok
 
+    def save_netcdf(self, path):
+        """
+        It writes self.wf in a NetCDF file in a Worker of the QThreadPool.
+        The progress is shown in the status bar.
+
+        Parameters
+        ----------
+            path: str
+                Path of the file.
+
+        Returns
+        -------
+            True/False: bool
+                The writing has started. It does not start while a file is
+                read or written.
+        """
+        # Only one file is read or written each time. A reading is not
+        # cancelled, because the data to save would be incomplete.
+        if self.load_worker is not None or self.save_worker is not None:
+            self.msg2statusbar.emit(
+                "Wait until the current file is read or saved")
+            return False
+
+        # The Worker uses a copy of self.wf, so the data can be modified
+        # while it is saved. The values are not copied.
+        wf_copy = WaterFrame()
+        wf_copy.data = self.wf.data.copy(deep=False)
+        wf_copy.metadata = dict(self.wf.metadata)
+        wf_copy.meaning = dict(self.wf.meaning)
+
+        worker = Worker(write_netcdf, path, wf_copy)
+        worker.signals.progress.connect(self.loading_progress)
+        worker.signals.result.connect(
+            lambda _: self.saving_done(path))
+        worker.signals.error.connect(self.saving_error)
+        worker.signals.cancelled.connect(
+            lambda: self.msg2statusbar.emit("Saving data cancelled"))
+        worker.signals.finished.connect(
+            lambda: self.saving_finished(worker))
+        self.save_worker = worker
+
+        self.running2statusbar.emit(True)
+        self.progress2statusbar.emit(0)
+        self.thread_pool.start(worker)
+        return True
+
+    def saving_finished(self, worker):
+        """It hides the progress of the status bar at the end of the
+        writing"""
+        if worker is self.save_worker:
+            self.save_worker = None
+            self.running_finished()
+
+    def saving_done(self, path):
+        """It informs that the file has been written by the Worker"""
+        self.msg2TextArea.emit("Data saved on file {}".format(path))
+        self.msg2statusbar.emit("Ready")
+
+    def saving_error(self, error):
+        """It informs about an exception while the file was written"""
+        self.msg2statusbar.emit("Error saving data")
+        self.msg2TextArea.emit("\nError saving data:\n{}".format(error))
+
     def drop_data(self, labels, flag_list, drop_nan):
         """
         Delete some parameters from self.wf and refresh the lists
@@ -462,23 +935,42 @@ class PlotSplitter(QSplitter):
         if flag_list[0] is None:
             flag_list = None
 
+        # Parameters that are deleted
+        dropped = labels
         if flag_list:
+            self.materialize()
+            self.join_acoustic()
+            dropped = [parameter for parameter in self.wf.parameters()
+                       if parameter not in labels]
             self.wf.use_only(parameters=labels, flags=[0, 1], dropnan=drop_nan)
+            # Rows have been deleted
+            self.data_state.touch_index()
+            self.qc_memory.forget()
+            self.store_acoustic()
+        elif self.lazy_source is not None:
+            # Delete the parameters from the catalogue and the loaded ones
+            self.lazy_source.drop(labels)
+            self.wf.drop(keys=[label for label in labels
+                               if label in self.wf.data.keys()],
+                         flags=flag_list)
         else:
             # Delete the parameters
             self.wf.drop(keys=labels, flags=flag_list)
+        # Changed keys (None if rows have been deleted)
+        changed_keys = None
+        if not flag_list:
+            changed_keys = labels + [label + "_QC" for label in labels]
+            self.data_state.touch(changed_keys)
+            self.qc_memory.forget(labels)
         # Refresh the lists
         self.add_data(self.wf.data)
 
         # Delete plots with the key
-        for label in labels:
-            for plot_widget in self.plot_widget_list:
-                if plot_widget.name == "QC":
-                    plot_widget.refresh_plot()
-                if label == plot_widget.name or label+"_" in \
-                   plot_widget.name or "_"+label in plot_widget.name:
-                    plot_widget.deleteLater()
-                    self.plot_widget_list.remove(plot_widget)
+        for plot_widget in self.plot_registry.using(dropped,
+                                                    include_all=False):
+            self.remove_plot_widget(plot_widget)
+        # Refresh the plots that use the changed keys (i.e. QC)
+        self.refresh_plots(changed_keys)
 
         # Send message
         msg = ""
@@ -503,126 +995,286 @@ class PlotSplitter(QSplitter):
 
     def apply_qc(self, list_qc):
         """
-        Apply the QC procedures
-        :param list_qc:
+        Apply the QC procedures. The tests of each parameter only use its
+        values and flags, so they are applied in a Worker of the QThreadPool
+        (with the process pool if there are many values) and the new flags
+        are added to self.wf.data by self.qc_done().
+        Rows that have been tested with the same options are not tested
+        again (see QCMemory), so the QC of appended rows only tests the new
+        rows.
+        :param list_qc: list emitted by QCWidget (see qc_options())
         :return:
         """
-
-        def do_it(key_in):
-            """
-            Common part, to not repeat code
-            :param key_in: key to apply QC tests
-            """
-            if '_QC' in key_in:
-                return
-            if list_qc[0]:
-                #  Reset flags
-                self.msg2statusbar.emit(
-                    "Setting flags from {} to {}".format(key_in, list_qc[0]))
-                self.wf.reset_flag(parameters=key_in, flag=int(list_qc[0]))
-                self.msg2statusbar.emit("Ready")
-            if list_qc[3]:
-                # Spike test
-                threshold = float(list_qc[4].replace(',', '.'))
-                self.msg2statusbar.emit(
-                    "Applying spike test to "
-                    "{}, with rolling window {} and threshold {}".format(
-                        key_in, list_qc[5], threshold))
-                self.wf.spike_test(parameters=key_in, window=int(list_qc[5]),
-                                   threshold=threshold, flag=int(list_qc[3]))
-                self.msg2statusbar.emit("Ready")
-            if list_qc[1]:
-                # Range test
-                self.msg2statusbar.emit(
-                    "Applying range test to {}".format(key_in))
-                self.wf.range_test(parameters=key_in, flag=int(list_qc[1]))
-                self.msg2statusbar.emit("Ready")
-            if list_qc[2]:
-                # Flat test
-                self.msg2statusbar.emit(
-                    "Applying flat test to"
-                    " {}, with rolling window {}".format(key_in, list_qc[5]))
-                self.wf.flat_test(parameters=key_in, window=int(list_qc[5]),
-                                  flag=int(list_qc[2]))
-                self.msg2statusbar.emit("Ready")
-            if list_qc[6]:
-                # Flag to flag
-                self.msg2statusbar.emit(
-                    "Changing flags of "
-                    "{} from {} to {}".format(key_in, list_qc[6], list_qc[7]))
-                self.wf.flag2flag(parameters=key_in, original_flag=int(list_qc[6]),
-                                  translated_flag=int(list_qc[7]))
-                self.msg2statusbar.emit("Ready")
-
         self.msg2statusbar.emit("Creating QC flags")
 
         if list_qc[8] == 'all':
-            for key in self.wf.parameters():
-                do_it(key_in=key)
+            if self.lazy_source is None:
+                keys = self.wf.parameters()
+            else:
+                keys = self.lazy_source.parameters()
         else:
-            for i in range(8, len(list_qc)):
-                key = list_qc[i]
-                do_it(key_in=key)
+            keys = list_qc[8:]
+        keys = [key for key in keys if '_QC' not in key]
+        self.ensure_loaded(keys)
+
+        options = qc_options(list_qc)
+        index = self.wf.data.index
+        columns = []
+        # Tested rows of each key, they are remembered by self.qc_done()
+        tested = {}
+        for key in keys:
+            values = self.wf.data[key].to_numpy()
+            processed = 0
+            if key + "_QC" in self.wf.data.keys():
+                flags = self.wf.data[key + "_QC"].to_numpy()
+                signature = qc_signature(resolve_options(options,
+                                                         len(values)))
+                processed = self.qc_memory.processed(key, index, signature)
+                if len(index):
+                    tested[key] = (signature, len(index), index[-1])
+            else:
+                flags = np.zeros(len(values), dtype=np.int64)
+            # The tests do not flag keys without values
+            columns.append((key, values, flags,
+                            not self.get_summary(key).empty, processed))
+
+        # The flags of the previous tests would be replaced
+        self.cancel_qc()
+        worker = Worker(run_qc, columns, options)
+        worker.signals.result.connect(
+            lambda flags: self.qc_done(flags, tested)
+            if worker is self.qc_worker else None)
+        worker.signals.progress.connect(self.loading_progress)
+        worker.signals.error.connect(self.qc_error)
+        worker.signals.cancelled.connect(
+            lambda: self.msg2statusbar.emit("QC tests cancelled"))
+        worker.signals.finished.connect(lambda: self.qc_finished(worker))
+        self.qc_worker = worker
+
+        self.running2statusbar.emit(True)
+        self.progress2statusbar.emit(0)
+        self.thread_pool.start(worker)
+
+    def qc_done(self, flags, tested=None):
+        """
+        It adds the flags made by the QC Worker to self.wf.data and it
+        refresh the plots of the changed keys.
+
+        Parameters
+        ----------
+            flags: dict
+                {key: (first row, new flags of the rows after it)}.
+            tested: dict, optional (tested = None)
+                {key: (signature of the options, number of rows, last
+                index)} of the tested data, for self.qc_memory.
+        """
+        tested = tested or {}
+        index = self.wf.data.index
+        # Keys with new flags
+        changed_keys = []
+        for key, (start, key_flags) in flags.items():
+            rows = start + len(key_flags)
+            # The key could have been deleted or its rows changed while the
+            # tests were running (appended rows are tested the next time)
+            if key not in self.wf.data.keys() or rows > len(index) or \
+               (rows and key in tested and index[rows - 1] != tested[key][2]):
+                self.qc_memory.forget([key])
+                continue
+            if start or rows < len(index):
+                # Flags of the rows that have not been tested
+                old_flags = self.wf.data[key + "_QC"].to_numpy()
+                key_flags = np.concatenate([
+                    old_flags[:start], key_flags,
+                    old_flags[rows:]]).astype(key_flags.dtype, copy=False)
+            self.wf.data[key + "_QC"] = key_flags
+            if key in tested:
+                self.qc_memory.remember(key, *tested[key])
+            if self.lazy_source is not None:
+                # The new flags are not in the file
+                self.lazy_source.pin([key + "_QC"])
+            # The tests only change the flags
+            self.data_state.touch(key + "_QC")
+            changed_keys.append(key + "_QC")
+        self.msg2TextArea.emit(
+            "QC tests applied to {}".format(", ".join(flags)))
 
         self.msg2statusbar.emit("Updating graphs")
-        # Refresh the QC graph
-        for plot_widget in self.plot_widget_list:
-            if "QC" in plot_widget.name:
-
-                if plot_widget.isVisible():
-                    plot_widget.refresh_plot()
-                # Show the QCBarPlot
-                elif plot_widget.name == "QC":
-                    plot_widget.refresh_plot()
-                    plot_widget.show()
+        # Refresh the graphs of the changed keys
+        self.refresh_plots(changed_keys)
+        # Show the QCBarPlot
+        plot_widget = self.plot_registry.get("qcbar")
+        if plot_widget is not None and not plot_widget.isVisible():
+            self.show_plot(plot_widget)
         self.msg2statusbar.emit("Ready")
 
+    def qc_error(self, error):
+        """It informs about an exception while the QC tests were applied"""
+        self.msg2statusbar.emit("Error applying QC tests")
+        self.msg2TextArea.emit("\nError applying QC tests:\n{}".format(error))
+
+    def qc_finished(self, worker):
+        """It hides the progress of the status bar at the end of the QC
+        tests"""
+        if worker is self.qc_worker:
+            self.qc_worker = None
+            self.running_finished()
+
+    def cancel_qc(self):
+        """It stops the QC tests"""
+        if self.qc_worker is not None:
+            self.qc_worker.cancel()
+
     def apply_rename(self, original_key, new_key):
         """It renames keys from a WaterFrame"""
         # Rename key from the Waterframe
         self.msg2statusbar.emit(
             "Changing name {} to {}".format(original_key, new_key))
         self.wf.rename(original_key, new_key)
+        if self.lazy_source is not None:
+            self.lazy_source.rename(original_key, new_key)
+        self.data_state.rename(original_key, new_key)
+        self.qc_memory.rename(original_key, new_key)
         # Rename the key of the plotWidgets if it process
-        for plot_widget in self.plot_widget_list:
+        renamed = {original_key: new_key,
+                   original_key + "_QC": new_key + "_QC"}
+        for plot_widget in self.plot_registry.using(original_key,
+                                                    include_all=False):
             if isinstance(plot_widget.key, list):
-                for i, key in enumerate(plot_widget.key):
-                    if key == original_key:
-                        plot_widget.key[i] = new_key
-                        plot_widget.name = plot_widget.name.replace(original_key, new_key)
-                        plot_widget.refresh_plot()
+                plot_widget.key[:] = [renamed.get(key, key)
+                                      for key in plot_widget.key]
             else:
-                if plot_widget.name == "QC":
-                    plot_widget.refresh_plot()
-                elif plot_widget.key == original_key:
-                    plot_widget.key = new_key
-                    plot_widget.name = new_key
-                    plot_widget.refresh_plot()
+                plot_widget.key = renamed.get(plot_widget.key,
+                                              plot_widget.key)
+            plot_widget.name = plot_widget.name.replace(original_key, new_key)
+            self.plot_registry.update(plot_widget, plot_widget.key)
+        # Plots with the new key (and the QC plot) are made again
+        self.refresh_plots([new_key, new_key + "_QC"])
         # Add data information into data_list
         self.add_data(self.wf.data)
         self.msg2statusbar.emit("Ready")
         self.msg2TextArea.emit("Key name {} changed to {}.".format(original_key, new_key))
 
+    def pyramid_versions(self):
+        """
+        It returns the versions of the keys that have an AggregationPyramid.
+
+        Returns
+        -------
+            versions: dict
+                {key: version of the key}.
+        """
+        return {key: self.data_state.key_version(key)
+                for key in pyramid_keys(self.wf.data)}
+
+    def build_pyramids(self):
+        """
+        It makes the AggregationPyramid of all the numeric keys in a Worker
+        of the QThreadPool, so averages, resamples and slices of the data do
+        not need to read all the values again.
+        """
+        if self.lazy_source is not None or self.wf.data.empty:
+            return
+        worker = Worker(cache_pyramids, self.wf.data, self.pyramid_versions())
+        self.thread_pool.start(worker)
+
+    def get_pyramid(self, key):
+        """
+        It returns the AggregationPyramid of a key. It is made now if it is
+        not in the aggregation cache.
+
+        Parameters
+        ----------
+            key: str
+        Returns
+        -------
+            pyramid: AggregationPyramid
+        """
+        return column_pyramid(self.wf.data[key],
+                              self.data_state.key_version(key))
+
+    def carry_pyramids(self, versions, update):
+        """
+        It saves in the aggregation cache the pyramids of the new version of
+        the data, made from the pyramids of the old version.
+
+        Parameters
+        ----------
+            versions: dict
+                {key: version of the key before the change}.
+            update: callable
+                update(pyramid, key) returns the new pyramid. It raises
+                ValueError if the pyramid has to be made again.
+        """
+        cache = aggregation_cache()
+        for key, version in versions.items():
+            pyramid = cache.peek(("pyramid", key, version))
+            if pyramid is None or key not in self.wf.data.keys():
+                continue
+            try:
+                pyramid = update(pyramid, key)
+            except ValueError:
+                continue
+            cache.put(("pyramid", key, self.data_state.key_version(key)),
+                      pyramid)
+
+    def resample_data(self, rule):
+        """
+        It returns the mean of self.wf.data in intervals of rule, like
+        WaterFrame.resample(), made from the AggregationPyramid of the keys.
+
+        Parameters
+        ----------
+            rule: str
+                "T", "H", "D" or "W".
+        Returns
+        -------
+            data: pandas.DataFrame or None
+                None if the pyramids can not be used (i.e. more than one
+                index or keys that are not numeric).
+        """
+        data = self.wf.data
+        keys = [key for key in data.keys() if "_QC" not in key]
+        if rule not in RULE_MINUTES or data.empty or not keys or \
+           isinstance(data.index, pd.MultiIndex) or \
+           set(keys) - set(pyramid_keys(data)):
+            return None
+        start, end = data.index.min(), data.index.max()
+        resampled = pd.DataFrame({
+            key: self.get_pyramid(key).aggregate(rule, start, end)["mean"]
+            for key in keys})
+        # Change "_QC" values to 0
+        for key in data.keys():
+            if "_QC" in key:
+                resampled[key] = 0
+        return resampled[list(data.keys())]
+
     def apply_resample(self, rule):
         """
         It applies the resample function to  self.waterframe
         :param rule: Rule to resample.
         """
         self.msg2statusbar.emit("Resampling data")
-        self.wf.resample(rule)
+        self.materialize()
+        # Spectra do not have pyramids, they are resampled by the WaterFrame
+        spectra = self.acoustic is not None
+        self.join_acoustic()
+        resampled = None if spectra else self.resample_data(rule)
+        if resampled is None:
+            self.wf.resample(rule)
+        else:
+            self.wf.data = resampled
+        self.data_state.touch_index()
+        self.qc_memory.forget()
+        self.store_acoustic()
         self.msg2statusbar.emit("Ready")
 
         self.msg2statusbar.emit("Updating graphs")
-        # Refresh the QC graph
-        for plot_widget in self.plot_widget_list:
-            if "QC" in plot_widget.name:
-
-                if plot_widget.isVisible():
-                    plot_widget.refresh_plot()
-                # Show the QCBarPlot
-                elif plot_widget.name == "QC":
-                    plot_widget.refresh_plot()
-                    plot_widget.show()
+        # Refresh the graphs of the changed keys
+        self.refresh_plots()
+        # Show the QCBarPlot
+        plot_widget = self.plot_registry.get("qcbar")
+        if plot_widget is not None and not plot_widget.isVisible():
+            self.show_plot(plot_widget)
         self.msg2statusbar.emit("Ready")
 
     def apply_slice(self, start, stop):
@@ -633,7 +1285,19 @@ class PlotSplitter(QSplitter):
         """
         self.msg2statusbar.emit("Slicing data")
 
+        self.materialize()
+        self.join_acoustic()
+        versions = self.pyramid_versions()
         self.wf.slice_time(start, stop)
+        self.data_state.touch_index()
+        self.qc_memory.forget()
+        self.store_acoustic()
+        # Only the buckets of the ends are made again
+        ends = [None if time is None else
+                pd.to_datetime(time, format="%Y%m%d%H%M%S")
+                for time in (start, stop)]
+        self.carry_pyramids(versions, lambda pyramid, key: pyramid.slice(
+            self.wf.data[key], *ends))
 
         self.add_data(self.wf.data)
         self.refresh_plots()
@@ -651,24 +1315,186 @@ class PlotSplitter(QSplitter):
 
     def new_waterframe(self):
         """Create a new WaterFrame object and clean all screens."""
+        self.stop_following()
+        self.data_path = None
         self.wf = WaterFrame()
+        self.acoustic = None
+        self.qc_memory.forget()
+        self.data_state = DataState()
+        # Aggregations of the old data are not used anymore
+        aggregation_cache().clear()
+        if self.lazy_source is not None:
+            self.lazy_source.close()
+            self.lazy_source = None
         # Delete all plots
-        for plot_widget in self.plot_widget_list:
+        for plot_widget in self.plot_registry:
             plot_widget.deleteLater()
-        self.plot_widget_list.clear()
+        self.plot_registry.clear()
         # Hide the widget
         self.hide()
 
-    def refresh_plots(self):
-        """It refresh all plots"""
+    def set_follow(self, enabled):
+        """
+        It starts or stops the follow mode. In follow mode, the opened file
+        is watched and its new records are appended to self.wf.
+
+        Parameters
+        ----------
+            enabled: bool
+        Returns
+        -------
+            True/False: bool
+                It indicates if the follow mode is in the requested state.
+        """
+        if not enabled:
+            self.stop_following()
+            return True
+        extension = (self.data_path or "").split(".")[-1]
+        # Data of acoustic files can have no columns out of self.acoustic
+        if self.lazy_source is not None or extension not in ["csv", "nc"] or \
+           not len(self.wf.data.index):
+            self.msg2statusbar.emit(
+                "Only an opened CSV or NetCDF file can be followed")
+            return False
+        try:
+            self.follow_tail = FileTail(
+                self.data_path, self.wf.data.index.get_level_values(0).max())
+        except (OSError, ValueError) as error:
+            self.msg2statusbar.emit("Error following file")
+            self.msg2TextArea.emit("\nError following file:\n{}".format(error))
+            return False
+        self.follow_watcher.addPath(self.data_path)
+        self.msg2TextArea.emit("Following file {}".format(self.data_path))
+        # Records written since the file was opened
+        self.read_tail()
+        return True
+
+    def stop_following(self):
+        """It stops the follow mode"""
+        if self.follow_tail is None:
+            return
+        self.follow_timer.stop()
+        if self.follow_watcher.files():
+            self.follow_watcher.removePaths(self.follow_watcher.files())
+        self.msg2TextArea.emit(
+            "Stop following file {}".format(self.follow_tail.path))
+        self.follow_tail = None
+        self.follow_buffer = None
+
+    def file_changed(self, path):
+        """
+        The followed file has changed. It is read when it has not changed
+        for FOLLOW_DELAY ms.
+        """
+        # Some programs write a new file and replace the old one, then the
+        # path is not watched anymore
+        if path not in self.follow_watcher.files() and os.path.exists(path):
+            self.follow_watcher.addPath(path)
+        self.follow_timer.start()
+
+    def read_tail(self):
+        """It reads the new records of the followed file in a Worker"""
+        if self.follow_tail is None:
+            return
+        if self.tail_worker is not None:
+            # It reads again when the current reading finishes
+            self.tail_pending = True
+            return
+        tail = self.follow_tail
+        worker = Worker(tail.read_new)
+        worker.signals.result.connect(
+            lambda rows: self.append_data(rows, tail))
+        worker.signals.error.connect(
+            lambda error: self.msg2TextArea.emit(
+                "\nError reading new records:\n{}".format(error)))
+        worker.signals.finished.connect(self.tail_finished)
+        self.tail_worker = worker
+        self.thread_pool.start(worker)
+
+    def tail_finished(self):
+        """It reads the file again if it has changed during the reading"""
+        self.tail_worker = None
+        if self.tail_pending:
+            self.tail_pending = False
+            self.read_tail()
+
+    def append_data(self, rows, tail):
+        """
+        It appends the new records of the followed file to self.wf.data,
+        without copying the old records, and it updates the plots that use
+        them.
+
+        Parameters
+        ----------
+            rows: pandas.DataFrame or None
+                New records.
+            tail: FileTail
+                FileTail that has read the records.
+        """
+        if rows is None or tail is not self.follow_tail:
+            return
+        # Spectra are appended to self.acoustic, the other keys to the buffer
+        spectra = None
+        if self.acoustic is not None:
+            spectra = rows
+            rows = rows[[key for key in rows.keys()
+                         if key not in self.acoustic]]
+        if self.follow_buffer is None:
+            self.follow_buffer = AppendBuffer(self.wf.data)
+            self.wf.data = self.follow_buffer.frame()
+        self.wf.data = self.follow_buffer.append(self.wf.data, rows)
+        if spectra is not None:
+            self.acoustic = self.acoustic.append(spectra, self.wf.data.index)
+
+        # Visible plots that are up to date add the new rows by themselves,
+        # the other ones are made again (now or when they are shown)
+        appendable = [plot_widget for plot_widget in self.plot_registry
+                      if hasattr(plot_widget, "append_data") and
+                      plot_widget.isVisible() and not self.is_stale(plot_widget)]
+        versions = {key: version for key, version in
+                    self.pyramid_versions().items() if key in rows.keys()}
+        summaries = {key: self.data_state.cached_summary(key)
+                     for key in rows.keys()}
+        # Spectrogram plots use the keys of the spectra
+        changed = list((rows if spectra is None else spectra).keys())
+        self.data_state.touch(changed)
+        # Summaries of the old records are merged with the new records
+        for key, summary in summaries.items():
+            if summary is not None:
+                self.data_state.set_summary(
+                    key, summary.merge(ColumnSummary.from_series(rows[key])))
+        self.carry_pyramids(versions, lambda pyramid, key: pyramid.append(
+            *series_values(rows[key])))
+        for plot_widget in appendable:
+            plot_widget.data_version = self.data_state.version
+            plot_widget.append_data(rows)
+        self.refresh_plots(changed)
+        self.msg2statusbar.emit("{} new records of {}".format(
+            len(rows.index), tail.path))
+
+    def refresh_plots(self, keys=None):
+        """
+        It refresh the visible plots whose keys have changed. Hidden plots
+        are made again when they are shown.
+
+        Parameters
+        ----------
+            keys: list of str, optional (keys = None)
+                Changed keys, only the plots that use them are checked. None
+                checks all the plots.
+        """
         self.msg2statusbar.emit("Refreshing plots")
 
-        for plot_widget in self.plot_widget_list:
+        if keys is None:
+            plot_widgets = list(self.plot_registry)
+        else:
+            plot_widgets = self.plot_registry.using(keys)
+        for plot_widget in plot_widgets:
+            if not plot_widget.isVisible() or not self.is_stale(plot_widget):
+                continue
             try:
-                plot_widget.refresh_plot()
+                self.update_plot(plot_widget)
             except KeyError:
-                self.plot_widget_list.remove(plot_widget)
-                plot_widget.hide()
-                plot_widget.deleteLater()
+                self.remove_plot_widget(plot_widget)
 
         self.msg2statusbar.emit("Ready")
@@ -4,14 +4,11 @@
 # pylint: disable=import-error
 
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg \
-    as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT \
-    as NavigationToolbar
+import pandas as pd
 from PyQt5.QtWidgets import QWidget, QToolBar, QVBoxLayout, QAction
 from PyQt5.QtGui import QIcon
 import seaborn as sms
+from mooda_gui.widgets.plotcanvas import PlotCanvas
 
 
 class QCBarPlotWidget(QWidget):
@@ -30,25 +27,93 @@ class QCBarPlotWidget(QWidget):
         self.name = "QC"
         self.key = "all"
 
+        # Number of values of each flag, rows are the parameters and columns
+        # are the flags
+        self.counts = pd.DataFrame()
+
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+
+        self.init_ui()
+
         # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
-        self.wf.qcbarplot(ax=self.axes)
+        self.refresh_plot()
+
+    @staticmethod
+    def count_flags(data, parameters):
+        """
+        It counts the values of each QC flag.
+
+        Parameters
+        ----------
+            data: pandas.DataFrame
+                Data with _QC keys.
+            parameters: list of str
+                Parameters of the WaterFrame.
+        Returns
+        -------
+            counts: pandas.DataFrame
+                Rows are the parameters and columns are the flags.
+        """
+        counts = {}
+        for parameter in parameters:
+            if parameter + "_QC" in data.keys():
+                counts[parameter] = data[parameter + "_QC"].value_counts()
+        if not counts:
+            return pd.DataFrame()
+        return pd.DataFrame(counts).T.fillna(0).sort_index().sort_index(axis=1)
+
+    def plot_counts(self, fig, counts):
+        """
+        It draws the bar plot of the counts, like WaterFrame.qcbarplot(), in
+        a new figure. It runs in the Worker of the PlotCanvas, so it does not
+        change the widget: plot_ready() keeps the returned axes and counts.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            counts: pandas.DataFrame
+                Result of count_flags().
+        Returns
+        -------
+            (axes, counts): (matplotlib.axes.Axes, pandas.DataFrame)
+        """
+        axes = fig.add_subplot(1, 1, 1)
+        if not counts.empty:
+            counts.plot.bar(ax=axes, legend=False)
+            axes.legend(title="QC Flags")
+        axes.set_ylabel("Number of measurements")
         # Plot custom view
-        plt.tight_layout()
-        sms.despine()
+        fig.tight_layout()
+        sms.despine(fig=fig)
+        return axes, counts
 
-        self.init_ui()
+    def plot_ready(self, fig, state):
+        """The PlotCanvas shows the new figure, with the axes and counts
+        returned by plot_counts()"""
+        self.fig = fig
+        self.axes, self.counts = state
+
+    def dependencies(self):  # pylint: disable=no-self-use
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: None
+                The plot uses all the _QC keys.
+        """
+        return None
 
     def init_ui(self):
         """Layout and connections"""
 
         path_icon = str(os.path.dirname(os.path.abspath(__file__))) + "\\..\\icon\\"
         # Canvas
-        self.plot_canvas = FigureCanvas(self.fig)
-        self.plot_canvas.draw()
-
-        # Matplotlib toolbar
-        plot_toolbar = NavigationToolbar(self.plot_canvas, self)
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.figure_ready.connect(self.plot_ready)
 
         # Custom Toolbar
         action_toolbar = QToolBar(self)
@@ -65,7 +130,6 @@ class QCBarPlotWidget(QWidget):
         # - For the Widget
         v_plot = QVBoxLayout()
         v_plot.addWidget(self.plot_canvas)
-        v_plot.addWidget(plot_toolbar)
         v_plot.addWidget(action_toolbar)
         self.setLayout(v_plot)
 
@@ -74,8 +138,36 @@ class QCBarPlotWidget(QWidget):
         It refresh the plot according to the actions of the action_toolbar
         :return:
         """
-        # Remove previous axes from the figure
-        self.axes.clear()
-        self.wf.qcbarplot(ax=self.axes)
-        plt.tight_layout()
-        self.plot_canvas.draw()
+        # The Worker counts a copy of the flags, self.wf.data can change
+        parameters = self.wf.parameters()
+        data = self.wf.data[[parameter + "_QC" for parameter in parameters
+                             if parameter + "_QC" in self.wf.data.keys()]]
+        self.plot_canvas.render(
+            lambda fig: self.plot_counts(fig,
+                                         self.count_flags(data, parameters)))
+
+    def append_data(self, rows):
+        """
+        It adds the flags of new rows to the counts. If there are no new
+        parameters or flags, only the height of the bars changes.
+
+        Parameters
+        ----------
+            rows: pandas.DataFrame
+                Rows that have been appended to self.wf.data.
+        """
+        counts = self.counts.add(self.count_flags(rows, self.wf.parameters()),
+                                 fill_value=0)
+        if self.axes is None or not counts.index.equals(self.counts.index) or \
+           not counts.columns.equals(self.counts.columns):
+            self.plot_canvas.render(
+                lambda fig: self.plot_counts(fig, counts))
+            return
+        self.counts = counts
+        # There is a container of bars for each flag
+        for container, flag in zip(self.axes.containers, counts.keys()):
+            for bar, value in zip(container, counts[flag]):
+                bar.set_height(value)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.plot_canvas.draw_idle()
@@ -3,14 +3,12 @@
 # pylint: disable=import-error
 
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg \
-    as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT \
-    as NavigationToolbar
+from functools import partial
 from PyQt5.QtWidgets import QWidget, QToolBar, QAction, QVBoxLayout
 from PyQt5.QtGui import QIcon
 import seaborn as sms
+from mooda import WaterFrame
+from mooda_gui.widgets.plotcanvas import PlotCanvas
 
 
 class QCPlotWidget(QWidget):
@@ -30,20 +28,58 @@ class QCPlotWidget(QWidget):
         # Name of this object
         self.name = "new"
 
-        # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
         # The name will be the key
         self.name = key
-        if "_QC" in key:
-            self.wf.qcplot(key[:-3], ax=self.axes)
-        else:
+        if "_QC" not in key:
             return
-        # Plot custom view
-        plt.tight_layout()
-        sms.despine()
 
         self.init_ui()
 
+        # Creation of the figure
+        self.refresh_plot()
+
+    def plot(self, fig, wf):  # pylint: disable=C0103
+        """
+        It draws the qcplot() of the key in a new figure. It runs in the
+        Worker of the PlotCanvas, so it does not change the widget:
+        plot_ready() keeps the returned axes.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            wf: WaterFrame
+                Values and flags of the key, taken in the GUI thread.
+        Returns
+        -------
+            axes: matplotlib.axes.Axes
+        """
+        axes = fig.add_subplot(1, 1, 1)
+        wf.qcplot(self.key[:-3], ax=axes)
+        # Plot custom view
+        fig.tight_layout()
+        sms.despine(fig=fig)
+        return axes
+
+    def plot_ready(self, fig, axes):
+        """The PlotCanvas shows the new figure, with the axes made by
+        plot()"""
+        self.fig, self.axes = fig, axes
+
+    def dependencies(self):
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: list of str
+        """
+        # qcplot() uses the values and the flags
+        return [self.key[:-3], self.key]
+
     def init_ui(self):
         """Layout and main functionalities"""
 
@@ -51,11 +87,8 @@ class QCPlotWidget(QWidget):
             os.path.dirname(os.path.abspath(__file__))) + "\\..\\icon\\"
 
         # Canvas
-        self.plot_canvas = FigureCanvas(self.fig)
-        self.plot_canvas.draw()
-
-        # Matplotlib toolbar
-        plot_toolbar = NavigationToolbar(self.plot_canvas, self)
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.figure_ready.connect(self.plot_ready)
 
         # Custom Toolbar
         action_toolbar = QToolBar(self)
@@ -73,7 +106,6 @@ class QCPlotWidget(QWidget):
         # - For the Widget
         v_plot = QVBoxLayout()
         v_plot.addWidget(self.plot_canvas)
-        v_plot.addWidget(plot_toolbar)
         v_plot.addWidget(action_toolbar)
         self.setLayout(v_plot)
 
@@ -82,10 +114,11 @@ class QCPlotWidget(QWidget):
         It refresh the plot according to the actions of the action_toolbar
         :return:
         """
-        # Remove previous axes from the figure
-        self.axes.clear()
-        # Remake the plot
-        self.wf.qcplot(self.key[:-3], ax=self.axes)
-
-        plt.tight_layout()
-        self.plot_canvas.draw()
+        # The Worker uses a copy of the columns, self.wf.data can change
+        keys = self.dependencies()
+        wf = WaterFrame()  # pylint: disable=C0103
+        wf.data = self.wf.data[keys]
+        wf.meaning = {key: self.wf.meaning[key] for key in keys
+                      if key in self.wf.meaning}
+        # Remake the plot in a new figure
+        self.plot_canvas.render(partial(self.plot, wf=wf))
@@ -3,14 +3,23 @@
 # pylint: disable=import-error
 
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg \
-    as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT \
-    as NavigationToolbar
+from functools import partial
+import numpy as np
+from matplotlib.colors import LogNorm
 from PyQt5.QtWidgets import QWidget, QToolBar, QAction, QVBoxLayout
 from PyQt5.QtGui import QIcon
 import seaborn as sms
+from mooda import WaterFrame
+from mooda_gui.core.downsample import stratified_sample
+from mooda_gui.core.histogram import (column_histogram, histogram_range,
+                                      pair_histogram)
+from mooda_gui.core.summary import column_summary
+from mooda_gui.widgets.plotcanvas import PlotCanvas
+
+# Keys with more values than this are drawn as densities (2D histograms)
+DENSITY_THRESHOLD = 20000
+# Number of points of the sample drawn over the densities
+SAMPLE_SIZE = 2000
 
 
 class ScatterMatrixPlotWidget(QWidget):
@@ -18,11 +27,12 @@ class ScatterMatrixPlotWidget(QWidget):
     Pyqt5 widget to show plots. It is used in PlotSplitter.
     """
 
-    def __init__(self, wf, keys):  # pylint: disable=C0103
+    def __init__(self, wf, keys, data_state=None):  # pylint: disable=C0103
         """
         Constructor
         :param wf: inWater WaterFrame object
         :param key: key of wf.data to plot
+        :param data_state: DataState of wf, with the summaries of the keys
         """
         debug = True
 
@@ -32,23 +42,162 @@ class ScatterMatrixPlotWidget(QWidget):
 
         # Instance variables
         self.wf = wf  # pylint: disable=C0103
+        self.key = keys
+        # Name of this object
+        self.name = "scatter_" + "_".join(keys)
+        # Versions and summaries of the keys, it is given by the PlotSplitter
+        self.data_state = data_state
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+
+        self.init_ui()
 
         # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
         if debug:
             print("  - Creating the figure")
-            print("  - self.axes:", self.axes)
-        self.wf.scatter_matrix(keys=keys, ax=self.axes)
-
-        # Plot custom view
-        if debug:
-            print("  - Adding some view options")
-        plt.tight_layout()
-        sms.despine()
+        self.refresh_plot()
 
         if debug:
             print("  - Exit ScatterMatrixWidget.__init__()")
-        self.init_ui()
+
+    def plot(self, fig, data, ranges=None, versions=None, points=False):
+        """
+        It draws the scatter_matrix() of the keys in a new figure. It runs in
+        the Worker of the PlotCanvas, so it does not change the widget:
+        plot_ready() keeps the returned axes.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            data: pandas.DataFrame
+                Columns of the keys, taken in the GUI thread.
+            ranges: dict, optional (ranges = None)
+                {key: range of the values}, keys without values are not in
+                it. None draws all the points with WaterFrame.scatter_matrix().
+            versions: dict, optional (versions = None)
+                {key: version of the key}, to use the aggregation cache.
+            points: bool, optional (points = False)
+                It draws a sample of the points over the densities.
+        Returns
+        -------
+            axes: matplotlib.axes.Axes or numpy.ndarray of Axes
+        """
+        if ranges is None:
+            wf = WaterFrame()  # pylint: disable=C0103
+            wf.data = data
+            wf.meaning = {key: self.wf.meaning[key] for key in data.keys()
+                          if key in self.wf.meaning}
+            axes = fig.add_subplot(1, 1, 1)
+            axes = wf.scatter_matrix(keys=self.key, ax=axes)
+        else:
+            axes = self.plot_density(fig, data, ranges, versions, points)
+        # Plot custom view
+        fig.tight_layout()
+        sms.despine(fig=fig)
+        return axes
+
+    def plot_ready(self, fig, axes):
+        """The PlotCanvas shows the new figure, with the axes made by
+        plot()"""
+        self.fig, self.axes = fig, axes
+
+    def plot_density(self, fig, data, ranges, versions, points=False):
+        """
+        It draws a matrix like scatter_matrix(), with 2D histograms instead of
+        the points and histograms in the diagonal. Histograms are calculated
+        once for each pair of keys and kept in the aggregation cache.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            data: pandas.DataFrame
+                Columns of the keys.
+            ranges: dict
+                {key: range of the values}.
+            versions: dict
+                {key: version of the key}.
+            points: bool, optional (points = False)
+                It draws a sample of the points over the densities.
+        Returns
+        -------
+            axes: numpy.ndarray of matplotlib.axes.Axes
+        """
+        keys = list(ranges)
+        size = max(len(keys), 1)
+        axes = fig.subplots(size, size, squeeze=False)
+        sample = None
+        if points:
+            sample = stratified_sample(len(data.index), SAMPLE_SIZE)
+        for row, y_key in enumerate(keys):
+            for column, x_key in enumerate(keys):
+                ax = axes[row, column]  # pylint: disable=C0103
+                if row == column:
+                    histogram = column_histogram(
+                        data[x_key], ranges[x_key],
+                        version=versions[x_key])
+                    ax.bar(histogram.edges[:-1], histogram.counts,
+                           width=np.diff(histogram.edges), align="edge")
+                else:
+                    histogram = pair_histogram(
+                        data, x_key, y_key, ranges[x_key],
+                        ranges[y_key], versions=(versions[x_key],
+                                                 versions[y_key]))
+                    counts = np.ma.masked_equal(histogram.counts.T, 0)
+                    if counts.count():
+                        ax.pcolormesh(histogram.x_edges, histogram.y_edges,
+                                      counts, norm=LogNorm(), cmap="Blues")
+                    if sample is not None:
+                        ax.scatter(data[x_key].to_numpy()[sample],
+                                   data[y_key].to_numpy()[sample],
+                                   s=0.5, color="C3", alpha=0.4)
+                    ax.set_xlim(*ranges[x_key])
+                    ax.set_ylim(*ranges[y_key])
+                # Labels only in the borders, like scatter_matrix()
+                if row == size - 1:
+                    ax.set_xlabel(x_key)
+                else:
+                    ax.tick_params(labelbottom=False)
+                if column == 0:
+                    ax.set_ylabel(y_key)
+                else:
+                    ax.tick_params(labelleft=False)
+        return axes
+
+    def refresh_plot(self):
+        """
+        It makes the plot again. Keys with many values are drawn as densities
+        """
+        summaries = {key: column_summary(self.wf.data, key, self.data_state)
+                     for key in self.key}
+        # The Worker uses a copy of the columns, self.wf.data can change
+        data = self.wf.data[list(summaries)]
+        if max(summary.count for summary in summaries.values()) <= \
+           DENSITY_THRESHOLD:
+            self.plot_canvas.render(partial(self.plot, data=data))
+            return
+        ranges = {}
+        for key, summary in summaries.items():
+            value_range = histogram_range(summary)
+            if value_range is not None and key not in ranges:
+                ranges[key] = value_range
+        versions = {key: None if self.data_state is None else
+                    self.data_state.key_version(key) for key in ranges}
+        self.plot_canvas.render(partial(
+            self.plot, data=data, ranges=ranges, versions=versions,
+            points=self.points_act.isChecked()))
+
+    def dependencies(self):
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: list of str
+        """
+        return list(self.key)
 
     def init_ui(self):
         """Layout and main functionalities"""
@@ -59,11 +208,8 @@ class ScatterMatrixPlotWidget(QWidget):
         if debug:
             print("In ScatterMatrixWidget.init_ui():")
         # Canvas
-        self.plot_canvas = FigureCanvas(self.fig)
-        self.plot_canvas.draw()
-
-        # Matplotlib toolbar
-        plot_toolbar = NavigationToolbar(self.plot_canvas, self)
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.figure_ready.connect(self.plot_ready)
 
         # Custom Toolbar
         if debug:
@@ -72,7 +218,13 @@ class ScatterMatrixPlotWidget(QWidget):
         # - Actions -
         close_act = QAction(QIcon(path_icon+"close.png"), 'Close', self)
         close_act.triggered.connect(self.hide)
+        self.points_act = QAction('Points', self)
+        self.points_act.setCheckable(True)
+        self.points_act.setToolTip(
+            "Draw a sample of the points over the densities")
+        self.points_act.triggered.connect(self.refresh_plot)
         # - Format -
+        action_toolbar.addAction(self.points_act)
         action_toolbar.addAction(close_act)
         if debug:
             print("  - Creating action_toolbar. Done.")
@@ -81,7 +233,6 @@ class ScatterMatrixPlotWidget(QWidget):
         # - For the Widget
         v_plot = QVBoxLayout()
         v_plot.addWidget(self.plot_canvas)
-        v_plot.addWidget(plot_toolbar)
         v_plot.addWidget(action_toolbar)
         self.setLayout(v_plot)
 
@@ -1,11 +1,17 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg \
-    as FigureCanvas
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT \
-    as NavigationToolbar
+from functools import partial
+from PyQt5.QtCore import pyqtSignal, QTimer
 from PyQt5.QtWidgets import QWidget, QToolBar, QAction, QVBoxLayout
 from PyQt5.QtGui import QIcon
+import numpy as np
 import seaborn as sms
+import matplotlib.dates as mdates
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from mooda_gui.core.spectrogram import acoustic_keys, spectrogram_pyramid
+from mooda_gui.widgets.plotcanvas import PlotCanvas
+
+# Milliseconds without zoom or pan changes before the tiles are changed
+ZOOM_DELAY = 150
 
 
 class SpectrogramPlotWidget(QWidget):
@@ -13,36 +19,199 @@ class SpectrogramPlotWidget(QWidget):
     Pyqt5 widget to show plots. It is used in PlotSplitter.
     """
 
-    def __init__(self, wf):
+    # Signals
+    msg2statusbar = pyqtSignal(str)
+
+    def __init__(self, wf, data_state=None, acoustic=None):
         """
         Constructor
         :param wf: inWater WaterFrame object
-        :param key: key of wf.data to plot
+        :param data_state: DataState of wf, to keep the tiles of the
+        spectrogram in the aggregation cache
+        :param acoustic: AcousticData with the spectra of wf. None if the
+        spectra are columns of wf.data
         """
         super().__init__()
 
         # Instance variables
         self.wf = wf
         self.name = "Spectrogram"
+        # Versions of the keys, it is given by the PlotSplitter
+        self.data_state = data_state
+        # Spectra out of wf.data, it is given by the PlotSplitter
+        self.acoustic = acoustic
+        # Tiles of the spectrogram and images of the drawn tiles
+        self.pyramid = None
+        self.images = {}
+        self.norm = None
+
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+
+        # The visible tiles are changed after a zoom or pan
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(ZOOM_DELAY)
+        self.zoom_timer.timeout.connect(self.refresh_view)
+
+        self.initUI()
 
         # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
-        self.wf.spectroplot()
-        plt.colorbar()
+        self.refreshPlot()
+
+    def plot(self, fig, data=None, acoustic=None, version=None):
+        """
+        It draws the spectrogram in a new figure, like
+        WaterFrame.spectroplot() (that uses pyplot). Only the tiles of the
+        SpectrogramPyramid that fit the width of the axes are drawn, as images
+        with the extent of their time interval. It runs in the Worker of the
+        PlotCanvas, so it does not change the widget: plot_ready() keeps the
+        returned pyramid and images.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            data: pandas.DataFrame, optional (data = None)
+                Acoustic columns of wf.data, taken in the GUI thread.
+            acoustic: AcousticData, optional (acoustic = None)
+                Spectra out of wf.data, it is used instead of data.
+            version: object, optional (version = None)
+                Version of the acoustic keys, to use the aggregation cache.
+        Returns
+        -------
+            state: dict
+                "axes", "pyramid", "images" and "norm".
+        """
+        axes = fig.add_subplot(1, 1, 1)
+        if acoustic is None:
+            pyramid = spectrogram_pyramid(data, version)
+        else:
+            pyramid = acoustic.pyramid()
+        norm = Normalize(*pyramid.limits)
+        images = {}
+        if len(pyramid.times):
+            pixels = max(int(axes.bbox.width), 100)
+            for tile in pyramid.tiles(pixels=pixels):
+                images[tile] = self.draw_tile(axes, pyramid, norm, tile)
+            axes.set_xlim(mdates.date2num(pyramid.times[0]),
+                          mdates.date2num(pyramid.time_edge(
+                              len(pyramid.times))))
+        axes.set_ylim(pyramid.frequency_extent())
+        axes.xaxis_date()
+        fig.colorbar(ScalarMappable(norm=norm), ax=axes)
         # Plot custom view
-        plt.tight_layout()
-        sms.despine()
+        fig.tight_layout()
+        sms.despine(fig=fig)
+        return {"axes": axes, "pyramid": pyramid, "images": images,
+                "norm": norm}
 
-        self.initUI()
+    @staticmethod
+    def draw_tile(axes, pyramid, norm, tile):
+        """
+        It draws a tile of the pyramid with the extent of its time interval.
+        If the frequencies are evenly spaced, the tile is an image. Otherwise
+        (i.e. log spaced frequencies), it is a mesh with the edges of the
+        frequencies, like WaterFrame.spectroplot().
+
+        Parameters
+        ----------
+            axes: matplotlib.axes.Axes
+            pyramid: SpectrogramPyramid
+            norm: matplotlib.colors.Normalize
+                Colour scale of all the tiles.
+            tile: (int, int)
+                Level and tile.
+        Returns
+        -------
+            image: matplotlib AxesImage or QuadMesh
+        """
+        power, start, end = pyramid.tile(*tile)
+        start, end = mdates.date2num(start), mdates.date2num(end)
+        if not pyramid.evenly_spaced():
+            return axes.pcolormesh(
+                np.linspace(start, end, len(power) + 1),
+                pyramid.frequency_edges(), power.T, shading="flat",
+                norm=norm)
+        first, last = pyramid.frequency_extent()
+        return axes.imshow(
+            power.T, extent=(start, end, first, last),
+            origin="lower", aspect="auto", interpolation="nearest",
+            norm=norm)
+
+    def plot_ready(self, fig, state):
+        """
+        The PlotCanvas shows the new figure. It keeps the tiles and images
+        made by plot() in the Worker.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+            state: dict
+                Result of plot().
+        """
+        self.fig, self.axes = fig, state["axes"]
+        self.pyramid, self.images, self.norm = state["pyramid"], \
+            state["images"], state["norm"]
+        if self.images:
+            # The callback starts a QTimer, so it is connected in the GUI
+            # thread
+            self.axes.callbacks.connect(
+                "xlim_changed", lambda _: self.zoom_timer.start())
+        self.msg2statusbar.emit("Ready")
+
+    def visible_interval(self):
+        """
+        It returns the visible time interval of the plot.
+
+        Returns
+        -------
+            (start, end): (datetime64, datetime64)
+        """
+        return tuple(np.datetime64(
+            mdates.num2date(limit).replace(tzinfo=None), "us")
+                     for limit in self.axes.get_xlim())
+
+    def refresh_view(self):
+        """
+        It draws the tiles of the visible interval, after a zoom or pan of
+        the NavigationToolbar. Images of the tiles that are still visible are
+        kept, the new tiles are added and the others are removed, so zooming
+        into an hour of a long record only draws the tiles of that hour.
+        """
+        if self.pyramid is None or self.axes is None:
+            return
+        pixels = max(int(self.axes.bbox.width), 100)
+        start, end = self.visible_interval()
+        tiles = self.pyramid.tiles(start, end, pixels)
+        if set(tiles) == set(self.images):
+            return
+        for tile in set(self.images) - set(tiles):
+            self.images.pop(tile).remove()
+        for tile in tiles:
+            if tile not in self.images:
+                self.images[tile] = self.draw_tile(self.axes, self.pyramid,
+                                                   self.norm, tile)
+        self.plotCanvas.draw_idle()
+
+    def dependencies(self):  # pylint: disable=no-self-use
+        """
+        It returns the keys of the data used by the plot.
+
+        Returns
+        -------
+            keys: None
+                The plot uses all the keys.
+        """
+        return None
 
     def initUI(self):
 
         # Canvas
-        self.plotCanvas = FigureCanvas(self.fig)
-        self.plotCanvas.draw()
-
-        # Matplotlib toolbar
-        plotToolbar = NavigationToolbar(self.plotCanvas, self)
+        self.plotCanvas = PlotCanvas(self)
+        self.plotCanvas.msg2statusbar.connect(self.msg2statusbar.emit)
+        self.plotCanvas.figure_ready.connect(self.plot_ready)
 
         # Custom Toolbar
         actionToolbar = QToolBar(self)
@@ -59,7 +228,6 @@ class SpectrogramPlotWidget(QWidget):
         # - For the Widget
         vPlot = QVBoxLayout()
         vPlot.addWidget(self.plotCanvas)
-        vPlot.addWidget(plotToolbar)
         vPlot.addWidget(actionToolbar)
         self.setLayout(vPlot)
 
@@ -74,8 +242,19 @@ class SpectrogramPlotWidget(QWidget):
                 to be compatible with the other plot widgets.
         :return:
         """
-        # Remove previous axes from the figure
-        self.axes.clear()
-        self.wf.spectroplot()
-        plt.tight_layout()
-        self.plotCanvas.draw()
+        data, version = None, None
+        if self.acoustic is None:
+            # The Worker uses a copy of the columns, self.wf.data can change
+            _, keys = acoustic_keys(self.wf.data.keys())
+            data = self.wf.data[keys]
+            if self.data_state is not None:
+                version = (id(self.data_state),
+                           self.data_state.signature(keys), tuple(keys))
+        # Remake the plot in a new figure
+        self.plotCanvas.render(partial(self.plot, data=data,
+                                       acoustic=self.acoustic,
+                                       version=version))
+
+    def refresh_plot(self):
+        """It refresh the plot, like the other plot widgets"""
+        self.refreshPlot()
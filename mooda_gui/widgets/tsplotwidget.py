@@ -3,17 +3,25 @@
 # pylint: disable=import-error
 
 import os
-from numpy import timedelta64
+from functools import partial
+import numpy as np
 import seaborn as sms
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import \
-    FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qt5agg import \
-    NavigationToolbar2QT as NavigationToolbar
-from PyQt5.QtCore import pyqtSignal
+import matplotlib.dates as mdates
+from PyQt5.QtCore import pyqtSignal, QTimer
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QAction, QComboBox, QLabel, QSpinBox, QToolBar,
                              QVBoxLayout, QWidget)
+from mooda import WaterFrame
+from mooda_gui.core.aggregation import (aggregation_cache, column_pyramid,
+                                        moving_mean_std, pyramid_keys,
+                                        time_average)
+from mooda_gui.core.downsample import (LOD_THRESHOLD, MinMaxPyramid, lttb,
+                                       series_xy)
+from mooda_gui.core.summary import column_summary
+from mooda_gui.widgets.plotcanvas import PlotCanvas
+
+# Milliseconds without zoom or pan changes before the lines are reduced again
+ZOOM_DELAY = 150
 
 
 class TSPlotWidget(QWidget):
@@ -24,11 +32,12 @@ class TSPlotWidget(QWidget):
     # Signals
     msg2statusbar = pyqtSignal(str)
 
-    def __init__(self, wf, keys, right=None):  # pylint: disable=C0103
+    def __init__(self, wf, keys, right=None, data_state=None):  # pylint: disable=C0103
         """
         Constructor
         :param wf: inWater WaterFrame object
         :param keys: keys of wf.data to plot
+        :param data_state: DataState of wf, with the summaries of the keys
         """
         super().__init__()
 
@@ -40,56 +49,420 @@ class TSPlotWidget(QWidget):
         # List of keys in right position
         self.right = right
 
-        # Calculate average_time of plot
-        # Calculation of max size of dataframe and number of hours
-        max_size = 0
-        max_hour = 0
-        for key in self.key:
-            size = len(self.wf.data[key].dropna().index)
-            date_period = self.wf.data[key].index[-1] - self.wf.data[
-                key].index[0]
-            date_period = date_period / timedelta64(1, 'h')  # pylint: disable=E1121
-            if max_size < size:
-                max_size = size
-            if max_hour < date_period:
-                max_hour = date_period
-        average_text = 'None'
-        average_time = None
-        if max_size > 1000:
-            if max_hour > 3360:  # More time than 20 weeks
-                average_time = 'W'
-                average_text = "Weekly"
-            elif max_hour > 480:  # More than 20 days
-                average_time = 'D'
-                average_text = "Daily"
-            elif max_hour > 20:  # More than 20 hours
-                average_time = 'H'
-                average_text = "Hourly"
-            elif max_hour > 0.33:  # More than 20 minutes
-                average_time = 'T'
-                average_text = "Minutely"
+        # Lines of the keys: {key: Line2D}
+        self.lines = {}
+        # Standard deviation of the moving window: {key: PolyCollection}
+        self.bands = {}
+        # Data of the reduced lines: {key: (x, y, MinMaxPyramid or None)}
+        self.lod_data = {}
+        # "Min/Max", "LTTB" or "Mean" (moving window or average time)
+        self.lod_method = None
+        # Version of the data of lod_data (PlotSplitter.data_state)
+        self.lod_version = None
+        # Versions of the keys, it is given by the PlotSplitter. Without it,
+        # aggregations and summaries are not cached
+        self.data_state = data_state
+        # The visible interval is reduced again after a zoom or pan
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(ZOOM_DELAY)
+        self.zoom_timer.timeout.connect(self.refresh_detail)
+        # Figure made by the PlotCanvas
+        self.fig = None
+        self.axes = None
+        # Axes of the key in the right position
+        self.right_axes = None
+
+        # Series with many values are reduced to the width of the plot
+        max_size = max(self.summary(key).count for key in self.key)
+        detail_text = "Off"
+        if max_size > LOD_THRESHOLD:
+            detail_text = "Min/Max"
+
+        self.init_ui()
 
+        self.detail.setCurrentText(detail_text)
         # Creation of the figure
-        self.fig, self.axes = plt.subplots(nrows=1, ncols=1)
-        if len(self.key) > 1:
-            for key in self.key:
-                self.axes = self.wf.tsplot(key, ax=self.axes,
-                                           average_time=average_time)
+        self.refresh_plot()
+
+    def summary(self, key):
+        """
+        It returns the ColumnSummary of a key.
+
+        Parameters
+        ----------
+            key: str
+        Returns
+        -------
+            summary: ColumnSummary
+        """
+        return column_summary(self.wf.data, key, self.data_state)
+
+    @staticmethod
+    def line_method(average=None, rolling=None, lod="Off"):
+        """
+        It returns how the lines are made: "Min/Max" or "LTTB" (series
+        reduced to the width of the plot) or "Mean" (moving window of
+        WaterFrame.tsplot()).
+        """
+        if lod != "Off" and average is None and rolling is None:
+            return lod
+        return "Mean"
+
+    def snapshot(self):
+        """
+        It returns the data of the plot for a Worker. It is taken in the GUI
+        thread, so the Worker does not read self.wf.data while it is changed
+        (i.e. new QC flags or rows). Columns are copied lazily by pandas.
+
+        Returns
+        -------
+            snapshot: dict
+                "data": columns of dependencies(),
+                "meaning": meaning of the columns,
+                "versions": {key: version} or None without the DataState,
+                "version": version of the data (PlotSplitter.data_state),
+                "lod": (lod_method, lod_version, lod_data) of the figure.
+        """
+        keys = list(dict.fromkeys(self.dependencies()))
+        versions = None
+        if self.data_state is not None:
+            versions = {key: self.data_state.key_version(key) for key in keys}
+        return {
+            "data": self.wf.data[keys],
+            "meaning": {key: self.wf.meaning[key] for key in keys
+                        if key in self.wf.meaning},
+            "versions": versions,
+            "version": getattr(self, "data_version", None),
+            "lod": (self.lod_method, self.lod_version, self.lod_data)}
+
+    def plot(self, fig, snapshot, average=None, rolling=None, lod="Off"):
+        """
+        It draws the keys in a new figure. It runs in the Worker of the
+        PlotCanvas, so it does not use pyplot and it does not change the
+        widget: plot_ready() keeps the returned artists.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+                Empty figure.
+            snapshot: dict
+                Result of snapshot().
+            average: str, optional (average = None)
+                average_time of WaterFrame.tsplot().
+            rolling: int, optional (rolling = None)
+                rolling of WaterFrame.tsplot().
+            lod: str, optional (lod = "Off")
+                "Min/Max", "LTTB" or "Off". If it is not "Off" and there is
+                no average or rolling, series are reduced to the width of the
+                plot.
+        Returns
+        -------
+            state: dict
+                "axes", "right_axes", "lines", "bands" and the result of
+                line_data() ("method", "version", "lod_data").
+        """
+        axes = fig.add_subplot(1, 1, 1)
+        lines, bands, right_axes = {}, {}, None
+        data = {"method": None, "version": None, "lod_data": {}}
+
+        if len(self.key) == 1 and "_QC" in self.key[0]:
+            wf = WaterFrame()  # pylint: disable=C0103
+            wf.data = snapshot["data"]
+            wf.meaning = snapshot["meaning"]
+            axes = wf.qcplot(self.key[0][:-3], ax=axes)
         else:
-            key = self.key[0]
-            if "_QC" in key:
-                self.axes = self.wf.qcplot(key[:-3], ax=self.axes)
-            else:
-                self.axes = self.wf.tsplot(key, ax=self.axes,
-                                           average_time=average_time)
+            data = self.line_data(snapshot, average, rolling, lod,
+                                  max(int(axes.bbox.width), 100))
+            lines, bands, right_axes = self.draw_lines(axes, data,
+                                                       snapshot["meaning"])
         # Plot custom view
-        plt.tight_layout()
+        fig.tight_layout()
         if self.right is None:
-            sms.despine()
+            sms.despine(fig=fig)
 
-        self.init_ui()
+        return {"axes": axes, "right_axes": right_axes, "lines": lines,
+                "bands": bands, "method": data["method"],
+                "version": data["version"], "lod_data": data["lod_data"]}
+
+    @staticmethod
+    def mean_std(series, version=None, average=None, rolling=None):
+        """
+        It returns the moving mean and standard deviation of a key, like
+        WaterFrame.tsplot(). Results are kept in the aggregation cache, so
+        other plots of the key and other options reuse them, and time
+        averages are made from the AggregationPyramid of the key.
+
+        Parameters
+        ----------
+            series: pandas.Series
+                Column of the key.
+            version: object, optional (version = None)
+                Version of the key. None does not use the cache.
+            average: str, optional (average = None)
+                Resample rule.
+            rolling: int, optional (rolling = None)
+                Size of the moving window. None is automatic.
+        Returns
+        -------
+            (x, mean, std): (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        key = series.name
+        if version is None:
+            return moving_mean_std(time_average(series, average), key,
+                                   rolling)
+        cache = aggregation_cache()
+
+        def average_data():
+            pyramid = None
+            if average is not None and pyramid_keys(series.to_frame()):
+                pyramid = column_pyramid(series, version)
+            return time_average(series, average, pyramid)
+
+        data = cache.get(("average", key, version, average), average_data)
+        return cache.get(("moving", key, version, average, rolling),
+                         lambda: moving_mean_std(data, key, rolling))
+
+    @staticmethod
+    def reduce_line(lod_entry, pixels, start=None, end=None):
+        """
+        It returns the points of a reduced line in a time interval.
+
+        Parameters
+        ----------
+            lod_entry: (x, y, MinMaxPyramid or None)
+                Values of the key in lod_data. Without a MinMaxPyramid, the
+                line is reduced with LTTB.
+            pixels: int
+                Width of the plot.
+            start: datetime64, optional (start = None)
+            end: datetime64, optional (end = None)
+        Returns
+        -------
+            (x, y): (numpy.ndarray, numpy.ndarray)
+        """
+        x_values, y_values, pyramid = lod_entry
+        if pyramid is not None:
+            return pyramid.query(pixels, start, end)
+        first, last = 0, len(x_values)
+        if start is not None:
+            first = max(int(np.searchsorted(x_values, start)) - 1, 0)
+        if end is not None:
+            last = int(np.searchsorted(x_values, end, side="right")) + 1
+        return lttb(x_values[first:last], y_values[first:last], 2 * pixels)
+
+    def line_data(self, snapshot, average=None, rolling=None, lod="Off",
+                  pixels=640, interval=None, progress=None):  # pylint: disable=unused-argument
+        """
+        It calculates the values of the lines. Reduced series are made from
+        the previous lod_data if the data has not changed, so only the
+        reduction to the width of the plot is done again. It runs in a
+        Worker, so it only uses the snapshot of the data.
+
+        Parameters
+        ----------
+            snapshot: dict
+                Result of snapshot().
+            average: str, optional (average = None)
+            rolling: int, optional (rolling = None)
+            lod: str, optional (lod = "Off")
+                See plot().
+            pixels: int, optional (pixels = 640)
+                Width of the plot.
+            interval: (datetime64, datetime64), optional (interval = None)
+                Visible time interval of reduced series. None is all.
+            progress: callable, optional (progress = None)
+                Not used, it is here to run the method in a Worker.
+        Returns
+        -------
+            data: dict
+                "method": result of line_method(),
+                "version": version of the data,
+                "lines": {key: (x, y, std or None)},
+                "lod_data": {key: (x, y, MinMaxPyramid or None)}.
+        """
+        method = self.line_method(average, rolling, lod)
+        version = snapshot["version"]
+        versions = snapshot["versions"] or {}
+        lod_method, lod_version, previous = snapshot["lod"]
+        reuse = method == lod_method and version is not None and \
+            version == lod_version
+        start, end = interval or (None, None)
+        lines, lod_data = {}, {}
+        for key in self.key:
+            if method == "Mean":
+                lines[key] = self.mean_std(snapshot["data"][key],
+                                           versions.get(key), average, rolling)
+                continue
+            if reuse and key in previous:
+                lod_data[key] = previous[key]
+            else:
+                x_values, y_values = series_xy(snapshot["data"][key])
+                pyramid = None
+                if method == "Min/Max":
+                    pyramid = MinMaxPyramid(x_values, y_values)
+                lod_data[key] = (x_values, y_values, pyramid)
+            x_plot, y_plot = self.reduce_line(lod_data[key], pixels, start,
+                                              end)
+            lines[key] = (x_plot, y_plot, None)
+        return {"method": method, "version": version, "lines": lines,
+                "lod_data": lod_data}
+
+    def draw_lines(self, axes, data, meaning):
+        """
+        It draws the lines made by line_data(). Reduced series keep the
+        extreme values (Min/Max) or the shape (LTTB) of the series and the
+        moving mean has a band of its standard deviation.
+
+        Parameters
+        ----------
+            axes: matplotlib.axes.Axes
+                Axes of the plot.
+            data: dict
+                Result of line_data().
+            meaning: dict
+                Meaning of the keys, with their units.
+        Returns
+        -------
+            (lines, bands, right_axes): (dict, dict, Axes or None)
+                Lines ({key: Line2D}), bands ({key: PolyCollection}) and
+                axes of the key in the right position.
+        """
+        handles = []
+        lines, bands, right_axes = {}, {}, None
+        for i, key in enumerate(self.key):
+            key_axes = axes
+            if key == self.right and len(self.key) > 1:
+                if right_axes is None:
+                    right_axes = axes.twinx()
+                key_axes = right_axes
+            x_plot, y_plot, std = data["lines"][key]
+            line, = key_axes.plot(x_plot, y_plot, label=key,
+                                  color="C{}".format(i))
+            lines[key] = line
+            if std is not None:
+                bands[key] = key_axes.fill_between(
+                    x_plot, y_plot - std, y_plot + std, alpha=.25,
+                    color=line.get_color())
+            handles.append(line)
+            try:
+                key_axes.set_ylabel(meaning[key]['units'])
+            except KeyError:
+                pass
+        axes.set_xlabel("Date")
+        axes.legend(handles=handles)
+        return lines, bands, right_axes
+
+    def update_lines(self, data):
+        """
+        It changes the values of the lines of the current figure, without
+        making the figure again. If the limits of the axes do not change,
+        only the lines are drawn again (blitting in the interactive canvas).
+        It runs in the GUI thread.
+
+        Parameters
+        ----------
+            data: dict
+                Result of line_data().
+        """
+        if data["method"] != self.lod_method or \
+           set(data["lines"]) != set(self.lines):
+            self.refresh_plot(fast=False)
+            return
+        axes_list = [axes for axes in [self.axes, self.right_axes]
+                     if axes is not None]
+        limits = [(axes.get_xlim(), axes.get_ylim()) for axes in axes_list]
+        for key, (x_plot, y_plot, _) in data["lines"].items():
+            self.lines[key].set_data(x_plot, y_plot)
+        for axes in axes_list:
+            axes.relim()
+        # Bands are made again, they are added to the data limits
+        for key, band in list(self.bands.items()):
+            band.remove()
+            x_plot, y_plot, std = data["lines"][key]
+            line = self.lines[key]
+            self.bands[key] = line.axes.fill_between(
+                x_plot, y_plot - std, y_plot + std, alpha=.25,
+                color=line.get_color())
+        for axes in axes_list:
+            axes.autoscale_view()
+        self.lod_data = data["lod_data"]
+        self.lod_version = data["version"]
+
+        same_limits = limits == [(axes.get_xlim(), axes.get_ylim())
+                                 for axes in axes_list]
+        self.plot_canvas.set_dynamic(
+            list(self.lines.values()) + list(self.bands.values()))
+        self.plot_canvas.redraw(blit=same_limits)
+        self.msg2statusbar.emit("Ready")
+
+    def plot_ready(self, fig, state):
+        """
+        The PlotCanvas shows the new figure. It keeps the artists made by
+        plot() in the Worker.
+
+        Parameters
+        ----------
+            fig: matplotlib.figure.Figure
+            state: dict
+                Result of plot().
+        """
+        if state is not None and fig is self.plot_canvas.figure:
+            self.fig = fig
+            self.axes, self.right_axes = state["axes"], state["right_axes"]
+            self.lines, self.bands = state["lines"], state["bands"]
+            self.lod_data = state["lod_data"]
+            self.lod_method, self.lod_version = state["method"], \
+                state["version"]
+            self.plot_canvas.set_dynamic(
+                list(self.lines.values()) + list(self.bands.values()))
+            if self.lod_data:
+                # The callback starts a QTimer, so it is connected in the GUI
+                # thread
+                self.axes.callbacks.connect(
+                    "xlim_changed", lambda _: self.zoom_timer.start())
+        self.msg2statusbar.emit("Ready")
+
+    def visible_interval(self):
+        """
+        It returns the visible time interval of the plot.
+
+        Returns
+        -------
+            (start, end): (datetime64, datetime64)
+        """
+        return tuple(np.datetime64(
+            mdates.num2date(limit).replace(tzinfo=None), "us")
+                     for limit in self.axes.get_xlim())
+
+    def refresh_detail(self):
+        """
+        It reduces again the visible interval of the series, after a zoom or
+        pan of the NavigationToolbar. The interval is found with a binary
+        search of the time, so zooming into a day of a long record draws its
+        raw values.
+        """
+        if not self.lod_data or self.axes is None:
+            return
+        pixels = max(int(self.axes.bbox.width), 100)
+        start, end = self.visible_interval()
+        for key, line in self.lines.items():
+            line.set_data(*self.reduce_line(self.lod_data[key], pixels, start,
+                                            end))
+        self.plot_canvas.draw_idle()
+
+    def dependencies(self):
+        """
+        It returns the keys of the data used by the plot.
 
-        self.average.setCurrentText(average_text)
+        Returns
+        -------
+            keys: list of str
+        """
+        if len(self.key) == 1 and "_QC" in self.key[0]:
+            # qcplot() uses the values and the flags
+            return [self.key[0][:-3], self.key[0]]
+        return list(self.key)
 
     def init_ui(self):
         """Layout and main functionalities"""
@@ -97,17 +470,16 @@ class TSPlotWidget(QWidget):
             os.path.dirname(os.path.abspath(__file__))) + "\\..\\icon\\"
 
         # Canvas
-        self.plot_canvas = FigureCanvas(self.fig)
-        self.plot_canvas.draw()
-
-        # Matplotlib toolbar
-        plot_toolbar = NavigationToolbar(self.plot_canvas, self)
+        self.plot_canvas = PlotCanvas(self)
+        self.plot_canvas.figure_ready.connect(self.plot_ready)
+        self.plot_canvas.msg2statusbar.connect(self.msg2statusbar.emit)
 
         # Custom Toolbar
         action_toolbar = QToolBar(self)
         # - Labels -
         rolling_label = QLabel("Moving window: ")
         average_label = QLabel("  Average time: ")
+        detail_label = QLabel("  Detail: ")
         # - Spin Box -
         self.rolling = QSpinBox(self)
         self.rolling.setMinimum(0)
@@ -121,6 +493,13 @@ class TSPlotWidget(QWidget):
         self.average.addItems(
             ["None", "Minutely", "Hourly", "Daily", "Weekly"])
         self.average.setToolTip("")
+        self.detail = QComboBox(self)
+        self.detail.addItems(["Min/Max", "LTTB", "Off"])
+        self.detail.setToolTip(
+            "Level of detail of series with many values.\n"
+            "Min/Max: min and max values of each pixel.\n"
+            "LTTB: points that keep the shape of the series.\n"
+            "It is used if there is no moving window or average time.")
         # - Actions -
         apply_act = QAction(QIcon(path_icon+"apply.png"), 'Apply', self)
         apply_act.triggered.connect(self.refresh_plot)
@@ -131,6 +510,8 @@ class TSPlotWidget(QWidget):
         action_toolbar.addWidget(self.rolling)
         action_toolbar.addWidget(average_label)
         action_toolbar.addWidget(self.average)
+        action_toolbar.addWidget(detail_label)
+        action_toolbar.addWidget(self.detail)
         action_toolbar.addAction(apply_act)
         action_toolbar.addSeparator()
         action_toolbar.addAction(close_act)
@@ -139,21 +520,22 @@ class TSPlotWidget(QWidget):
         # - For the Widget
         v_plot = QVBoxLayout()
         v_plot.addWidget(self.plot_canvas)
-        v_plot.addWidget(plot_toolbar)
         v_plot.addWidget(action_toolbar)
         self.setLayout(v_plot)
 
-    def refresh_plot(self):
+    def refresh_plot(self, fast=True):
         """
         It refresh the plot according to the actions of the action_toolbar
-        :return:
+
+        Parameters
+        ----------
+            fast: bool, optional (fast = True)
+                If the figure has the same lines, their values are changed
+                with update_lines() instead of making a new figure.
         """
 
         self.msg2statusbar.emit("Making figure")
 
-        # Remove previous axes from the figure
-        self.axes.cla()
-
         # Rol value
         rol = self.rolling.value()
         if rol == 0:
@@ -170,30 +552,34 @@ class TSPlotWidget(QWidget):
         elif self.average.currentText() == 'Weekly':
             average = "W"
 
-        if len(self.key) > 1:
-            for key in self.key:
-                second_y = False
-                if key == self.right:
-                    second_y = True
-                self.axes = self.wf.tsplot(keys=key, ax=self.axes,
-                                           secondary_y=second_y,
-                                           average_time=average,
-                                           rolling=rol)
-        else:
-            key = self.key[0]
-            if "_QC" in key:
-                self.axes = self.wf.qcplot(key[:-3], ax=self.axes)
-            else:
-                self.axes = self.wf.tsplot(keys=key, rolling=rol, ax=self.axes,
-                                           average_time=average,
-                                           secondary_y=False)
-        # Plot custom view
-        plt.tight_layout()
-        if self.right is None:
-            sms.despine()
-
-        self.plot_canvas.draw()
+        lod = self.detail.currentText()
+        if fast and self.lines and self.fig is self.plot_canvas.figure and \
+           self.line_method(average, rol, lod) == self.lod_method:
+            pixels = max(int(self.axes.bbox.width), 100)
+            # A zoom of the user is kept
+            interval = None
+            if not self.axes.get_autoscalex_on():
+                interval = self.visible_interval()
+            self.plot_canvas.update_artists(
+                partial(self.line_data, self.snapshot(), average, rol, lod,
+                        pixels, interval),
+                self.update_lines)
+            return
+        # The figure is made in a Worker, plot_ready() is called at the end
+        self.plot_canvas.render(partial(self.plot, snapshot=self.snapshot(),
+                                        average=average, rolling=rol,
+                                        lod=lod))
 
-        self.msg2statusbar.emit("Ready")
+    def append_data(self, rows):
+        """
+        It refresh the plot if the new rows have values of its keys.
 
-        print("Done")
+        Parameters
+        ----------
+            rows: pandas.DataFrame
+                Rows that have been appended to self.wf.data.
+        """
+        for key in self.key:
+            if key in rows.keys() and rows[key].notna().any():
+                self.refresh_plot()
+                return